@@ -3,6 +3,8 @@
 from .FilteredExportAsStlCommand import FilteredExportAsStlCommand
 from .FilteredExportSaveCopyAs import FilteredExportSaveCopyAs
 from .FilteredExportStp import FilteredExportStp
+from .FilteredExportInstrumentation import apiProfiler
+from .FilteredExportScheduler import exportScheduler
 
 commands = []
 command_definitions = []
@@ -48,6 +50,11 @@ command_definitions.append(cmd)
 # Set to True to display various useful messages when debugging your app
 debug = False
 
+# Set to True to count calls and latency of the Fusion 360 API. A report is
+# written to '<home>/FilteredExport/profile' after each export
+profile = False
+apiProfiler.enabled = profile
+
 # Don't change anything below here:
 for cmd_def in command_definitions:
     command = cmd_def['class'](cmd_def, debug)
@@ -60,5 +67,8 @@ def run(context):
 
 
 def stop(context):
+    # cancel exports that are still running in the background
+    exportScheduler.stop()
+
     for stop_command in commands:
         stop_command.on_stop()
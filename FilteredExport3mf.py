@@ -0,0 +1,234 @@
+import zipfile
+
+from array import array
+from xml.sax.saxutils import quoteattr
+
+from .FilteredExportMesh import calculateMesh
+from .FilteredExportMesh import mergeMeshes
+from .FilteredExportUtil import isOccurrenceIncluded
+
+# NumPy is optional. Without it the vertices are welded with a dictionary
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Faked statics for easy code maintainance
+S_3MF_EXTENSION = '.3mf'
+S_3MF_MODEL_NAME = '3D/3dmodel.model'
+
+# the API returns cm, 3MF files are written in mm
+S_3MF_SCALE = 10.0
+
+# vertices closer than this distance (mm) are welded
+S_3MF_WELD_TOLERANCE = 1e-6
+
+# number of vertices or triangles that are written to the zip stream at once
+S_3MF_CHUNK_SIZE = 4096
+
+S_3MF_CONTENT_TYPES = '<?xml version="1.0" encoding="UTF-8"?>\n' \
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">' \
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>' \
+    '<Default Extension="model" ContentType="application/vnd.ms-package.3dmanufacturing-3dmodel+xml"/>' \
+    '</Types>\n'
+
+S_3MF_RELATIONSHIPS = '<?xml version="1.0" encoding="UTF-8"?>\n' \
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">' \
+    '<Relationship Target="/' + S_3MF_MODEL_NAME + '" Id="rel0" Type="http://schemas.microsoft.com/3dmanufacturing/2013/01/3dmodel"/>' \
+    '</Relationships>\n'
+
+S_3MF_MODEL_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n' \
+    '<model unit="millimeter" xml:lang="en-US" xmlns="http://schemas.microsoft.com/3dmanufacturing/core/2015/02">\n' \
+    ' <resources>\n'
+
+#
+# weld vertices that share a position. Coordinates are scaled to mm and
+# snapped to the weld tolerance. Triangles that collapse are removed. Returns
+# the flat coordinates of the unique vertices and the flat indices
+#
+def weldVertices(coordinates, indices, scale=S_3MF_SCALE, tolerance=S_3MF_WELD_TOLERANCE):
+    if numpy is not None:
+        nodes = numpy.asarray(coordinates, dtype=numpy.float64).reshape(-1, 3) * scale
+        keys = numpy.round(nodes / tolerance).astype(numpy.int64)
+
+        # unique rows keep the first node of each position. Vertices are
+        # numbered in the order of their first node like without NumPy
+        uniqueKeys, firstNodes, nodeMap = numpy.unique(keys, axis=0, return_index=True, return_inverse=True)
+        order = numpy.argsort(firstNodes)
+        vertexIndexes = numpy.empty_like(order)
+        vertexIndexes[order] = numpy.arange(len(order))
+        firstNodes = firstNodes[order]
+
+        triangles = vertexIndexes[nodeMap.reshape(-1)][numpy.asarray(indices, dtype=numpy.int64)].reshape(-1, 3)
+
+        isValid = (triangles[:, 0] != triangles[:, 1]) & (triangles[:, 1] != triangles[:, 2]) & (triangles[:, 0] != triangles[:, 2])
+
+        return nodes[firstNodes].reshape(-1).tolist(), triangles[isValid].reshape(-1).tolist()
+
+    nodes = array('d', coordinates)
+    uniqueCoordinates = []
+    nodeMap = []
+    vertexIndexes = {}
+
+    for index in range(0, len(nodes) - 2, 3):
+        x, y, z = nodes[index] * scale, nodes[index + 1] * scale, nodes[index + 2] * scale
+        key = (round(x / tolerance), round(y / tolerance), round(z / tolerance))
+
+        vertexIndex = vertexIndexes.get(key)
+        if vertexIndex is None:
+            vertexIndex = len(uniqueCoordinates) // 3
+            vertexIndexes[key] = vertexIndex
+            uniqueCoordinates.extend((x, y, z))
+
+        nodeMap.append(vertexIndex)
+
+    weldedIndices = []
+    for index in range(0, len(indices) - 2, 3):
+        a, b, c = nodeMap[indices[index]], nodeMap[indices[index + 1]], nodeMap[indices[index + 2]]
+        if a != b and b != c and a != c:
+            weldedIndices.extend((a, b, c))
+
+    return uniqueCoordinates, weldedIndices
+
+
+#
+# 3MF transform of a Fusion 360 matrix. Fusion 360 transforms column vectors,
+# 3MF row vectors, so the rotation is transposed. Translations are scaled to mm
+#
+def get3mfTransform(cells, scale=S_3MF_SCALE):
+    values = (cells[0], cells[4], cells[8],
+              cells[1], cells[5], cells[9],
+              cells[2], cells[6], cells[10],
+              cells[3] * scale, cells[7] * scale, cells[11] * scale)
+
+    return ' '.join('{:.9g}'.format(value) for value in values)
+
+
+#
+# transforms (as flat arrays) of all occurrences of a component that the
+# traversal of the export would include (see isOccurrenceIncluded). For the
+# root component the identity is returned. With selected paths only
+# occurrences in the selected subtrees are returned
+#
+def getOccurrenceTransforms(component, rootComponent, selectedPaths=None, filterLinkedComponents=False, componentFilter=None):
+    if component == rootComponent:
+        return [None]
+
+    transforms = []
+    for occurrence in rootComponent.allOccurrencesByComponent(component):
+        if selectedPaths is not None:
+            fullPathName = occurrence.fullPathName
+            if not any(fullPathName == path or fullPathName.startswith(path + '+') for path in selectedPaths):
+                continue
+
+        if not isOccurrenceIncluded(occurrence, filterLinkedComponents, componentFilter):
+            continue
+
+        transforms.append(occurrence.transform2.asArray())
+
+    return transforms
+
+
+#
+# streaming writer of a 3MF file. Objects are written into the zip container
+# as soon as they are added, so only one mesh is in memory at a time. All
+# objects must be added before the first build item
+#
+class ThreeMfWriter(object):
+    def __init__(self, fileName):
+        if not fileName.lower().endswith(S_3MF_EXTENSION):
+            fileName += S_3MF_EXTENSION
+
+        self.fileName = fileName
+        self.objectCount = 0
+        self.triangleCount = 0
+        self.isBuildStarted = False
+
+        self.zipFile = zipfile.ZipFile(fileName, 'w', zipfile.ZIP_DEFLATED)
+        self.zipFile.writestr('[Content_Types].xml', S_3MF_CONTENT_TYPES)
+        self.zipFile.writestr('_rels/.rels', S_3MF_RELATIONSHIPS)
+
+        self.modelFile = self.zipFile.open(S_3MF_MODEL_NAME, 'w', force_zip64=True)
+        self.write(S_3MF_MODEL_HEADER)
+
+    def write(self, text):
+        self.modelFile.write(text.encode('utf-8'))
+
+    #
+    # write a mesh object with welded vertices. Returns the id of the object
+    # or None if the mesh has no triangles
+    #
+    def addObject(self, name, coordinates, indices):
+        vertexCoordinates, triangleIndices = weldVertices(coordinates, indices)
+        if len(triangleIndices) == 0:
+            return None
+
+        self.objectCount += 1
+        self.triangleCount += len(triangleIndices) // 3
+
+        self.write('  <object id="' + str(self.objectCount) + '" name=' + quoteattr(name) + ' type="model">\n   <mesh>\n    <vertices>\n')
+
+        vertex = '     <vertex x="%.9g" y="%.9g" z="%.9g"/>\n'
+        chunkSize = S_3MF_CHUNK_SIZE * 3
+        for start in range(0, len(vertexCoordinates), chunkSize):
+            chunk = vertexCoordinates[start:start + chunkSize]
+            self.write(''.join(vertex % tuple(chunk[index:index + 3]) for index in range(0, len(chunk), 3)))
+
+        self.write('    </vertices>\n    <triangles>\n')
+
+        triangle = '     <triangle v1="%d" v2="%d" v3="%d"/>\n'
+        for start in range(0, len(triangleIndices), chunkSize):
+            chunk = triangleIndices[start:start + chunkSize]
+            self.write(''.join(triangle % tuple(chunk[index:index + 3]) for index in range(0, len(chunk), 3)))
+
+        self.write('    </triangles>\n   </mesh>\n  </object>\n')
+
+        return self.objectCount
+
+    #
+    # place an object. Without transform the object is placed as it is
+    #
+    def addBuildItem(self, objectId, transform=None):
+        if not self.isBuildStarted:
+            self.write(' </resources>\n <build>\n')
+            self.isBuildStarted = True
+
+        if transform is None:
+            self.write('  <item objectid="' + str(objectId) + '"/>\n')
+        else:
+            self.write('  <item objectid="' + str(objectId) + '" transform="' + get3mfTransform(transform) + '"/>\n')
+
+    def close(self):
+        if not self.isBuildStarted:
+            self.write(' </resources>\n <build>\n')
+
+        self.write(' </build>\n</model>\n')
+        self.modelFile.close()
+        self.zipFile.close()
+
+
+#
+# export components as one 3MF file. Each component is a tuple of its name,
+# its bodies, the surface and normal deviation per body and the transforms
+# of its occurrences. The bodies of a component are tessellated and written
+# once, every occurrence is a build item. Returns the number of triangles
+#
+def exportComponentsAs3mf(fileName, components):
+    writer = ThreeMfWriter(fileName)
+    placements = []
+
+    try:
+        for name, bodies, meshDeviations, transforms in components:
+            meshes = [calculateMesh(body, surfaceDeviation, normalDeviation) for body, (surfaceDeviation, normalDeviation) in zip(bodies, meshDeviations)]
+            coordinates, indices = mergeMeshes(meshes)
+
+            objectId = writer.addObject(name, coordinates, indices)
+            if objectId is not None:
+                placements.extend((objectId, transform) for transform in transforms)
+
+        for objectId, transform in placements:
+            writer.addBuildItem(objectId, transform)
+    finally:
+        writer.close()
+
+    return writer.triangleCount
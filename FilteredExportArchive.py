@@ -0,0 +1,265 @@
+import os
+import abc
+import gzip
+import shutil
+import zipfile
+import tempfile
+import threading
+
+# LZMA is optional in some Python builds
+try:
+    import lzma
+except ImportError:
+    lzma = None
+
+# Faked statics for easy code maintainance
+S_SINK_FOLDER = 'Folder'
+S_SINK_ZIP_DEFLATE = 'Zip (deflate)'
+S_SINK_ZIP_LZMA = 'Zip (LZMA)'
+S_SINK_ZIP_EXTENSION = '.zip'
+S_SINK_GZIP_EXTENSION = '.gz'
+
+# files that are compressed already are stored without compression
+S_SINK_COMPRESSED_EXTENSIONS = ('.gz', '.zip', '.3mf')
+
+#
+# create a file as hard link of another file. If the file system doesn't
+# support hard links, the file is copied. Returns True for a hard link
+#
+def linkOrCopyFile(sourceFileName, fileName):
+    if os.path.lexists(fileName):
+        os.remove(fileName)
+
+    try:
+        os.link(sourceFileName, fileName)
+        return True
+    except (OSError, AttributeError):
+        shutil.copyfile(sourceFileName, fileName)
+        return False
+
+
+#
+# remove a file that shares its content with hard links. Writing into it
+# would change the linked files, too
+#
+def removeLinkedFile(fileName):
+    if os.path.isfile(fileName) and os.stat(fileName).st_nlink > 1:
+        os.remove(fileName)
+
+
+#
+# files are written directly into the export folder
+#
+class FolderSink(object):
+    def __init__(self, exportPath):
+        self.location = exportPath
+        self.outputPath = exportPath
+        self.fileSuffix = ''
+        self.isArchive = False
+
+    # an existing file must not be linked while it is overwritten
+    def prepare(self, fileName):
+        removeLinkedFile(os.path.join(self.location, fileName))
+
+    # files are in place already
+    def collect(self):
+        pass
+
+    #
+    # hand a written file over to post processing. Returns the full name of
+    # the file or None if it doesn't exist
+    #
+    def release(self, fileName):
+        fullFileName = os.path.join(self.location, fileName)
+
+        return fullFileName if os.path.exists(fullFileName) else None
+
+    # released files are in place already
+    def commit(self, fullFileName, fileName):
+        pass
+
+    #
+    # create a file from a file that was exported before. Returns True for a
+    # hard link and False for a copy
+    #
+    def duplicate(self, sourceFileName, fileName):
+        return linkOrCopyFile(os.path.join(self.location, sourceFileName), os.path.join(self.location, fileName))
+
+    def close(self):
+        pass
+
+
+#
+# files are written into a local temporary folder first. collect() moves them
+# to their destination and removes them at once, so the temporary folder
+# never holds more than the files of one export call. Subclasses store the
+# files at their destination
+#
+class StagedSink(abc.ABC):
+    def __init__(self, location):
+        self.location = location
+        self.outputPath = tempfile.mkdtemp(prefix='FilteredExport')
+        self.fileSuffix = ''
+        self.isArchive = False
+
+        # released files wait here until they are committed
+        self.releasePath = None
+        self.releaseCount = 0
+
+    # files are written into the empty temporary folder
+    def prepare(self, fileName):
+        pass
+
+    def collect(self):
+        for fileName in sorted(os.listdir(self.outputPath)):
+            fullFileName = os.path.join(self.outputPath, fileName)
+
+            try:
+                self.store(fullFileName, fileName)
+            finally:
+                os.remove(fullFileName)
+
+    # write a staged file to its destination. Can run on any thread
+    @abc.abstractmethod
+    def store(self, fullFileName, fileName):
+        pass
+
+    #
+    # hand a written file over to post processing. The file is moved out of
+    # the temporary folder, so collect() doesn't see it. Returns the full name
+    # of the moved file or None if it doesn't exist
+    #
+    def release(self, fileName):
+        fullFileName = os.path.join(self.outputPath, fileName)
+        if not os.path.exists(fullFileName):
+            return None
+
+        if self.releasePath is None:
+            self.releasePath = tempfile.mkdtemp(prefix='FilteredExport')
+
+        self.releaseCount += 1
+        releasedFileName = os.path.join(self.releasePath, str(self.releaseCount) + '-' + fileName)
+        os.replace(fullFileName, releasedFileName)
+
+        return releasedFileName
+
+    # move a released file to its destination. Can run on any thread
+    def commit(self, fullFileName, fileName):
+        try:
+            self.store(fullFileName, fileName)
+        finally:
+            os.remove(fullFileName)
+
+    #
+    # create a file from a file that was collected before. Returns True for a
+    # hard link and False for a copy
+    #
+    def duplicate(self, sourceFileName, fileName):
+        return linkOrCopyFile(os.path.join(self.location, sourceFileName + self.fileSuffix), os.path.join(self.location, fileName + self.fileSuffix))
+
+    def close(self):
+        try:
+            self.collect()
+        finally:
+            shutil.rmtree(self.outputPath, ignore_errors=True)
+
+            if self.releasePath is not None:
+                shutil.rmtree(self.releasePath, ignore_errors=True)
+
+
+#
+# each file is gzip compressed into the export folder
+#
+class GzipFolderSink(StagedSink):
+    def __init__(self, exportPath):
+        super().__init__(exportPath)
+        self.fileSuffix = S_SINK_GZIP_EXTENSION
+
+    def store(self, fullFileName, fileName):
+        targetFileName = os.path.join(self.location, fileName + S_SINK_GZIP_EXTENSION)
+        removeLinkedFile(targetFileName)
+
+        with open(fullFileName, 'rb') as sourceFile, \
+                gzip.GzipFile(targetFileName, 'wb', mtime=0) as targetFile:
+            shutil.copyfileobj(sourceFile, targetFile)
+
+
+#
+# all files are streamed into one zip archive. With gzipFiles each file is
+# gzip compressed and stored as it is. Entries are written one at a time, so
+# files can be committed from several threads
+#
+class ZipSink(StagedSink):
+    def __init__(self, archiveFileName, compression, gzipFiles=False):
+        super().__init__(archiveFileName)
+        self.compression = compression
+        self.gzipFiles = gzipFiles
+        self.fileSuffix = S_SINK_GZIP_EXTENSION if gzipFiles else ''
+        self.isArchive = True
+        self.lock = threading.Lock()
+
+        try:
+            self.zipFile = zipfile.ZipFile(archiveFileName, 'w', compression)
+        except OSError:
+            shutil.rmtree(self.outputPath, ignore_errors=True)
+            raise
+
+    def store(self, fullFileName, fileName):
+        with self.lock:
+            self.storeEntry(fullFileName, fileName)
+
+    def storeEntry(self, fullFileName, fileName):
+        if self.gzipFiles:
+            zipInfo = zipfile.ZipInfo(fileName + S_SINK_GZIP_EXTENSION)
+            zipInfo.compress_type = zipfile.ZIP_STORED
+
+            with open(fullFileName, 'rb') as sourceFile, self.zipFile.open(zipInfo, 'w', force_zip64=True) as entryFile, \
+                    gzip.GzipFile(fileName, 'wb', fileobj=entryFile, mtime=0) as targetFile:
+                shutil.copyfileobj(sourceFile, targetFile)
+
+        else:
+            self.zipFile.write(fullFileName, fileName, self.getCompressType(fileName))
+
+    # files that are compressed already are stored as they are
+    def getCompressType(self, fileName):
+        if fileName.lower().endswith(S_SINK_COMPRESSED_EXTENSIONS):
+            return zipfile.ZIP_STORED
+
+        return self.compression
+
+    #
+    # add an entry with the content of an entry that was added before. An
+    # archive can't link entries, so the content is copied
+    #
+    def duplicate(self, sourceFileName, fileName):
+        with self.lock:
+            content = self.zipFile.read(sourceFileName + self.fileSuffix)
+            self.zipFile.writestr(fileName + self.fileSuffix, content, self.getCompressType(fileName + self.fileSuffix))
+
+        return False
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self.zipFile.close()
+
+
+#
+# create the sink of an export. Archives are named after the design and
+# created in the export folder
+#
+def createSink(sinkType, exportPath, archiveName, gzipFiles=False):
+    if sinkType == S_SINK_ZIP_DEFLATE:
+        return ZipSink(os.path.join(exportPath, archiveName + S_SINK_ZIP_EXTENSION), zipfile.ZIP_DEFLATED, gzipFiles)
+
+    if sinkType == S_SINK_ZIP_LZMA:
+        if lzma is None:
+            raise ValueError('LZMA compression is not available.')
+
+        return ZipSink(os.path.join(exportPath, archiveName + S_SINK_ZIP_EXTENSION), zipfile.ZIP_LZMA, gzipFiles)
+
+    if gzipFiles:
+        return GzipFolderSink(exportPath)
+
+    return FolderSink(exportPath)
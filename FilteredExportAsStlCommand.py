@@ -2,8 +2,53 @@ import adsk.core
 import adsk.fusion
 import traceback
 import os.path
-import re
-
+import time
+
+from .FilteredExportIndexStore import getAssemblyIndex
+from .FilteredExportFilter import parseFilterExpression
+from .FilteredExportFileNames import FileNamePlanner
+from .FilteredExportFileNames import getCleanName
+from .FilteredExportMesh import exportBodyAsStl
+from .FilteredExportMesh import exportBodiesAsStl
+from .FilteredExport3mf import exportComponentsAs3mf
+from .FilteredExport3mf import getOccurrenceTransforms
+from .FilteredExport3mf import S_3MF_EXTENSION
+from .FilteredExportArchive import createSink
+from .FilteredExportArchive import S_SINK_FOLDER
+from .FilteredExportArchive import S_SINK_ZIP_DEFLATE
+from .FilteredExportArchive import S_SINK_ZIP_LZMA
+from .FilteredExportManifest import ExportManifest
+from .FilteredExportManifest import getBodiesFingerprint
+from .FilteredExportManifest import getSettingsFingerprint
+from .FilteredExportJournal import openJournal
+from .FilteredExportJournal import S_JOURNAL_STATUS_UNCHANGED
+from .FilteredExportPlan import ExportPlan
+from .FilteredExportPlan import ExportPlanUnit
+from .FilteredExportPlan import loadExportPlan
+from .FilteredExportPlan import S_PLAN_FILE_EXTENSION
+from .FilteredExportDuplicates import findDuplicates
+from .FilteredExportDuplicates import DuplicateStatistics
+from .FilteredExportValidation import isValidationAvailable
+from .FilteredExportPostProcess import postProcessFile
+from .FilteredExportPostProcess import postProcessDuplicate
+from .FilteredExportProgress import getFileSize
+from .FilteredExportSession import ExportSession
+from .FilteredExportScheduler import ExportJob
+from .FilteredExportScheduler import exportScheduler
+from .FilteredExportScheduler import renderJobError
+from .FilteredExportScheduler import runSteps
+from .FilteredExportPreflight import BodyMeasures
+from .FilteredExportPreflight import PreflightEstimation
+from .FilteredExportPreflight import estimateTriangleCount
+from .FilteredExportPreflight import getBudgetDeviation
+from .FilteredExportPreflight import getCalibrationFactor
+from .FilteredExportPreflight import S_PREFLIGHT_MAX_SURFACE_DEVIATION
+from .FilteredExportPreflight import S_PREFLIGHT_MAX_NORMAL_DEVIATION
+from .FilteredExportInstrumentation import apiProfiler
+from .FilteredExportInstrumentation import S_PROFILE_PHASE_SELECTION
+from .FilteredExportInstrumentation import S_PROFILE_PHASE_BODIES
+from .FilteredExportInstrumentation import S_PROFILE_PHASE_EXPORT
+from .FilteredExportUtil import normaliseSelection
 from .FilteredExportUtil import renderResultMessage
 from .FilteredExportUtil import FilteredExportResult
 
@@ -24,6 +69,13 @@ S_STL_ASPECT_RATIO = 'stlAspectRatio'
 S_STL_FORMAT_LOOKUP = 'stlDropDownStlFormat'
 S_STL_FORMAT_BINARY = 'Binary'
 S_STL_FORMAT_TEXT = 'Text'
+S_STL_FORMAT_3MF = '3MF'
+S_STL_WRITER_LOOKUP = 'stlDropDownStlWriter'
+S_STL_WRITER_EXPORT_MANAGER = 'Fusion 360'
+S_STL_WRITER_MESH = 'Mesh'
+S_STL_OUTPUT_LOOKUP = 'stlDropDownStlOutput'
+S_STL_OUTPUT_BODY = 'File per body'
+S_STL_OUTPUT_COMPONENT = 'File per component'
 S_STL_EXPORT_ADD_ROOT_NAME_TO_FILENAME_LOOKUP = 'stlExportAddRootNameToFilename'
 S_STL_EXPORT_ADD_COMPONENT_NAME_TO_FILENAME_LOOKUP = 'stlExportAddComponentNameToFilename'
 S_STL_EXPORT_REMOVE_VERSION_FROM_FILENAME_LOOKUP = 'stlExportFileRemoveVersionTagFromNames'
@@ -31,253 +83,681 @@ S_STL_EXPORT_REMOVE_SPACES_FROM_FILENAME_LOOKUP = 'stlExportFileRemoveSpacesFrom
 S_STL_GROUP_FILENAME_OPTIONS_LOOKUP = 'stlFilenameGroupFilenameOptions'
 S_STL_SELECTION_LOOKUP='stlSelection'
 S_STL_FILTER_LINKED_COMPONENTS = 'stlExportFilterLinkedComponents'
+S_STL_FILTER_EXPRESSION = 'stlFilterExpression'
 S_STL_EXPORT_COMPONENT_NAME_TYPE = 'stlDropDownExportComponentNameType'
 S_STL_EXPORT_COMPONENT_NAME_TYPE_LAST_FROM_PATH = 'Last From Path'
 S_STL_EXPORT_COMPONENT_NAME_TYPE_FULL_PATH = 'Full Path'
 S_STL_EXPORT_ADD_REFINMENT_NAME_TO_NAME = 'stlExportAddRefinmentNameToName'
+S_STL_SKIP_UNCHANGED = 'stlSkipUnchangedBodies'
+S_STL_PREFLIGHT = 'stlPreflightEstimation'
+S_STL_TRIANGLE_BUDGET = 'stlTriangleBudget'
+S_STL_SINK_LOOKUP = 'stlDropDownSink'
+S_STL_GZIP_FILES = 'stlGzipFiles'
+S_STL_EXPORT_DUPLICATES_ONCE = 'stlExportDuplicatesOnce'
+S_STL_VALIDATE_MESHES = 'stlValidateMeshes'
+S_STL_RUN_IN_BACKGROUND = 'stlRunInBackground'
+S_STL_POST_PROCESS_THREADS = 'stlPostProcessThreads'
+S_STL_WRITE_CHECKSUMS = 'stlWriteChecksums'
+S_STL_RESUME_LAST_EXPORT = 'stlResumeLastExport'
+S_STL_PLAN_LOOKUP = 'stlDropDownPlan'
+S_STL_PLAN_EXPORT = 'Export'
+S_STL_PLAN_WRITE = 'Write plan (dry run)'
+S_STL_PLAN_EXECUTE = 'Execute plan'
+S_STL_FILE_EXTENSION = '.stl'
+S_STL_PROGRESS_TITLE = 'STL Export'
+
+# the journal name ends with the format, each format is resumed on its own
+S_STL_JOURNAL_NAME = 'STL_'
+
+# surface deviation (cm) and normal deviation (degree) of the refinements
+S_STL_REFINEMENT_PRESETS = {
+    S_STL_REFINEMENT_ULTRA: (0.000508, 5.0),
+    S_STL_REFINEMENT_HIGH: (0.001016, 10.0),
+    S_STL_REFINEMENT_MEDIUM: (0.003212, 15.0),
+    S_STL_REFINEMENT_LOW: (0.008069, 30.0)
+}
 
-# build a file name from a component. File name looks like:
-# body parent component name + - + body name. leading and
-# tailing blanks will be removed and blanks are replace replaced
-# with an underscore.
-# If the file name already exists in a list, and index suffix will
-# be added (index)
 #
+# get path via dialog
+#
+def getPath(appObjects):
+    # return value
+    exportPath = ''
+
+    # create dialog
+    folderDialog = appObjects.ui.createFolderDialog()
+    folderDialog.title = 'Export Folder'
+
+    # open dialog
+    dialogResult = folderDialog.showDialog()
+
+    # check if user finished the dialog by pressing okay
+    if dialogResult == adsk.core.DialogResults.DialogOK:
+        exportPath = str.format(folderDialog.folder)
+    else:
+        # user canceled the dialog
+        raise ValueError('No export path defined.')
+
+    # return formated path
+    return exportPath
 
 #
-# cleans up a name by removing leading and tailing spaces, version tags and
-# replaces blanks with underscores (_)
+# get the file of a saved export plan via dialog
 #
-def getCleanName(name, removeVersionTagFromNames, removeSpaces):
-    result = name
+def getPlanFile(appObjects):
+    fileDialog = appObjects.ui.createFileDialog()
+    fileDialog.title = 'Export Plan'
+    fileDialog.filter = 'Export plans (*' + S_PLAN_FILE_EXTENSION + ')'
+    fileDialog.isMultiSelectEnabled = False
 
-    # remove version tag
-    if removeVersionTagFromNames:
-        #remove versions from root
-        result = re.sub(r' v[0-9]*$', '', result)
-        
-    result = re.sub(r':', '__', result)
+    if fileDialog.showOpen() != adsk.core.DialogResults.DialogOK:
+        raise ValueError('No export plan selected.')
 
-    if removeSpaces:
-        # remove leading and tailing spaces
-        result = result.strip()
+    return fileDialog.filename
 
-        # replace spaces with underscores (_)
-        result = result.replace(' ', '_')
-    
-    # if the name contains dots it will fail silently during the export. 
-    # Replace it with a double underscore. 
-    result = result.replace('.', '__')
+#
+# names of the selected refinements. The refinement drop down is a check box
+# list, a single name is accepted as well
+#
+def getSelectedRefinements(input_values):
+    refinements = input_values.get(S_STL_REFINEMENT_LOOKUP)
 
-    # if name contains a slash it will fail to export (on windows)
-    # Replace those with double slashes
-    
-    result = result.replace('/', '__')
+    if isinstance(refinements, str):
+        return [refinements]
 
-    return result
+    if refinements is None:
+        refinements = []
+
+    selectedRefinements = [listItem.name for listItem in refinements if listItem.isSelected]
+
+    if len(selectedRefinements) == 0:
+        raise ValueError('No refinement selected.')
+
+    return selectedRefinements
 
 
 #
-# cleans up a component path by removing leading and tailing spaces, version tags and
-# replaces blanks with underscores (_)
+# surface deviation (cm) and normal deviation (degree) of a refinement
 #
-def getCleanNameFromComponentPath(name, removeVersionTagFromNames, removeSpaces):
-    result = name
+def getMeshDeviation(refinement, input_values):
+    if refinement in S_STL_REFINEMENT_PRESETS:
+        return S_STL_REFINEMENT_PRESETS[refinement]
 
-    # remove versions from components from path
-    if removeVersionTagFromNames:
-        result = re.sub(r':[0-9]*\+', '-', result)
-        result = re.sub(r':[0-9]*$', '', result)
-    else:
-        result = re.sub(r'\+', '__', result)
-        result = re.sub(r':', '__', result)
+    return input_values[S_STL_SURFACE_DEVIATION], input_values[S_STL_NORMAL_DEVIATION]
+
+
+#
+# export a body with the export manager of Fusion 360. A mesh deviation
+# (surface and normal deviation) replaces the deviations of the refinement
+#
+def exportStlWithExportManager(body, fullFileName, exportAsBinary, refinement, input_values, appObjects, meshDeviation=None):
+    # create common export options
+    stlExportOptions = appObjects.export_manager.createSTLExportOptions(body, fullFileName)
+    stlExportOptions.setToPrintUtility = False
+    stlExportOptions.isBinaryFormat = exportAsBinary
+    
+    # deviations of the triangle budget
+    if meshDeviation is not None:
+        stlExportOptions.meshRefinement = adsk.fusion.MeshRefinementSettings.MeshRefinementCustom
+        stlExportOptions.surfaceDeviation = meshDeviation[0]
+        stlExportOptions.normalDeviation = meshDeviation[1]
+
+    # adjust for ultra settings
+    elif refinement == S_STL_REFINEMENT_ULTRA:
+        surfaceDeviation, normalDeviation = S_STL_REFINEMENT_PRESETS[S_STL_REFINEMENT_ULTRA]
+        stlExportOptions.meshRefinement = adsk.fusion.MeshRefinementSettings.MeshRefinementCustom
+        stlExportOptions.surfaceDeviation = surfaceDeviation
+        stlExportOptions.normalDeviation = normalDeviation
+    
+    elif refinement == S_STL_REFINEMENT_HIGH:
+        stlExportOptions.meshRefinement = adsk.fusion.MeshRefinementSettings.MeshRefinementHigh
     
-    return getCleanName(result, removeVersionTagFromNames, removeSpaces)
+    elif refinement == S_STL_REFINEMENT_MEDIUM:
+        stlExportOptions.meshRefinement = adsk.fusion.MeshRefinementSettings.MeshRefinementMedium
     
+    elif refinement == S_STL_REFINEMENT_LOW:
+        stlExportOptions.meshRefinement = adsk.fusion.MeshRefinementSettings.MeshRefinementLow
     
+    elif refinement == S_STL_REFINEMENT_CUSTOM:
+        stlExportOptions.meshRefinement = adsk.fusion.MeshRefinementSettings.MeshRefinementCustom
+        stlExportOptions.surfaceDeviation = input_values[S_STL_SURFACE_DEVIATION]
+        stlExportOptions.normalDeviation = input_values[S_STL_NORMAL_DEVIATION]
+
+    # create stl file
+    appObjects.export_manager.execute(stlExportOptions)
+
+
 #
-# Get file name from body's name and component's name and remove unwanted information
+# fingerprint of the settings a file is exported with
 #
-def getFileName(body, rootComponent, addRootComponentNameToFilename, \
-                    addComponentNameToFilename, addLastComponentNameOnly, \
-                    removeVersionTagFromNames, removeSpaces, addRefinmentName, \
-                    refinementName, fileNames):
+def getStlSettingsFingerprint(useMeshWriter, stlFormat, refinement, surfaceDeviation, normalDeviation):
+    return getSettingsFingerprint({
+        'writer': S_STL_WRITER_MESH if useMeshWriter else S_STL_WRITER_EXPORT_MANAGER,
+        'format': stlFormat,
+        'refinement': refinement,
+        'surfaceDeviation': surfaceDeviation,
+        'normalDeviation': normalDeviation
+    })
 
-    # build temporary  file name
-    tmpFileName = ''
 
-    if addRefinmentName:
-        tmpFileName += refinementName + '-'
-        
-    # add root component name if checked
-    if addRootComponentNameToFilename and (rootComponent != body[0].parentComponent or not addComponentNameToFilename):
-        tmpFileName += getCleanName(rootComponent.name, removeVersionTagFromNames, removeSpaces) + '-'
-
-    # add component name if checked and is differnt to root component
-    if addComponentNameToFilename:
-        if addLastComponentNameOnly: 
-            tmpFileName += getCleanName(body[0].parentComponent.name, removeVersionTagFromNames, removeSpaces) + '-'
-        else:
-            tmpFileName += getCleanNameFromComponentPath(body[1], removeVersionTagFromNames, removeSpaces) + '-'
-
-    tmpFileName += getCleanName(body[0].name, removeVersionTagFromNames, removeSpaces)
-    
-    # make file name unique within this export
-    fileName = tmpFileName
-    suffix = 1
+#
+# group the bodies by component. The bodies of a component are next to each
+# other and share the path of the component
+#
+def getComponentBodies(bodies):
+    componentBodies = []
+    fullPathName = None
+
+    for body in bodies:
+        if body[1] != fullPathName:
+            fullPathName = body[1]
+            componentBodies.append([])
+
+        componentBodies[-1].append(body)
 
-    while fileName in fileNames:
-        fileName = tmpFileName + '_(' + str(suffix) + ')'
-        suffix += 1
+    return componentBodies
 
-    # return unique file name
-    return fileName
 
 #
-# get path via dialog
+# estimate triangles and file size of each file in each refinement. With a
+# triangle budget the deviations of files above the budget are increased. The
+# budget of a file is shared by its bodies according to their area. Returns
+# the estimation and per file and refinement the deviations of the bodies
+# (None if the deviations of the refinement are used)
 #
-def getPath(appObjects):
-    # return value
-    exportPath = ''
+def estimateStls(exportUnits, refinementSettings, fileFormat, triangleBudget):
+    estimation = PreflightEstimation(fileFormat, triangleBudget)
+    meshDeviations = []
 
-    # create dialog
-    folderDialog = appObjects.ui.createFolderDialog()
-    folderDialog.title = 'Export Folder'
+    unitMeasures = [[BodyMeasures(body[0]) for body in unitBodies] for unitFileName, unitBodies in exportUnits]
 
-    # open dialog
-    dialogResult = folderDialog.showDialog()
+    # a few bodies are tessellated per refinement to scale the estimation
+    # to the meshes of the writer
+    bodies = [(body[0], bodyMeasures) for (unitFileName, unitBodies), measures in zip(exportUnits, unitMeasures) \
+                for body, bodyMeasures in zip(unitBodies, measures)]
+    calibrationFactors = [getCalibrationFactor(bodies, surfaceDeviation, normalDeviation) \
+                            for refinement, prefix, surfaceDeviation, normalDeviation, settingsFingerprint in refinementSettings]
 
-    # check if user finished the dialog by pressing okay
-    if dialogResult == adsk.core.DialogResults.DialogOK:
-        exportPath = str.format(folderDialog.folder)
+    # bodies that reach the limits of the deviations are estimated with
+    # meshes of the coarsest deviations
+    coarsestDeviation = (S_PREFLIGHT_MAX_SURFACE_DEVIATION, S_PREFLIGHT_MAX_NORMAL_DEVIATION)
+    coarsestFactor = getCalibrationFactor(bodies, *coarsestDeviation) if triangleBudget > 0 else 1.0
+
+    for (unitFileName, unitBodies), measures in zip(exportUnits, unitMeasures):
+        totalArea = sum(bodyMeasures.area for bodyMeasures in measures)
+
+        # share of the budget per body
+        bodyBudgets = [0] * len(measures)
+        if triangleBudget > 0:
+            for index, bodyMeasures in enumerate(measures):
+                share = bodyMeasures.area / totalArea if totalArea > 0.0 else 1.0 / len(measures)
+                bodyBudgets[index] = max(1, int(triangleBudget * share))
+
+        unitDeviations = []
+        for (refinement, prefix, surfaceDeviation, normalDeviation, settingsFingerprint), calibrationFactor in zip(refinementSettings, calibrationFactors):
+            bodyDeviations = [getBudgetDeviation(bodyMeasures, surfaceDeviation, normalDeviation, bodyBudget, calibrationFactor) \
+                                for bodyMeasures, bodyBudget in zip(measures, bodyBudgets)]
+            isReduced = any(bodyDeviation != (surfaceDeviation, normalDeviation) for bodyDeviation in bodyDeviations)
+            triangleCount = sum(estimateTriangleCount(bodyMeasures, *bodyDeviation, coarsestFactor if bodyDeviation == coarsestDeviation else calibrationFactor) \
+                                for bodyMeasures, bodyDeviation in zip(measures, bodyDeviations))
+
+            estimation.add(prefix + unitFileName, triangleCount, isReduced)
+            unitDeviations.append(bodyDeviations if isReduced else None)
+
+        meshDeviations.append(unitDeviations)
+
+    return estimation, meshDeviations
+
+
+#
+# name of a 3MF file without refinement, the file is named after the root component
+#
+def getDesignFileName(rootComponent, input_values):
+    return getCleanName(rootComponent.name, input_values[S_STL_EXPORT_REMOVE_VERSION_FROM_FILENAME_LOOKUP], \
+                        input_values[S_STL_EXPORT_REMOVE_SPACES_FROM_FILENAME_LOOKUP])
+
+
+#
+# export all components into one 3MF file per refinement. Each component is
+# written once and placed at all its visible occurrences. Yields before each
+# file and returns the names of the processed, of the unchanged and of the
+# resumed files
+#
+def export3mfs(exportUnits, refinementSettings, meshDeviations, rootComponent, designFileName, selectedPaths, filterLinkedComponents, componentFilter, \
+               exportSink, manifest, skipUnchanged, input_values, progress, postProcessPool, journal):
+    processedFiles = []
+    unchangedFiles = []
+    resumedFiles = []
+
+    # transforms of the occurrences of each component within the selected
+    # paths that pass the filters of the traversal
+    unitTransforms = [getOccurrenceTransforms(unitBodies[0][0].parentComponent, rootComponent, selectedPaths, filterLinkedComponents, componentFilter) \
+                        for unitFileName, unitBodies in exportUnits]
+
+    # the file changes with the geometry and the placement of the components
+    contentFingerprint = getSettingsFingerprint([[unitFileName, getBodiesFingerprint([body[0] for body in unitBodies]), transforms] \
+                                                    for (unitFileName, unitBodies), transforms in zip(exportUnits, unitTransforms)])
+
+    for refinementIndex, (refinement, prefix, surfaceDeviation, normalDeviation, settingsFingerprint) in enumerate(refinementSettings):
+        # each file is a step of the export
+        yield
+
+        if progress.wasCancelled:
+            break
+
+        fileName = prefix + designFileName
+
+        # deviations per component, increased to meet the triangle budget
+        components = []
+        reducedDeviations = []
+        for unitIndex, ((unitFileName, unitBodies), transforms) in enumerate(zip(exportUnits, unitTransforms)):
+            bodyDeviations = meshDeviations[unitIndex][refinementIndex] if meshDeviations else None
+            reducedDeviations.append(bodyDeviations)
+
+            if bodyDeviations is None:
+                bodyDeviations = [(surfaceDeviation, normalDeviation)] * len(unitBodies)
+
+            components.append((unitFileName, [body[0] for body in unitBodies], bodyDeviations, transforms))
+
+        if any(bodyDeviations is not None for bodyDeviations in reducedDeviations):
+            settingsFingerprint = getSettingsFingerprint([settingsFingerprint, reducedDeviations])
+
+        outputFileName = fileName + S_3MF_EXTENSION
+
+        # finished by the export that is resumed
+        if journal is not None and journal.isFinished(fileName, outputFileName + exportSink.fileSuffix, contentFingerprint, settingsFingerprint):
+            resumedFiles.append(fileName)
+            manifest.update(fileName, contentFingerprint, settingsFingerprint)
+            progress.advance()
+            continue
+
+        if skipUnchanged and manifest.isUnchanged(fileName, outputFileName + exportSink.fileSuffix, contentFingerprint, settingsFingerprint):
+            unchangedFiles.append(fileName)
+            if journal is not None:
+                journal.add(fileName, outputFileName, contentFingerprint, settingsFingerprint, S_JOURNAL_STATUS_UNCHANGED)
+
+            progress.advance()
+            continue
+
+        progress.start(fileName)
+        exportSink.prepare(outputFileName)
+        exportComponentsAs3mf(os.path.join(exportSink.outputPath, fileName), components)
+
+        # hash the file and move it to its destination in the background. The
+        # journal records the file when it is in place
+        byteCount = getFileSize(os.path.join(exportSink.outputPath, outputFileName))
+        if journal is not None:
+            journal.addPending(fileName, outputFileName, contentFingerprint, settingsFingerprint)
+
+        postProcessPool.submit(postProcessFile, exportSink, exportSink.release(outputFileName), outputFileName, False, \
+                                input_values.get(S_STL_WRITE_CHECKSUMS, False))
+        progress.finish(byteCount)
+
+        processedFiles.append(fileName)
+        manifest.update(fileName, contentFingerprint, settingsFingerprint)
+
+    return processedFiles, unchangedFiles, resumedFiles
+
+
+#
+# plan the STL export: format options, refinements, file names and, with a
+# triangle budget, the deviations of each body. Nothing is written and only
+# the estimation tessellates a few bodies. Returns the plan and the estimation
+# (None without preflight and budget)
+#
+def planStlExport(bodies: list, rootComponent, input_values, appObjects, selection=None):
+    stlFormat = input_values[S_STL_FORMAT_LOOKUP]
+
+    # 3MF files contain each component once and place it at its occurrences
+    export3mf = stlFormat == S_STL_FORMAT_3MF
+
+    # one file per body or one file per component. The bodies of a component
+    # are merged by the mesh writer, because the export manager would add the
+    # sub components and ignore the body filter
+    exportComponents = input_values.get(S_STL_OUTPUT_LOOKUP) == S_STL_OUTPUT_COMPONENT or export3mf
+
+    # write the files with the export manager of Fusion 360 or with the mesh writer
+    useMeshWriter = input_values.get(S_STL_WRITER_LOOKUP) == S_STL_WRITER_MESH or exportComponents
+
+    # each body is exported once per selected refinement. With more than one
+    # refinement the refinement name keeps the file names distinct
+    refinements = getSelectedRefinements(input_values)
+    addRefinementName = input_values[S_STL_EXPORT_ADD_REFINMENT_NAME_TO_NAME] or len(refinements) > 1
+
+    # plan the file names of all bodies or components in one pass. The
+    # refinement name is added per refinement below
+    fileNamePlanner = FileNamePlanner(rootComponent, \
+                                input_values[S_STL_EXPORT_ADD_ROOT_NAME_TO_FILENAME_LOOKUP], \
+                                input_values[S_STL_EXPORT_ADD_COMPONENT_NAME_TO_FILENAME_LOOKUP], \
+                                input_values[S_STL_EXPORT_COMPONENT_NAME_TYPE] == S_STL_EXPORT_COMPONENT_NAME_TYPE_LAST_FROM_PATH, \
+                                input_values[S_STL_EXPORT_REMOVE_VERSION_FROM_FILENAME_LOOKUP], \
+                                input_values[S_STL_EXPORT_REMOVE_SPACES_FROM_FILENAME_LOOKUP], \
+                                False, \
+                                '')
+
+    # each file is written from a list of bodies
+    if exportComponents:
+        componentBodies = getComponentBodies(bodies)
+        exportUnits = list(zip(fileNamePlanner.planComponentFileNames(componentBodies), componentBodies))
     else:
-        # user canceled the dialog
-        raise ValueError('No export path defined.')
+        exportUnits = [(fileName, [body]) for fileName, body in zip(fileNamePlanner.planFileNames(bodies), bodies)]
+
+    # a 3MF file is named after the root component and places the components
+    # at their occurrences within the selection that pass the filters
+    plan = ExportPlan(S_STL_PROGRESS_TITLE, rootComponent.name, {
+        'format': stlFormat,
+        'writer': S_STL_WRITER_MESH if useMeshWriter else S_STL_WRITER_EXPORT_MANAGER,
+        'output': S_STL_OUTPUT_COMPONENT if exportComponents else S_STL_OUTPUT_BODY,
+        'extension': S_3MF_EXTENSION if export3mf else S_STL_FILE_EXTENSION,
+        'designFileName': getDesignFileName(rootComponent, input_values) if export3mf else None,
+        'selectedPaths': [entity.fullPathName for entity in selection] if export3mf and selection else None,
+        'filterLinkedComponents': input_values[S_STL_FILTER_LINKED_COMPONENTS] if export3mf else None,
+        'filterExpression': input_values.get(S_STL_FILTER_EXPRESSION) or None if export3mf else None
+    })
+
+    dataFile = appObjects.document.dataFile
+    if dataFile is not None:
+        plan.documentId = dataFile.id
+        plan.versionNumber = dataFile.versionNumber
+
+    # mesh deviations and settings fingerprint per refinement
+    for refinement in refinements:
+        surfaceDeviation, normalDeviation = getMeshDeviation(refinement, input_values)
+        settingsFingerprint = getStlSettingsFingerprint(useMeshWriter, stlFormat, refinement, surfaceDeviation, normalDeviation)
+        plan.addRefinement(refinement, refinement + '-' if addRefinementName else '', surfaceDeviation, normalDeviation, settingsFingerprint)
+
+    # estimate triangles and file sizes before anything is written. The
+    # triangle budget (0 = off) increases the deviations of large bodies
+    triangleBudget = input_values.get(S_STL_TRIANGLE_BUDGET, 0)
+    estimation = None
+    meshDeviations = None
+
+    if input_values.get(S_STL_PREFLIGHT, False) or triangleBudget > 0:
+        estimation, meshDeviations = estimateStls(exportUnits, plan.refinements, stlFormat, triangleBudget)
+
+    for unitIndex, (unitFileName, unitBodies) in enumerate(exportUnits):
+        unit = plan.addUnit(ExportPlanUnit(unitFileName, unitBodies[0][1], unitBodies[0][0].parentComponent.name))
+        unit.meshDeviations = meshDeviations[unitIndex] if meshDeviations else [None] * len(refinements)
+
+        for body in unitBodies:
+            unit.addBody(body[0])
+
+    return plan, estimation
 
-    # return formated path
-    return exportPath
 
 #
-# export the list of bodies as STL files
+# steps of the STL export. The generator yields before each file and returns
+# the result, so the files can be written in slices by the export scheduler.
+# Planning and dialogs run before the first file
+#
+def iterExportStls(bodies: list, rootComponent, input_values, appObjects, selection=None):
+    plan, estimation = planStlExport(bodies, rootComponent, input_values, appObjects, selection)
+
+    if input_values.get(S_STL_PREFLIGHT, False):
+        dialogResult = appObjects.ui.messageBox('Estimated export:\n   ' + estimation.render() + '\n\nContinue?', 'Preflight estimation', \
+                                                adsk.core.MessageBoxButtonTypes.YesNoButtonType, adsk.core.MessageBoxIconTypes.QuestionIconType)
+
+        if dialogResult != adsk.core.DialogResults.DialogYes:
+            raise ValueError('Export cancelled after preflight estimation.')
+
+    return (yield from iterExecuteStlPlan(plan, rootComponent, input_values, appObjects, estimation))
+
+
 #
-def exportStls(bodies: list, rootComponent, input_values, appObjects):
+# steps of the execution of an export plan, e.g. of a plan that was saved
+# before. The plan defines the files, the output sink, the post processing
+# and the resume are taken from the inputs of the command
+#
+def iterExecuteStlPlan(plan, rootComponent, input_values, appObjects, estimation=None):
     # list of processed file names
     processedFiles = []
 
+    # format options of the plan
+    stlFormat = plan.options['format']
+    exportAsBinary = stlFormat == S_STL_FORMAT_BINARY
+    export3mf = stlFormat == S_STL_FORMAT_3MF
+    exportComponents = plan.options['output'] == S_STL_OUTPUT_COMPONENT
+    useMeshWriter = plan.options['writer'] == S_STL_WRITER_MESH
+
+    # check each written STL file for degenerate triangles, open edges and
+    # inconsistent normals. 3MF files are welded and not validated
+    validateMeshes = input_values.get(S_STL_VALIDATE_MESHES, False) and not export3mf
+    if validateMeshes and not isValidationAvailable():
+        raise ValueError('Mesh validation needs NumPy.')
+
+    # bodies and deviations per file
+    exportUnits = [(unit.fileName, [[body, unit.sourcePath] for body in unit.bodies]) for unit in plan.units]
+    refinementSettings = plan.refinements
+    meshDeviations = [unit.meshDeviations for unit in plan.units]
+
+    # a resumed export skips the files that the journal of the last export
+    # into the same folder records as finished. Archives are written from
+    # scratch, so only exports into a folder are journaled
+    sinkType = input_values.get(S_STL_SINK_LOOKUP, S_SINK_FOLDER)
+    resumeExport = input_values.get(S_STL_RESUME_LAST_EXPORT, False)
+    if resumeExport and sinkType != S_SINK_FOLDER:
+        raise ValueError('Only exports into a folder can be resumed.')
+
     # get export path
     exportPath = getPath(appObjects)
 
-    # export stl as binary (True) or text (False)
-    exportAsBinary = input_values[S_STL_FORMAT_LOOKUP] == S_STL_FORMAT_BINARY
-
     # if file name is empty, replace it with a know directory
     if exportPath == '':
         exportPath = os.path.dirname
 
-    # export each body as stl
-    for body in bodies:
-        # get clean file name
-    
-        fileName = getFileName(body, rootComponent, \
-                                    input_values[S_STL_EXPORT_ADD_ROOT_NAME_TO_FILENAME_LOOKUP], \
-                                    input_values[S_STL_EXPORT_ADD_COMPONENT_NAME_TO_FILENAME_LOOKUP], \
-                                    input_values[S_STL_EXPORT_COMPONENT_NAME_TYPE] == S_STL_EXPORT_COMPONENT_NAME_TYPE_LAST_FROM_PATH, \
-                                    input_values[S_STL_EXPORT_REMOVE_VERSION_FROM_FILENAME_LOOKUP], \
-                                    input_values[S_STL_EXPORT_REMOVE_SPACES_FROM_FILENAME_LOOKUP], \
-                                    input_values[S_STL_EXPORT_ADD_REFINMENT_NAME_TO_NAME], \
-                                    input_values[S_STL_REFINEMENT_LOOKUP], \
-                                    processedFiles)
-        
-        # create full export name (including path)
-        fullFileName = os.path.join(exportPath, fileName)
+    # the journal starts with the planned file names. The plan and the gzip
+    # compression define the written files, so a resumed export must use both
+    journal = None
+    resumedFiles = []
+    if sinkType == S_SINK_FOLDER:
+        journal = openJournal(exportPath, S_STL_JOURNAL_NAME + stlFormat, S_STL_PROGRESS_TITLE, getSettingsFingerprint([plan.getFingerprint(), input_values.get(S_STL_GZIP_FILES, False)]), \
+                                plan.fileNames, resumeExport)
+
+    # files are written into the export folder, gzip compressed or streamed into one archive
+    exportSink = createSink(sinkType, exportPath, getCleanName(rootComponent.name, True, True) + '_STL', input_values.get(S_STL_GZIP_FILES, False))
+
+    # the manifest of the export folder knows which bodies were exported with
+    # which settings. Unchanged bodies are skipped if requested. An archive is
+    # written from scratch, so nothing is skipped
+    skipUnchanged = input_values.get(S_STL_SKIP_UNCHANGED, False) and not exportSink.isArchive
+    manifest = ExportManifest(exportPath).load()
+    unchangedFiles = []
+
+    # geometrically identical bodies at the same position are exported once.
+    # The files of the other bodies are hard links or copies of the first file
+    duplicateOf = None
+    duplicateStatistics = None
+    if input_values.get(S_STL_EXPORT_DUPLICATES_ONCE, False) and not exportComponents:
+        duplicateOf = findDuplicates([unitBodies[0][0] for unitFileName, unitBodies in exportUnits])
+        duplicateStatistics = DuplicateStatistics(duplicateOf)
+
+    # output file, export time and post processing per unit and refinement index
+    exportedFiles = {}
+
+    writeChecksums = input_values.get(S_STL_WRITE_CHECKSUMS, False)
+
+    # each file is an item of the progress dialog. A cancelled export stops
+    # between two files and keeps the files that were written. Validation,
+    # hashing and moving of the written files run on worker threads while
+    # the next file is exported. Without threads at once. The journal
+    # records each file after its post processing
+    session = ExportSession(appObjects.ui, S_STL_PROGRESS_TITLE, exportSink, journal, input_values.get(S_STL_POST_PROCESS_THREADS, 0), \
+                            len(refinementSettings) if export3mf else len(exportUnits) * len(refinementSettings))
+    progress = session.progress
+    postProcessPool = session.postProcessPool
+
+    with session:
+        # export all components into one 3MF file per refinement
+        if export3mf:
+            processedFiles, unchangedFiles, resumedFiles = yield from export3mfs(exportUnits, refinementSettings, meshDeviations, rootComponent, \
+                                                        plan.options['designFileName'], plan.options['selectedPaths'], plan.options['filterLinkedComponents'], \
+                                                        parseFilterExpression(plan.options['filterExpression']), exportSink, manifest, \
+                                                        skipUnchanged, input_values, progress, postProcessPool, journal)
+            exportUnits = []
+
+        # export each body or component as stl in all selected refinements
+        for unitIndex, (unitFileName, unitBodies) in enumerate(exportUnits):
+            if progress.wasCancelled:
+                break
+
+            brepBodies = [body[0] for body in unitBodies]
+            bodyFingerprint = getBodiesFingerprint(brepBodies)
+
+            for refinementIndex, (refinement, prefix, surfaceDeviation, normalDeviation, settingsFingerprint) in enumerate(refinementSettings):
+                # each file is a step of the export
+                yield
+
+                if progress.wasCancelled:
+                    break
+
+                fileName = prefix + unitFileName
+
+                # deviations that were increased to meet the triangle budget
+                bodyDeviations = meshDeviations[unitIndex][refinementIndex]
+                if bodyDeviations is not None:
+                    settingsFingerprint = getStlSettingsFingerprint(useMeshWriter, stlFormat, refinement, \
+                                                                    [bodyDeviation[0] for bodyDeviation in bodyDeviations], \
+                                                                    [bodyDeviation[1] for bodyDeviation in bodyDeviations])
+                else:
+                    bodyDeviations = [(surfaceDeviation, normalDeviation)] * len(brepBodies)
+
+                outputFileName = fileName + S_STL_FILE_EXTENSION
+
+                # finished by the export that is resumed
+                if journal is not None and journal.isFinished(fileName, outputFileName + exportSink.fileSuffix, bodyFingerprint, settingsFingerprint):
+                    resumedFiles.append(fileName)
+                    exportedFiles[(unitIndex, refinementIndex)] = (outputFileName, 0.0, None)
+                    manifest.update(fileName, bodyFingerprint, settingsFingerprint)
+                    progress.advance()
+                    continue
+
+                if skipUnchanged and manifest.isUnchanged(fileName, outputFileName + exportSink.fileSuffix, bodyFingerprint, settingsFingerprint):
+                    unchangedFiles.append(fileName)
+                    exportedFiles[(unitIndex, refinementIndex)] = (outputFileName, 0.0, None)
+                    if journal is not None:
+                        journal.add(fileName, outputFileName, bodyFingerprint, settingsFingerprint, S_JOURNAL_STATUS_UNCHANGED)
+
+                    progress.advance()
+                    continue
+
+                progress.start(fileName)
+
+                # link or copy the file of an identical body that was exported before
+                representative = (duplicateOf[unitIndex], refinementIndex) if duplicateOf else None
+                if representative in exportedFiles and representative[0] != unitIndex:
+                    sourceFileName, exportSeconds, sourceFuture = exportedFiles[representative]
+                    if journal is not None:
+                        journal.addPending(fileName, outputFileName, bodyFingerprint, settingsFingerprint)
+
+                    postProcessPool.submit(postProcessDuplicate, exportSink, sourceFileName, outputFileName, exportSeconds, sourceFuture)
+
+                    processedFiles.append(fileName)
+                    manifest.update(fileName, bodyFingerprint, settingsFingerprint)
+                    progress.finish()
+                    continue
+
+                # create full export name (including path)
+                fullFileName = os.path.join(exportSink.outputPath, fileName)
+                exportSink.prepare(outputFileName)
+                startTime = time.perf_counter()
+
+                if exportComponents:
+                    # tessellate all bodies of the component and write them into one file
+                    exportBodiesAsStl(brepBodies, fullFileName, exportAsBinary, bodyDeviations, unitFileName)
+                elif useMeshWriter:
+                    # tessellate and write the file without the export manager
+                    exportBodyAsStl(brepBodies[0], fullFileName, exportAsBinary, *bodyDeviations[0])
+                else:
+                    meshDeviation = bodyDeviations[0] if bodyDeviations[0] != (surfaceDeviation, normalDeviation) else None
+                    # the deviations of a custom refinement are taken from the plan
+                    refinementValues = {S_STL_SURFACE_DEVIATION: surfaceDeviation, S_STL_NORMAL_DEVIATION: normalDeviation}
+                    exportStlWithExportManager(brepBodies[0], fullFileName, exportAsBinary, refinement, refinementValues, appObjects, meshDeviation)
+
+                # validate, hash and move the file to its destination
+                byteCount = getFileSize(os.path.join(exportSink.outputPath, outputFileName))
+                exportSeconds = time.perf_counter() - startTime
+                if journal is not None:
+                    journal.addPending(fileName, outputFileName, bodyFingerprint, settingsFingerprint)
+
+                future = postProcessPool.submit(postProcessFile, exportSink, exportSink.release(outputFileName), outputFileName, \
+                                                validateMeshes, writeChecksums)
+                exportedFiles[(unitIndex, refinementIndex)] = (outputFileName, exportSeconds, future)
+
+                # add file name to processed list
+                processedFiles.append(fileName)
+                manifest.update(fileName, bodyFingerprint, settingsFingerprint)
+                progress.finish(byteCount)
+
+    # the files are exported, a missing manifest only costs time on the next run
+    if not exportSink.isArchive:
+        try:
+            manifest.save()
+        except OSError:
+            pass
 
-        # create common export options
-        stlExportOptions = appObjects.export_manager.createSTLExportOptions(body[0], fullFileName)
-        stlExportOptions.setToPrintUtility = False
-        stlExportOptions.isBinaryFormat = exportAsBinary
-        
-        # adjust for ultra settings
-        if input_values[S_STL_REFINEMENT_LOOKUP] == S_STL_REFINEMENT_ULTRA:
-            stlExportOptions.meshRefinement = 3
-            stlExportOptions.surfaceDeviation = input_values[S_STL_SURFACE_DEVIATION]
-            stlExportOptions.normalDeviation = input_values[S_STL_NORMAL_DEVIATION]
-        
-        elif input_values[S_STL_REFINEMENT_LOOKUP] == S_STL_REFINEMENT_HIGH:
-            stlExportOptions.meshRefinement = 0
-        
-        elif input_values[S_STL_REFINEMENT_LOOKUP] == S_STL_REFINEMENT_MEDIUM:
-            stlExportOptions.meshRefinement = 1
-        
-        elif input_values[S_STL_REFINEMENT_LOOKUP] == S_STL_REFINEMENT_LOW:
-            stlExportOptions.meshRefinement = 2
-        
-        elif input_values[S_STL_REFINEMENT_LOOKUP] == S_STL_REFINEMENT_CUSTOM:
-            stlExportOptions.mesRefinement = 3
-            stlExportOptions.surfaceDeviation = input_values[S_STL_SURFACE_DEVIATION]
-            stlExportOptions.normalDeviation = input_values[S_STL_NORMAL_DEVIATION]
+    exportResult = session.addResults(FilteredExportResult(exportSink.location, processedFiles, '', unchangedNames=unchangedFiles))
+    exportResult.resumedNames = resumedFiles
 
-        # create stl file
-        appObjects.export_manager.execute(stlExportOptions)
+    if estimation is not None:
+        exportResult.estimationReport = estimation.render()
 
-        # add file name to processed list
-        processedFiles.append(fileName)
+    exportResult.validationResults = [result.validation for result in postProcessPool.results if result.validation is not None]
+
+    if duplicateStatistics is not None:
+        for result in postProcessPool.results:
+            if result.isDuplicate:
+                duplicateStatistics.add(result.isLinked, result.exportSeconds)
 
-    return FilteredExportResult(exportPath, processedFiles, '')
+        exportResult.duplicateReport = duplicateStatistics.render()
+
+    return exportResult
 
 
 #
-# get a list of all bodies from all components
+# export all bodies at once
 #
-def getBodies(components: list, bodies: list):
-    # iterate over components
-    for component in components:
-        # process all bodies from the current component
-        if len(component) > 0:
-            for body in component[0].bRepBodies:
-                # add to list, if the body is not hidden
-                if body.isLightBulbOn:
-                    bodies.append([body, component[1]])
+def exportStls(bodies: list, rootComponent, input_values, appObjects, selection=None):
+    return runSteps(iterExportStls(bodies, rootComponent, input_values, appObjects, selection))
 
-    if len(bodies) <= 0:
-        raise ValueError('No bodies found.')
 
-    return bodies
+#
+# dry run: write the plan of the export as JSON into the export folder. The
+# plan can be executed later. Returns the message of the dry run
+#
+def writeStlPlan(bodies: list, rootComponent, input_values, appObjects, selection=None):
+    plan, estimation = planStlExport(bodies, rootComponent, input_values, appObjects, selection)
+
+    planFileName = os.path.join(getPath(appObjects), getCleanName(rootComponent.name, True, True) + '_STL' + S_PLAN_FILE_EXTENSION)
+    plan.save(planFileName)
+
+    message = 'Plan:\n   ' + planFileName + '\n   ' + plan.render() + '\n'
+
+    if estimation is not None:
+        message += 'Estimation:\n   ' + estimation.render() + '\n'
+
+    return message
 
 
 #
-# get all child occurences (components) recursively from a component
-# and return a unique list of components
+# get a list of all visible bodies from all components of the assembly index.
+# Bodies that don't match the body terms of the filter are skipped
 #
-def getComponents(occurences, components: list, includeSubComponents, filterLinkedComponents):
-    # iterate over all occurences
-    for occurence in occurences:
-        if (filterLinkedComponents == True and occurence.isReferencedComponent == False) or filterLinkedComponents == False:        
-            # if the component is not hidden process the component
-            if occurence.isLightBulbOn:
-                # validate if the current component was already processed
-                componentFound = False
-                component = adsk.fusion.Component.cast(None)
-    
-                # itereate over unique component list and compoare current
-                # occource with element of unique component list
-                for component in components:
-                    if component[0] == occurence.component:
-                        # component exisits in filted list. No need to process
-                        # the full list
-                        componentFound = True
-                        break
-    
-                # if occurence not found in unique list of components, add this
-                # occurence because it's new
-                if not componentFound and occurence.component:
-                    components.append([occurence.component, occurence.fullPathName])
-    
-                # if this occurence has sub components process them, too
-                if occurence.childOccurrences and not componentFound and includeSubComponents:
-                    components = getComponents(occurence.childOccurrences, components, includeSubComponents, filterLinkedComponents)
+def getBodies(assemblyIndex, bodies: list, bodyFilter=None):
+    if bodyFilter is not None and not bodyFilter.hasBodyTerms:
+        bodyFilter = None
+
+    # iterate over components
+    for entry in assemblyIndex:
+        # add all bodies that are not hidden
+        for body in entry.visibleBodies:
+            if bodyFilter is None or bodyFilter.acceptsBody(body):
+                bodies.append([body, entry.fullPathName])
 
+    if len(bodies) <= 0:
+        raise ValueError('No bodies found.')
+
+    return bodies
 
-    return components
 
 #
 # Export all boides within a design as separate STL file. The logic ensures
@@ -287,7 +767,10 @@ class FilteredExportAsStlCommand(Fusion360CommandBase):
     # Run when the user presses OK
     def on_execute(self, command: adsk.core.Command, inputs: adsk.core.CommandInputs, args, input_values):
         try:
-            appObjects = AppObjects()
+            # API calls are only counted if profiling is enabled
+            apiProfiler.start()
+            appObjects = apiProfiler.wrapAppObjects(AppObjects())
+            input_values = apiProfiler.wrapInputValues(input_values)
 
             # no design? Nothing to do
             if not appObjects.design:
@@ -296,31 +779,60 @@ class FilteredExportAsStlCommand(Fusion360CommandBase):
             # get root component
             rootComponent = appObjects.design.rootComponent
 
-            # get component list (recursive)
-            components = []
+            # export, write the plan of the export or execute a saved plan
+            planMode = input_values.get(S_STL_PLAN_LOOKUP, S_STL_PLAN_EXPORT)
+            assemblyIndex = None
 
-            # selection available?
-            if S_STL_SELECTION_LOOKUP in input_values:
-                if input_values[S_STL_SELECTION_LOOKUP][0] == rootComponent:
-                    components = getComponents(rootComponent.occurrences, components, True, input_values[S_STL_FILTER_LINKED_COMPONENTS])
-                else:
-                    # process selcted components
-                    components = getComponents(input_values[S_STL_SELECTION_LOOKUP], components, True, input_values[S_STL_FILTER_LINKED_COMPONENTS])
+            if planMode == S_STL_PLAN_EXECUTE:
+                # selection, filters and file names are part of the plan
+                with apiProfiler.phase(S_PROFILE_PHASE_BODIES):
+                    plan = loadExportPlan(getPlanFile(appObjects), S_STL_PROGRESS_TITLE).resolve(appObjects.design)
+
+                exportSteps = iterExecuteStlPlan(plan, rootComponent, input_values, appObjects)
             else:
-                # process all components
-                components = getComponents(rootComponent.occurrences, components, True, input_values[S_STL_FILTER_LINKED_COMPONENTS])
-                # add root component to list, because it can contain bodies, too
-                components.append([rootComponent, rootComponent.name])
-                
-            # get all bodies
-            bodies = []
-            bodies = getBodies(components, bodies)
+                with apiProfiler.phase(S_PROFILE_PHASE_SELECTION):
+                    # reduce selection to disjoint subtrees. A selection that contains the
+                    # root component is processed like an export of all components
+                    selection = normaliseSelection(input_values.get(S_STL_SELECTION_LOOKUP), rootComponent, True)
+
+                    # component terms of the filter are checked during the traversal,
+                    # body terms while the bodies are collected
+                    filterExpression = parseFilterExpression(input_values.get(S_STL_FILTER_EXPRESSION))
+
+                    # get index of all components (recursive). Without selection the root
+                    # component is added, because it can contain bodies, too
+                    assemblyIndex = getAssemblyIndex(self.traversal_cache, appObjects.document, appObjects.design, selection, True, \
+                                                        input_values[S_STL_FILTER_LINKED_COMPONENTS], S_STL_SELECTION_LOOKUP not in input_values, \
+                                                        filterExpression)
+
+                # get all bodies
+                with apiProfiler.phase(S_PROFILE_PHASE_BODIES):
+                    bodies = []
+                    bodies = getBodies(assemblyIndex, bodies, filterExpression)
+
+                # dry run: nothing is exported
+                if planMode == S_STL_PLAN_WRITE:
+                    appObjects.ui.messageBox(writeStlPlan(bodies, rootComponent, input_values, appObjects, selection))
+                    return
+
+                exportSteps = iterExportStls(bodies, rootComponent, input_values, appObjects, selection)
 
-            # process bodies
-            exportResult = exportStls(bodies, rootComponent, input_values, appObjects)
+            # process bodies. In the background the dialogs and the planning
+            # run now, the files are written in slices by the export scheduler
+            if input_values.get(S_STL_RUN_IN_BACKGROUND, False):
+                exportJob = ExportJob(self.cmd_name, exportSteps, \
+                                        lambda exportResult: self.showResult(appObjects, assemblyIndex, exportResult), \
+                                        lambda error: appObjects.ui.messageBox(renderJobError(error)))
 
-            # show result list
-            appObjects.ui.messageBox(renderResultMessage(exportResult))
+                if not exportJob.runSlice(1, 0.0):
+                    exportScheduler.submit(exportJob)
+
+                return
+
+            with apiProfiler.phase(S_PROFILE_PHASE_EXPORT):
+                exportResult = runSteps(exportSteps)
+
+            self.showResult(appObjects, assemblyIndex, exportResult)
 
         except ValueError as e:
             if appObjects.ui:
@@ -330,6 +842,21 @@ class FilteredExportAsStlCommand(Fusion360CommandBase):
                 appObjects.ui.messageBox('Failed:\n{}'.format(traceback.format_exc()))
 
 
+    # show the result of an export, in the background after the last file. A
+    # saved plan is executed without assembly index
+    def showResult(self, appObjects, assemblyIndex, exportResult):
+        if assemblyIndex is not None:
+            exportResult.traversalStatistics = assemblyIndex.statistics
+
+        if self.debug:
+            exportResult.cacheReport = self.traversal_cache.render()
+
+        if apiProfiler.enabled:
+            exportResult.profileReport = apiProfiler.writeReport(self.cmd_id)
+
+        # show result list
+        appObjects.ui.messageBox(renderResultMessage(exportResult))
+
     # Run when the user selects your command icon from the Fusion 360 UI
     def on_create(self, command: adsk.core.Command, inputs: adsk.core.CommandInputs):
         # Select objects to process
@@ -343,9 +870,22 @@ class FilteredExportAsStlCommand(Fusion360CommandBase):
         dropDownStlFormatItems = dropDownStlFormat.listItems
         dropDownStlFormatItems.add(S_STL_FORMAT_BINARY, True, '')
         dropDownStlFormatItems.add(S_STL_FORMAT_TEXT, False, '')
-
-        # Refinement (High, Medium, Low)
-        dropDownStlRefinement = inputs.addDropDownCommandInput(S_STL_REFINEMENT_LOOKUP, 'Refinement', adsk.core.DropDownStyles.LabeledIconDropDownStyle);
+        dropDownStlFormatItems.add(S_STL_FORMAT_3MF, False, '')
+
+        # Writer (export manager of Fusion 360 or own mesh writer)
+        dropDownStlWriter = inputs.addDropDownCommandInput(S_STL_WRITER_LOOKUP, 'Writer', adsk.core.DropDownStyles.LabeledIconDropDownStyle);
+        dropDownStlWriterItems = dropDownStlWriter.listItems
+        dropDownStlWriterItems.add(S_STL_WRITER_EXPORT_MANAGER, True, '')
+        dropDownStlWriterItems.add(S_STL_WRITER_MESH, False, '')
+
+        # Output (one file per body or one file per component)
+        dropDownStlOutput = inputs.addDropDownCommandInput(S_STL_OUTPUT_LOOKUP, 'Output', adsk.core.DropDownStyles.LabeledIconDropDownStyle);
+        dropDownStlOutputItems = dropDownStlOutput.listItems
+        dropDownStlOutputItems.add(S_STL_OUTPUT_BODY, True, '')
+        dropDownStlOutputItems.add(S_STL_OUTPUT_COMPONENT, False, '')
+
+        # Refinement (Ultra, High, Medium, Low, Custom). Each selected refinement is exported
+        dropDownStlRefinement = inputs.addDropDownCommandInput(S_STL_REFINEMENT_LOOKUP, 'Refinement', adsk.core.DropDownStyles.CheckBoxDropDownStyle);
         dropDownStlRefinementItems = dropDownStlRefinement.listItems
         dropDownStlRefinementItems.add(S_STL_REFINEMENT_ULTRA, False, '')
         dropDownStlRefinementItems.add(S_STL_REFINEMENT_HIGH, True, '')
@@ -359,6 +899,53 @@ class FilteredExportAsStlCommand(Fusion360CommandBase):
         # Filter linked components
         inputs.addBoolValueInput(S_STL_FILTER_LINKED_COMPONENTS, 'Filter linked components', True, '', False).value = False
 
+        # Filter expression, e.g. !name:Screw*;material:PLA*
+        inputs.addStringValueInput(S_STL_FILTER_EXPRESSION, 'Filter', '')
+
+        # Skip bodies that are unchanged since the last export into the same folder
+        inputs.addBoolValueInput(S_STL_SKIP_UNCHANGED, 'Skip unchanged bodies', True, '', False).value = False
+
+        # Show estimated triangles and file sizes before the export
+        inputs.addBoolValueInput(S_STL_PREFLIGHT, 'Preflight estimation', True, '', False).value = False
+
+        # Maximum number of triangles per file (0 = no budget)
+        inputs.addIntegerSpinnerCommandInput(S_STL_TRIANGLE_BUDGET, 'Triangle budget', 0, 10000000, 10000, 0)
+
+        # Sink (files in the export folder or one zip archive)
+        dropDownStlSink = inputs.addDropDownCommandInput(S_STL_SINK_LOOKUP, 'Output sink', adsk.core.DropDownStyles.LabeledIconDropDownStyle);
+        dropDownStlSinkItems = dropDownStlSink.listItems
+        dropDownStlSinkItems.add(S_SINK_FOLDER, True, '')
+        dropDownStlSinkItems.add(S_SINK_ZIP_DEFLATE, False, '')
+        dropDownStlSinkItems.add(S_SINK_ZIP_LZMA, False, '')
+
+        # gzip compress each file
+        inputs.addBoolValueInput(S_STL_GZIP_FILES, 'Gzip files', True, '', False).value = False
+
+        # Export geometrically identical bodies once and link or copy their files
+        inputs.addBoolValueInput(S_STL_EXPORT_DUPLICATES_ONCE, 'Export duplicates once', True, '', False).value = False
+
+        # Check the written STL files for degenerate triangles, open edges and flipped normals
+        inputs.addBoolValueInput(S_STL_VALIDATE_MESHES, 'Validate meshes', True, '', False).value = False
+
+        # Write the files in slices, so Fusion 360 stays responsive during the export
+        inputs.addBoolValueInput(S_STL_RUN_IN_BACKGROUND, 'Run in background', True, '', False).value = False
+
+        # Threads that validate, hash and compress the written files (0 = API thread)
+        inputs.addIntegerSpinnerCommandInput(S_STL_POST_PROCESS_THREADS, 'Post processing threads', 0, 8, 1, 0)
+
+        # List the SHA-256 checksum of each written file in the result
+        inputs.addBoolValueInput(S_STL_WRITE_CHECKSUMS, 'Checksums', True, '', False).value = False
+
+        # Skip the files that the last, unfinished export into the same folder wrote
+        inputs.addBoolValueInput(S_STL_RESUME_LAST_EXPORT, 'Resume last export', True, '', False).value = False
+
+        # Plan (export, write the plan as JSON without exporting or execute a saved plan)
+        dropDownStlPlan = inputs.addDropDownCommandInput(S_STL_PLAN_LOOKUP, 'Plan', adsk.core.DropDownStyles.LabeledIconDropDownStyle);
+        dropDownStlPlanItems = dropDownStlPlan.listItems
+        dropDownStlPlanItems.add(S_STL_PLAN_EXPORT, True, '')
+        dropDownStlPlanItems.add(S_STL_PLAN_WRITE, False, '')
+        dropDownStlPlanItems.add(S_STL_PLAN_EXECUTE, False, '')
+
         # Define filename options
         groupFileNameOptions = inputs.addGroupCommandInput(S_STL_GROUP_FILENAME_OPTIONS_LOOKUP, 'Filename Options')
         groupFileNameOptions.isExpanded = True
@@ -407,30 +994,15 @@ class FilteredExportAsStlCommand(Fusion360CommandBase):
                 inputs.itemById(S_STL_EXPORT_COMPONENT_NAME_TYPE).isVisible = False
 
         elif changed_input.id == S_STL_REFINEMENT_LOOKUP:
-            if input_values[S_STL_REFINEMENT_LOOKUP] == S_STL_REFINEMENT_ULTRA:
-                inputs.itemById(S_STL_SURFACE_DEVIATION).value = 0.000508
-                inputs.itemById(S_STL_NORMAL_DEVIATION).value = 5.0000
-                inputs.itemById(S_STL_SURFACE_DEVIATION).isEnabled = False
-                inputs.itemById(S_STL_NORMAL_DEVIATION).isEnabled = False
-
-            elif input_values[S_STL_REFINEMENT_LOOKUP] == S_STL_REFINEMENT_HIGH:
-                inputs.itemById(S_STL_SURFACE_DEVIATION).value = 0.001016
-                inputs.itemById(S_STL_NORMAL_DEVIATION).value = 10.0000
-                inputs.itemById(S_STL_SURFACE_DEVIATION).isEnabled = False
-                inputs.itemById(S_STL_NORMAL_DEVIATION).isEnabled = False
-                
-            elif input_values[S_STL_REFINEMENT_LOOKUP] == S_STL_REFINEMENT_MEDIUM:
-                inputs.itemById(S_STL_SURFACE_DEVIATION).value = 0.003212
-                inputs.itemById(S_STL_NORMAL_DEVIATION).value = 15.0000
-                inputs.itemById(S_STL_SURFACE_DEVIATION).isEnabled = False
-                inputs.itemById(S_STL_NORMAL_DEVIATION).isEnabled = False
-                
-            elif input_values[S_STL_REFINEMENT_LOOKUP] == S_STL_REFINEMENT_LOW:
-                inputs.itemById(S_STL_SURFACE_DEVIATION).value = 0.008069
-                inputs.itemById(S_STL_NORMAL_DEVIATION).value = 30.0000
-                inputs.itemById(S_STL_SURFACE_DEVIATION).isEnabled = False
-                inputs.itemById(S_STL_NORMAL_DEVIATION).isEnabled = False
-                
-            elif input_values[S_STL_REFINEMENT_LOOKUP] == S_STL_REFINEMENT_CUSTOM:
-                inputs.itemById(S_STL_SURFACE_DEVIATION).isEnabled = True
-                inputs.itemById(S_STL_NORMAL_DEVIATION).isEnabled = True                
\ No newline at end of file
+            refinements = [listItem.name for listItem in input_values[S_STL_REFINEMENT_LOOKUP] if listItem.isSelected]
+
+            # show the deviations of a single preset
+            if len(refinements) == 1 and refinements[0] in S_STL_REFINEMENT_PRESETS:
+                surfaceDeviation, normalDeviation = S_STL_REFINEMENT_PRESETS[refinements[0]]
+                inputs.itemById(S_STL_SURFACE_DEVIATION).value = surfaceDeviation
+                inputs.itemById(S_STL_NORMAL_DEVIATION).value = normalDeviation
+
+            # deviations are editable for the custom refinement only
+            isCustom = S_STL_REFINEMENT_CUSTOM in refinements
+            inputs.itemById(S_STL_SURFACE_DEVIATION).isEnabled = isCustom
+            inputs.itemById(S_STL_NORMAL_DEVIATION).isEnabled = isCustom                
\ No newline at end of file
@@ -0,0 +1,363 @@
+import os
+import sys
+import time
+import types
+import shutil
+import argparse
+import tempfile
+import importlib
+
+import FilteredExportSimulator
+
+#
+# Offline benchmark of the add-in. Runs the component search, the three
+# commands and the STL writers against synthetic assemblies of the simulator, e.g.
+#
+#   python FilteredExportBenchmark.py --occurrences 20000 --reuse 0.3
+#
+# Nothing is written to the user profile, the stored indexes and all exports
+# are kept in a temporary folder that is removed afterwards.
+#
+
+# Faked statics for easy code maintainance
+S_BENCHMARK_PACKAGE = 'FilteredExport'
+
+# synthetic assemblies: name -> (depth, fan out)
+S_BENCHMARK_SHAPES = {
+    'wide': (2, 100),
+    'deep': (12, 2),
+    'balanced': (4, 10)
+}
+
+#
+# load the add-in as package on top of the simulated adsk modules
+#
+def loadAddIn():
+    FilteredExportSimulator.install()
+
+    if S_BENCHMARK_PACKAGE not in sys.modules:
+        package = types.ModuleType(S_BENCHMARK_PACKAGE)
+        package.__path__ = [os.path.dirname(os.path.abspath(__file__))]
+        sys.modules[S_BENCHMARK_PACKAGE] = package
+
+    return lambda name: importlib.import_module(S_BENCHMARK_PACKAGE + '.' + name)
+
+
+#
+# best wall clock time of several runs and the result of the last run
+#
+def measure(function, repeat):
+    bestTime = None
+    result = None
+
+    for run in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+
+        if bestTime is None or elapsed < bestTime:
+            bestTime = elapsed
+
+    return bestTime, result
+
+
+def printResult(scenario, shape, variant, seconds, items, apiCalls=''):
+    print('{:<16}{:<12}{:<28}{:>12.1f}{:>10}{:>12}'.format(scenario, shape, variant, seconds * 1000.0, items, apiCalls))
+
+
+#
+# number of API calls of a function that reads the given design
+#
+def countApiCalls(addIn, function, design):
+    profiler = addIn('FilteredExportInstrumentation').ApiProfiler(True)
+    function(profiler.wrap(design))
+
+    return sum(profiler.getCallCounts().values())
+
+
+def createDesign(arguments, depth, fanOut):
+    return FilteredExportSimulator.generateAssembly(depth=depth, fanOut=fanOut, reuse=arguments.reuse, linkedRatio=arguments.linked,
+                                                    hiddenRatio=arguments.hidden, mixedRatio=arguments.mixed,
+                                                    maxOccurrences=arguments.occurrences, seed=arguments.seed)
+
+
+#
+# compare the flat enumeration of all unique components with the walk over
+# all occurences. In Fusion 360 the number of API calls matters more than the
+# time the simulator needs
+#
+def benchmarkTraversal(addIn, arguments, shape, design):
+    util = addIn('FilteredExportUtil')
+
+    flat = lambda design: list(util.iterAllComponents(design, False))
+    walk = lambda design: list(util.iterComponents(design.rootComponent.occurrences, True, False))
+
+    flatTime, flatComponents = measure(lambda: flat(design), arguments.repeat)
+    walkTime, walkComponents = measure(lambda: walk(design), arguments.repeat)
+
+    # both strategies must find the same components
+    flatKeys = set(util.getComponentKey(record[0]) for record in flatComponents)
+    walkKeys = set(util.getComponentKey(record[0]) for record in walkComponents)
+    if flatKeys != walkKeys:
+        raise ValueError('iterAllComponents and iterComponents found different components')
+
+    printResult('traversal', shape, 'iterAllComponents', flatTime, len(flatComponents), countApiCalls(addIn, flat, design))
+    printResult('traversal', shape, 'iterComponents', walkTime, len(walkComponents), countApiCalls(addIn, walk, design))
+
+
+#
+# run on_execute of a command twice: the first run builds the assembly index,
+# the second run uses the traversal cache
+#
+def benchmarkCommand(addIn, arguments, shape, design, moduleName, variant, input_values):
+    commandClass = getattr(addIn(moduleName), moduleName)
+    command = commandClass({'cmd_id': 'cmdID_benchmark' + moduleName}, False)
+
+    app = FilteredExportSimulator.Application.get()
+    userInterface = app.userInterface
+
+    for run in ('cold', 'cached'):
+        if run == 'cold':
+            command.traversal_cache.clear()
+            FilteredExportSimulator.openDesign(design)
+
+        userInterface.dialogFolder = tempfile.mkdtemp(dir=arguments.workFolder)
+        userInterface.messages.clear()
+
+        elapsed, result = measure(lambda: command.on_execute(None, None, None, input_values), 1)
+
+        # every command reports its result in a message box
+        message = userInterface.messages[-1] if userInterface.messages else ''
+        if not message.startswith('Path:'):
+            raise ValueError(moduleName + ' failed: ' + message)
+
+        printResult(moduleName.replace('FilteredExport', ''), shape, variant + ' (' + run + ')', elapsed, message.count('\n   '))
+
+        shutil.rmtree(userInterface.dialogFolder, ignore_errors=True)
+
+
+#
+# build file names and the result message of all visible bodies
+#
+def benchmarkFileNames(addIn, arguments, shape, design):
+    stl = addIn('FilteredExportAsStlCommand')
+    util = addIn('FilteredExportUtil')
+    fileNamePlanner = addIn('FilteredExportFileNames').FileNamePlanner
+
+    assemblyIndex = util.buildAssemblyIndex(design, None, True, False, True)
+    bodies = stl.getBodies(assemblyIndex, [])
+    rootComponent = design.rootComponent
+
+    # full paths create the longest names
+    getFileNames = lambda: fileNamePlanner(rootComponent, True, True, False, True, True, False, '').planFileNames(bodies)
+
+    fileNameTime, fileNames = measure(getFileNames, arguments.repeat)
+    printResult('names', shape, 'planFileNames', fileNameTime, len(fileNames))
+
+    exportResult = util.FilteredExportResult('/tmp', fileNames, [], assemblyIndex.statistics)
+    messageTime, message = measure(lambda: util.renderResultMessage(exportResult), arguments.repeat)
+    printResult('names', shape, 'renderResultMessage', messageTime, len(message))
+
+
+#
+# compare the export manager with the mesh writer (with and without NumPy).
+# Items are the number of written triangles
+#
+def benchmarkMeshWriter(addIn, arguments, shape, design):
+    stl = addIn('FilteredExportAsStlCommand')
+    mesh = addIn('FilteredExportMesh')
+    util = addIn('FilteredExportUtil')
+
+    assemblyIndex = util.buildAssemblyIndex(design, None, True, False, True)
+    bodies = [body[0] for body in stl.getBodies(assemblyIndex, [])][:arguments.meshBodies]
+
+    FilteredExportSimulator.openDesign(design)
+    design.exportManager.executeOverhead = arguments.exportOverhead / 1000.0
+    appObjects = addIn('Fusion360Utilities.Fusion360Utilities').AppObjects()
+
+    input_values = {stl.S_STL_REFINEMENT_LOOKUP: arguments.refinement}
+    surfaceDeviation, normalDeviation = stl.S_STL_REFINEMENT_PRESETS[arguments.refinement]
+    outputFolder = tempfile.mkdtemp(dir=arguments.workFolder)
+
+    # the simulated export manager writes the same triangles
+    managerTriangles = sum(len(body.boxMesh(FilteredExportSimulator.getDivisions(surfaceDeviation))[1]) // 3 for body in bodies)
+
+    def exportManager(isBinary):
+        for index, body in enumerate(bodies):
+            stl.exportStlWithExportManager(body, os.path.join(outputFolder, 'manager' + str(index)), isBinary, arguments.refinement, input_values, appObjects)
+        return managerTriangles
+
+    def meshWriter(isBinary, useNumpy):
+        triangles = 0
+        for index, body in enumerate(bodies):
+            coordinates, indices = mesh.calculateMesh(body, surfaceDeviation, normalDeviation)
+            triangles += mesh.writeStl(os.path.join(outputFolder, ('numpy' if useNumpy else 'struct') + str(index) + '.stl'), coordinates, indices, isBinary, body.name, useNumpy)
+        return triangles
+
+    for isBinary in (True, False):
+        formatName = 'binary' if isBinary else 'text'
+
+        managerTime, triangles = measure(lambda: exportManager(isBinary), arguments.repeat)
+        printResult('mesh', shape, 'export manager ' + formatName, managerTime, triangles)
+
+        variants = [False, True] if mesh.numpy is not None else [False]
+        for useNumpy in variants:
+            meshTime, triangles = measure(lambda: meshWriter(isBinary, useNumpy), arguments.repeat)
+            printResult('mesh', shape, ('numpy ' if useNumpy else 'struct ') + formatName, meshTime, triangles)
+
+        # both packers must create identical files
+        if len(variants) == 2:
+            for index in range(len(bodies)):
+                with open(os.path.join(outputFolder, 'numpy' + str(index) + '.stl'), 'rb') as numpyFile, \
+                        open(os.path.join(outputFolder, 'struct' + str(index) + '.stl'), 'rb') as structFile:
+                    if numpyFile.read() != structFile.read():
+                        raise ValueError('NumPy and struct packers created different files')
+
+    shutil.rmtree(outputFolder, ignore_errors=True)
+
+
+#
+# flat coordinates moved by a Fusion 360 matrix (as flat array)
+#
+def transformCoordinates(coordinates, cells):
+    if cells is None:
+        return list(coordinates)
+
+    result = []
+    for index in range(0, len(coordinates), 3):
+        x, y, z = coordinates[index], coordinates[index + 1], coordinates[index + 2]
+        result.append(cells[0] * x + cells[1] * y + cells[2] * z + cells[3])
+        result.append(cells[4] * x + cells[5] * y + cells[6] * z + cells[7])
+        result.append(cells[8] * x + cells[9] * y + cells[10] * z + cells[11])
+    return result
+
+
+#
+# compare one STL file with the meshes of all placed occurrences with a 3MF
+# file that contains each component once. Items are the written bytes, the
+# number of placed occurrences is limited by --mesh-bodies
+#
+def benchmark3mf(addIn, arguments, shape, design):
+    stl = addIn('FilteredExportAsStlCommand')
+    mesh = addIn('FilteredExportMesh')
+    util = addIn('FilteredExportUtil')
+    threeMf = addIn('FilteredExport3mf')
+
+    assemblyIndex = util.buildAssemblyIndex(design, None, True, False, True)
+    componentBodies = stl.getComponentBodies(stl.getBodies(assemblyIndex, []))
+    surfaceDeviation, normalDeviation = stl.S_STL_REFINEMENT_PRESETS[arguments.refinement]
+
+    # components and their placements up to the limit
+    components = []
+    placements = 0
+    for unitBodies in componentBodies:
+        if placements >= arguments.meshBodies:
+            break
+
+        transforms = threeMf.getOccurrenceTransforms(unitBodies[0][0].parentComponent, design.rootComponent)[:arguments.meshBodies - placements]
+        placements += len(transforms)
+
+        bodies = [body[0] for body in unitBodies]
+        components.append((bodies[0].parentComponent.name, bodies, [(surfaceDeviation, normalDeviation)] * len(bodies), transforms))
+
+    outputFolder = tempfile.mkdtemp(dir=arguments.workFolder)
+    stlFileName = os.path.join(outputFolder, 'design.stl')
+    threeMfFileName = os.path.join(outputFolder, 'design.3mf')
+
+    def placedStl():
+        meshes = []
+        for name, bodies, meshDeviations, transforms in components:
+            coordinates, indices = mesh.mergeMeshes([mesh.calculateMesh(body, *meshDeviation) for body, meshDeviation in zip(bodies, meshDeviations)])
+            meshes.extend((transformCoordinates(coordinates, transform), indices) for transform in transforms)
+
+        coordinates, indices = mesh.mergeMeshes(meshes)
+        mesh.writeStl(stlFileName, coordinates, indices, True)
+        return os.path.getsize(stlFileName)
+
+    def instanced3mf():
+        threeMf.exportComponentsAs3mf(threeMfFileName, components)
+        return os.path.getsize(threeMfFileName)
+
+    stlTime, stlSize = measure(placedStl, arguments.repeat)
+    printResult('3mf', shape, 'placed binary stl', stlTime, stlSize)
+
+    threeMfTime, threeMfSize = measure(instanced3mf, arguments.repeat)
+    printResult('3mf', shape, 'instanced 3mf', threeMfTime, threeMfSize)
+
+    shutil.rmtree(outputFolder, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the add-in against simulated assemblies')
+    parser.add_argument('--shapes', default=','.join(S_BENCHMARK_SHAPES), help='comma separated list of ' + ', '.join(S_BENCHMARK_SHAPES))
+    parser.add_argument('--scenarios', default='traversal,commands,names,mesh,3mf', help='comma separated list of traversal, commands, names, mesh, 3mf')
+    parser.add_argument('--occurrences', type=int, default=10000, help='maximum number of occurrences per design')
+    parser.add_argument('--reuse', type=float, default=0.3, help='probability that a component is instanced again')
+    parser.add_argument('--linked', type=float, default=0.0, help='probability that a component is linked')
+    parser.add_argument('--hidden', type=float, default=0.05, help='probability that an occurrence or body is hidden')
+    parser.add_argument('--mixed', type=float, default=0.2, help='probability that an assembly contains bodies, too')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per measurement, the best run is reported')
+    parser.add_argument('--mesh-bodies', dest='meshBodies', type=int, default=200, help='bodies written by the mesh scenario, occurrences placed by the 3mf scenario')
+    parser.add_argument('--refinement', default='High', help='refinement of the mesh and 3mf scenarios (Ultra, High, Medium, Low)')
+    parser.add_argument('--export-overhead', dest='exportOverhead', type=float, default=0.0, help='simulated overhead of ExportManager.execute in ms')
+    parser.add_argument('--seed', type=int, default=0)
+    arguments = parser.parse_args()
+
+    addIn = loadAddIn()
+    stl = addIn('FilteredExportAsStlCommand')
+    cpy = addIn('FilteredExportSaveCopyAs')
+
+    stlValues = {
+        stl.S_STL_FORMAT_LOOKUP: stl.S_STL_FORMAT_BINARY,
+        stl.S_STL_REFINEMENT_LOOKUP: stl.S_STL_REFINEMENT_HIGH,
+        stl.S_STL_SURFACE_DEVIATION: 0.001016,
+        stl.S_STL_NORMAL_DEVIATION: 10.0,
+        stl.S_STL_FILTER_LINKED_COMPONENTS: False,
+        stl.S_STL_EXPORT_ADD_REFINMENT_NAME_TO_NAME: False,
+        stl.S_STL_EXPORT_ADD_ROOT_NAME_TO_FILENAME_LOOKUP: True,
+        stl.S_STL_EXPORT_ADD_COMPONENT_NAME_TO_FILENAME_LOOKUP: True,
+        stl.S_STL_EXPORT_COMPONENT_NAME_TYPE: stl.S_STL_EXPORT_COMPONENT_NAME_TYPE_LAST_FROM_PATH,
+        stl.S_STL_EXPORT_REMOVE_VERSION_FROM_FILENAME_LOOKUP: True,
+        stl.S_STL_EXPORT_REMOVE_SPACES_FROM_FILENAME_LOOKUP: True
+    }
+
+    # keep stored indexes and exports away from the user profile
+    arguments.workFolder = tempfile.mkdtemp(prefix='FilteredExportBenchmark')
+    home = os.environ.get('HOME')
+    os.environ['HOME'] = arguments.workFolder
+
+    try:
+        print('{:<16}{:<12}{:<28}{:>12}{:>10}{:>12}'.format('Scenario', 'Shape', 'Variant', 'ms', 'Items', 'API calls'))
+
+        for shape in arguments.shapes.split(','):
+            depth, fanOut = S_BENCHMARK_SHAPES[shape]
+            design = createDesign(arguments, depth, fanOut)
+            scenarios = arguments.scenarios.split(',')
+
+            if 'traversal' in scenarios:
+                benchmarkTraversal(addIn, arguments, shape, design)
+
+            if 'commands' in scenarios:
+                benchmarkCommand(addIn, arguments, shape, design, 'FilteredExportAsStlCommand', 'all bodies', stlValues)
+                benchmarkCommand(addIn, arguments, shape, design, 'FilteredExportStp', 'leaves', {cpy.S_CPY_FILTER_TYPE_LOOKUP: cpy.S_CPY_FILTER_TYPE_LEAVES})
+                benchmarkCommand(addIn, arguments, shape, design, 'FilteredExportSaveCopyAs', 'mixed leaves', {cpy.S_CPY_FILTER_TYPE_LOOKUP: cpy.S_CPY_FILTER_TYPE_MIXED_LEAVES})
+
+            if 'names' in scenarios:
+                benchmarkFileNames(addIn, arguments, shape, design)
+
+            if 'mesh' in scenarios:
+                benchmarkMeshWriter(addIn, arguments, shape, design)
+
+            if '3mf' in scenarios:
+                benchmark3mf(addIn, arguments, shape, design)
+    finally:
+        if home is None:
+            del os.environ['HOME']
+        else:
+            os.environ['HOME'] = home
+
+        shutil.rmtree(arguments.workFolder, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+import math
+import hashlib
+
+# Faked statics for easy code maintainance
+S_DUPLICATE_SIGNIFICANT_DIGITS = 6
+
+# lengths are compared in steps of the bounding box diagonal times this value
+S_DUPLICATE_LENGTH_RESOLUTION = 1e-6
+
+#
+# geometric signature of a body: volume, area, sorted principal moments of
+# inertia, number of faces, edges and vertices, the extents and the position
+# of the bounding box and the position of the center of mass within the
+# bounding box. A file is exported in the coordinates of the component of the
+# body, so only bodies at the same position share their file. Extents and
+# center of mass depend on the orientation, so rotated copies get a different
+# signature. A mirror image can have the same values, e.g. a left hand and a
+# right hand thread, so the positions of the vertices are part of the
+# signature, too
+#
+def getGeometricSignature(body):
+    physicalProperties = body.physicalProperties
+    result, moment1, moment2, moment3 = physicalProperties.getPrincipalMomentsOfInertia()
+    centerOfMass = physicalProperties.centerOfMass
+
+    boundingBox = body.boundingBox
+    minPoint = boundingBox.minPoint
+    maxPoint = boundingBox.maxPoint
+
+    extents = (maxPoint.x - minPoint.x, maxPoint.y - minPoint.y, maxPoint.z - minPoint.z)
+    offsets = (centerOfMass.x - minPoint.x, centerOfMass.y - minPoint.y, centerOfMass.z - minPoint.z)
+
+    # lengths are rounded relative to the size of the body
+    resolution = math.sqrt(sum(extent * extent for extent in extents)) * S_DUPLICATE_LENGTH_RESOLUTION
+    if resolution <= 0.0:
+        resolution = S_DUPLICATE_LENGTH_RESOLUTION
+
+    values = ['{:.{}g}'.format(value, S_DUPLICATE_SIGNIFICANT_DIGITS) for value in [body.volume, body.area] + sorted([moment1, moment2, moment3])]
+    values.extend(str(round(length / resolution)) for length in extents + offsets + (minPoint.x, minPoint.y, minPoint.z))
+    values.extend(str(count) for count in (body.faces.count, body.edges.count, body.vertices.count))
+
+    # the order of the vertices isn't defined, so they are sorted
+    points = sorted(tuple(round(coordinate / resolution) for coordinate in (vertex.geometry.x, vertex.geometry.y, vertex.geometry.z)) \
+                    for vertex in body.vertices)
+    values.append(hashlib.sha1(repr(points).encode('utf-8')).hexdigest()[:16])
+
+    return ';'.join(values)
+
+
+#
+# find geometrically identical bodies. Returns per body the index of the first
+# body with the same signature, which is the own index for the first body
+#
+def findDuplicates(bodies):
+    representatives = {}
+
+    return [representatives.setdefault(getGeometricSignature(body), index) for index, body in enumerate(bodies)]
+
+
+#
+# counts files that were created from the file of an identical body instead
+# of being exported again
+#
+class DuplicateStatistics(object):
+    def __init__(self, duplicateOf):
+        self.duplicateCount = sum(1 for index, representative in enumerate(duplicateOf) if index != representative)
+        self.groupCount = len(set(representative for index, representative in enumerate(duplicateOf) if index != representative))
+        self.linkCount = 0
+        self.copyCount = 0
+        self.savedSeconds = 0.0
+
+    def add(self, isLinked, exportSeconds):
+        if isLinked:
+            self.linkCount += 1
+        else:
+            self.copyCount += 1
+
+        self.savedSeconds += exportSeconds
+
+    def render(self):
+        return 'Duplicate bodies: ' + str(self.duplicateCount) + ' in ' + str(self.groupCount) + ' groups\n   ' + \
+               'Files from duplicates: ' + str(self.linkCount + self.copyCount) + \
+               ' (hard links: ' + str(self.linkCount) + ', copies: ' + str(self.copyCount) + ')\n   ' + \
+               'Export time saved: ~{:.1f} s'.format(self.savedSeconds)
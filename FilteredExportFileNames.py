@@ -0,0 +1,173 @@
+import re
+
+# Faked statics for easy code maintainance
+S_VERSION_TAG_PATTERN = re.compile(r' v[0-9]*$')
+S_PATH_OCCURRENCE_NUMBER_PATTERN = re.compile(r':[0-9]*\+')
+S_PATH_LAST_OCCURRENCE_NUMBER_PATTERN = re.compile(r':[0-9]*$')
+
+#
+# cleans up a name by removing leading and tailing spaces, version tags and
+# replaces blanks with underscores (_)
+#
+def getCleanName(name, removeVersionTagFromNames, removeSpaces):
+    result = name
+
+    # remove version tag
+    if removeVersionTagFromNames:
+        #remove versions from root
+        result = S_VERSION_TAG_PATTERN.sub('', result)
+
+    result = result.replace(':', '__')
+
+    if removeSpaces:
+        # remove leading and tailing spaces
+        result = result.strip()
+
+        # replace spaces with underscores (_)
+        result = result.replace(' ', '_')
+
+    # if the name contains dots it will fail silently during the export.
+    # Replace it with a double underscore.
+    result = result.replace('.', '__')
+
+    # if name contains a slash it will fail to export (on windows)
+    # Replace those with double slashes
+    result = result.replace('/', '__')
+
+    return result
+
+
+#
+# cleans up a component path by removing leading and tailing spaces, version tags and
+# replaces blanks with underscores (_)
+#
+def getCleanNameFromComponentPath(name, removeVersionTagFromNames, removeSpaces):
+    result = name
+
+    # remove versions from components from path
+    if removeVersionTagFromNames:
+        result = S_PATH_OCCURRENCE_NUMBER_PATTERN.sub('-', result)
+        result = S_PATH_LAST_OCCURRENCE_NUMBER_PATTERN.sub('', result)
+    else:
+        result = result.replace('+', '__')
+        result = result.replace(':', '__')
+
+    return getCleanName(result, removeVersionTagFromNames, removeSpaces)
+
+
+#
+# computes the file names of all bodies of an export. File name looks like:
+# [refinement name-][root component name-][component name or path-]body name.
+# Files of components have no body name.
+# Names are cleaned once per distinct input. If a file name is already used,
+# an index suffix _(index) is added. The next index to try is remembered per
+# name, so thousands of bodies with the same name don't search the used names
+# again and again
+#
+class FileNamePlanner(object):
+    def __init__(self, rootComponent, addRootComponentNameToFilename, addComponentNameToFilename, \
+                    addLastComponentNameOnly, removeVersionTagFromNames, removeSpaces, addRefinmentName, \
+                    refinementName):
+        self.rootComponent = rootComponent
+        self.addRootComponentNameToFilename = addRootComponentNameToFilename
+        self.addComponentNameToFilename = addComponentNameToFilename
+        self.addLastComponentNameOnly = addLastComponentNameOnly
+        self.removeVersionTagFromNames = removeVersionTagFromNames
+        self.removeSpaces = removeSpaces
+
+        self.prefix = refinementName + '-' if addRefinmentName else ''
+        self.rootName = getCleanName(rootComponent.name, removeVersionTagFromNames, removeSpaces) + '-'
+
+        # cleaned names and paths by original name or path
+        self.cleanNames = {}
+        self.cleanPaths = {}
+
+        # used file names and next index suffix per file name
+        self.usedFileNames = set()
+        self.nextSuffix = {}
+
+    def getCleanName(self, name):
+        cleanName = self.cleanNames.get(name)
+        if cleanName is None:
+            cleanName = getCleanName(name, self.removeVersionTagFromNames, self.removeSpaces)
+            self.cleanNames[name] = cleanName
+
+        return cleanName
+
+    def getCleanPath(self, fullPathName):
+        cleanPath = self.cleanPaths.get(fullPathName)
+        if cleanPath is None:
+            cleanPath = getCleanNameFromComponentPath(fullPathName, self.removeVersionTagFromNames, self.removeSpaces)
+            self.cleanPaths[fullPathName] = cleanPath
+
+        return cleanPath
+
+    #
+    # file name of a body. body is a list of the body and its path
+    #
+    def getFileName(self, body):
+        # build temporary file name
+        tmpFileName = self.prefix
+
+        # add root component name if checked
+        if self.addRootComponentNameToFilename and (not self.addComponentNameToFilename or self.rootComponent != body[0].parentComponent):
+            tmpFileName += self.rootName
+
+        # add component name if checked and is differnt to root component
+        if self.addComponentNameToFilename:
+            if self.addLastComponentNameOnly:
+                tmpFileName += self.getCleanName(body[0].parentComponent.name) + '-'
+            else:
+                tmpFileName += self.getCleanPath(body[1]) + '-'
+
+        tmpFileName += self.getCleanName(body[0].name)
+
+        return self.getUniqueFileName(tmpFileName)
+
+    #
+    # file name of a component without the body part. body is a list of a body
+    # of the component and its path. The root name is not repeated for the root
+    # component and the component name is always added
+    #
+    def getComponentFileName(self, body):
+        component = body[0].parentComponent
+
+        # build temporary file name
+        tmpFileName = self.prefix
+
+        # add root component name if checked
+        if self.addRootComponentNameToFilename and self.rootComponent != component:
+            tmpFileName += self.rootName
+
+        # add the full path or the name of the component
+        if self.addComponentNameToFilename and not self.addLastComponentNameOnly:
+            tmpFileName += self.getCleanPath(body[1])
+        else:
+            tmpFileName += self.getCleanName(component.name)
+
+        return self.getUniqueFileName(tmpFileName)
+
+    #
+    # make file name unique within this export. All indexes below the
+    # remembered one are in use already
+    #
+    def getUniqueFileName(self, tmpFileName):
+        fileName = tmpFileName
+        suffix = self.nextSuffix.get(tmpFileName, 1)
+
+        while fileName in self.usedFileNames:
+            fileName = tmpFileName + '_(' + str(suffix) + ')'
+            suffix += 1
+
+        self.nextSuffix[tmpFileName] = suffix
+        self.usedFileNames.add(fileName)
+
+        return fileName
+
+    # file names of all bodies in one pass
+    def planFileNames(self, bodies):
+        return [self.getFileName(body) for body in bodies]
+
+    # file names of all components in one pass. Each component is given by its first body
+    def planComponentFileNames(self, componentBodies):
+        return [self.getComponentFileName(bodies[0]) for bodies in componentBodies]
@@ -0,0 +1,249 @@
+import re
+import fnmatch
+
+# Faked statics for easy code maintainance
+S_FILTER_INCLUDE = 'include'
+S_FILTER_DESCEND = 'descend'
+S_FILTER_PRUNE = 'prune'
+
+S_FILTER_FIELD_NAME = 'name'
+S_FILTER_FIELD_PATH = 'path'
+S_FILTER_FIELD_TAG = 'tag'
+S_FILTER_FIELD_MATERIAL = 'material'
+S_FILTER_FIELD_APPEARANCE = 'appearance'
+S_FILTER_FIELD_VOLUME = 'volume'
+S_FILTER_FIELD_SIZE = 'size'
+
+S_FILTER_COMPONENT_FIELDS = (S_FILTER_FIELD_NAME, S_FILTER_FIELD_PATH, S_FILTER_FIELD_TAG)
+S_FILTER_BODY_FIELDS = (S_FILTER_FIELD_MATERIAL, S_FILTER_FIELD_APPEARANCE, S_FILTER_FIELD_VOLUME, S_FILTER_FIELD_SIZE)
+
+# attribute group used if a tag is given without group
+S_FILTER_DEFAULT_TAG_GROUP = 'FilteredExport'
+
+# term like '!name:M3*', 'material~^Steel', 'volume<100'
+S_FILTER_TERM_PATTERN = re.compile(r'^(!?)\s*([a-z]+)\s*([:~<>])\s*(.*)$', re.IGNORECASE)
+
+#
+# a single term of a filter expression
+#
+class FilterTerm(object):
+    def __init__(self, text):
+        match = S_FILTER_TERM_PATTERN.match(text)
+        if not match:
+            raise ValueError('Invalid filter term: ' + text)
+
+        self.text = text
+        self.negated = match.group(1) == '!'
+        self.field = match.group(2).lower()
+        self.operator = match.group(3)
+        self.value = match.group(4).strip()
+
+        if self.field not in S_FILTER_COMPONENT_FIELDS and self.field not in S_FILTER_BODY_FIELDS:
+            raise ValueError('Unknown filter field: ' + text)
+
+        if self.field in (S_FILTER_FIELD_VOLUME, S_FILTER_FIELD_SIZE):
+            # numeric fields are compared with < or >
+            if self.operator not in '<>':
+                raise ValueError('Use < or > with ' + self.field + ': ' + text)
+
+            try:
+                self.number = float(self.value)
+            except ValueError:
+                raise ValueError('Invalid number in filter term: ' + text)
+
+        elif self.operator == '~':
+            # regular expressions for names, materials and appearances
+            if self.field not in (S_FILTER_FIELD_NAME, S_FILTER_FIELD_MATERIAL, S_FILTER_FIELD_APPEARANCE):
+                raise ValueError('Regular expressions are not supported for ' + self.field + ': ' + text)
+
+            try:
+                self.pattern = re.compile(self.value, re.IGNORECASE)
+            except re.error:
+                raise ValueError('Invalid regular expression in filter term: ' + text)
+
+        elif self.operator == ':':
+            if self.field == S_FILTER_FIELD_PATH:
+                self.pathPatterns = [element.strip() for element in self.value.split('+')]
+            elif self.field == S_FILTER_FIELD_TAG:
+                if '/' in self.value:
+                    self.tagGroup, self.tagName = self.value.split('/', 1)
+                else:
+                    self.tagGroup, self.tagName = S_FILTER_DEFAULT_TAG_GROUP, self.value
+            else:
+                self.pattern = re.compile(fnmatch.translate(self.value), re.IGNORECASE)
+
+        else:
+            raise ValueError('Use : or ~ with ' + self.field + ': ' + text)
+
+    @property
+    def isComponentTerm(self):
+        return self.field in S_FILTER_COMPONENT_FIELDS
+
+    # compare a name with the glob or regular expression of the term
+    def matchesText(self, text):
+        if self.operator == '~':
+            return self.pattern.search(text) is not None
+
+        return self.pattern.match(text) is not None
+
+    # compare one element of a path. Patterns without occurence number like
+    # 'Hardware' match 'Hardware:1', 'Hardware:2', ...
+    @staticmethod
+    def matchesPathElement(element, pattern):
+        return fnmatch.fnmatchcase(element, pattern) or fnmatch.fnmatchcase(element.rsplit(':', 1)[0], pattern)
+
+    # returns S_FILTER_INCLUDE if the path is within the path of the term,
+    # S_FILTER_DESCEND if the path leads to it, otherwise S_FILTER_PRUNE
+    def comparePath(self, fullPathName):
+        pathElements = fullPathName.split('+')
+
+        for element, pattern in zip(pathElements, self.pathPatterns):
+            if not self.matchesPathElement(element, pattern):
+                return S_FILTER_PRUNE
+
+        if len(pathElements) >= len(self.pathPatterns):
+            return S_FILTER_INCLUDE
+
+        return S_FILTER_DESCEND
+
+    def matchesComponent(self, component, fullPathName):
+        if self.field == S_FILTER_FIELD_NAME:
+            return self.matchesText(component.name)
+
+        if self.field == S_FILTER_FIELD_PATH:
+            return self.comparePath(fullPathName) == S_FILTER_INCLUDE
+
+        return component.attributes.itemByName(self.tagGroup, self.tagName) is not None
+
+    def matchesBody(self, body):
+        if self.field == S_FILTER_FIELD_MATERIAL:
+            return body.material is not None and self.matchesText(body.material.name)
+
+        if self.field == S_FILTER_FIELD_APPEARANCE:
+            return body.appearance is not None and self.matchesText(body.appearance.name)
+
+        if self.field == S_FILTER_FIELD_VOLUME:
+            # the API returns cm^3, the filter uses mm^3
+            value = body.volume * 1000.0
+        else:
+            # largest extent of the bounding box. The API returns cm, the filter uses mm
+            boundingBox = body.boundingBox
+            value = max(boundingBox.maxPoint.x - boundingBox.minPoint.x,
+                        boundingBox.maxPoint.y - boundingBox.minPoint.y,
+                        boundingBox.maxPoint.z - boundingBox.minPoint.z) * 10.0
+
+        if self.operator == '<':
+            return value < self.number
+
+        return value > self.number
+
+
+#
+# filter expression evaluated while the components are traversed. Terms are
+# separated by semicolons. Terms starting with ! exclude everything they
+# match. Other terms must match: terms of the same field are alternatives,
+# terms of different fields must match all. Component terms (name, path, tag)
+# are checked for each occurence and excluded occurences are pruned including
+# their sub components. Body terms (material, appearance, volume, size) are
+# checked for each body.
+#
+class FilterExpression(object):
+    def __init__(self, text):
+        self.terms = [FilterTerm(termText.strip()) for termText in text.split(';') if termText.strip()]
+
+        self.componentExclusions = [term for term in self.terms if term.isComponentTerm and term.negated]
+        self.bodyExclusions = [term for term in self.terms if not term.isComponentTerm and term.negated]
+
+        # required terms grouped by field
+        self.componentInclusions = {}
+        self.bodyInclusions = {}
+        for term in self.terms:
+            if not term.negated:
+                inclusions = self.componentInclusions if term.isComponentTerm else self.bodyInclusions
+                inclusions.setdefault(term.field, []).append(term)
+
+    #
+    # hashable identity of the component terms used in cache keys. Body terms
+    # don't change the traversal, so they aren't part of it
+    #
+    @property
+    def componentKey(self):
+        return tuple(term.text for term in self.terms if term.isComponentTerm)
+
+    @property
+    def hasComponentTerms(self):
+        return len(self.componentExclusions) > 0 or len(self.componentInclusions) > 0
+
+    #
+    # without path terms the decision for an occurence only depends on its
+    # component, so it can be reused for other occurences of the component
+    #
+    @property
+    def hasPathTerms(self):
+        return any(term.field == S_FILTER_FIELD_PATH for term in self.terms)
+
+    @property
+    def hasBodyTerms(self):
+        return len(self.bodyExclusions) > 0 or len(self.bodyInclusions) > 0
+
+    #
+    # decide how an occurence is processed: S_FILTER_INCLUDE returns the
+    # component, S_FILTER_DESCEND only processes its sub components and
+    # S_FILTER_PRUNE skips the whole subtree
+    #
+    def checkOccurrence(self, component, fullPathName):
+        for term in self.componentExclusions:
+            if term.matchesComponent(component, fullPathName):
+                return S_FILTER_PRUNE
+
+        decision = S_FILTER_INCLUDE
+
+        for field, terms in self.componentInclusions.items():
+            if field == S_FILTER_FIELD_PATH:
+                # paths that can't lead to one of the paths are pruned
+                pathDecisions = [term.comparePath(fullPathName) for term in terms]
+                if S_FILTER_INCLUDE in pathDecisions:
+                    continue
+                if S_FILTER_DESCEND not in pathDecisions:
+                    return S_FILTER_PRUNE
+                decision = S_FILTER_DESCEND
+
+            elif not any(term.matchesComponent(component, fullPathName) for term in terms):
+                # sub components might match
+                decision = S_FILTER_DESCEND
+
+        return decision
+
+    def acceptsBody(self, body):
+        for term in self.bodyExclusions:
+            if term.matchesBody(body):
+                return False
+
+        for terms in self.bodyInclusions.values():
+            if not any(term.matchesBody(body) for term in terms):
+                return False
+
+        return True
+
+
+#
+# parse a filter expression. Returns None for an empty expression
+#
+def parseFilterExpression(text):
+    if not text or not text.strip():
+        return None
+
+    return FilterExpression(text)
+
+
+#
+# parse a filter expression for exports of whole components. Body terms can't
+# be used, because the components are exported including all their bodies
+#
+def parseComponentFilterExpression(text):
+    filterExpression = parseFilterExpression(text)
+
+    if filterExpression is not None and filterExpression.hasBodyTerms:
+        raise ValueError('Only name, path and tag filters can be used to export components.')
+
+    return filterExpression
@@ -0,0 +1,263 @@
+import os
+import json
+import hashlib
+
+from os.path import expanduser
+
+from .FilteredExportUtil import AssemblyIndex
+from .FilteredExportUtil import AssemblyIndexEntry
+from .FilteredExportUtil import TraversalStatistics
+from .FilteredExportUtil import buildAssemblyIndex
+from .FilteredExportUtil import iterAssemblyRecords
+from .FilteredExportUtil import getComponentKey
+from .FilteredExportUtil import getSelectionKey
+from .FilteredExportUtil import getDesignStamp
+
+# Faked statics for easy code maintainance
+S_INDEX_FORMAT_VERSION = 1
+S_INDEX_FILE_EXTENSION = '.jsonl'
+
+#
+# folder in the user profile that contains the stored assembly indexes
+#
+def getIndexFolder():
+    return os.path.join(expanduser('~'), 'FilteredExport', 'index')
+
+
+#
+# short hash of a string used to build file names
+#
+def getHash(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+
+#
+# get the file name of the stored index of a document version. Documents that
+# were never saved or that were modified after the last save have no stored
+# index, because the version doesn't describe their content
+#
+def getIndexFileName(document, key):
+    if document.dataFile is None or document.isModified:
+        return None
+
+    documentHash = getHash(document.dataFile.id)
+    versionName = 'v' + str(document.dataFile.versionNumber)
+
+    return os.path.join(getIndexFolder(), documentHash + '-' + versionName + '-' + getHash(repr(key)) + S_INDEX_FILE_EXTENSION)
+
+
+#
+# fingerprint of a stored entry. Used to detect damaged lines
+#
+def getEntryFingerprint(record):
+    return getHash(json.dumps([record['token'], record['name'], record['path'], record['kind'], record['bodies'], record['visible']]))
+
+
+#
+# assembly index read from a file. The records were checked when the file
+# was loaded, their tokens are resolved while the index is iterated, like the
+# entries of a traversal. If a component or a visible body can't be found,
+# the file is removed and the index continues with a new traversal, which
+# skips the components that were already returned. The new traversal is
+# stored when it is complete
+#
+class StoredAssemblyIndex(AssemblyIndex):
+    def __init__(self, design, fileName, records, statistics, rebuild):
+        super().__init__(design, self.iterRecords(records, rebuild), statistics)
+        self.design = design
+        self.fileName = fileName
+        self.isRebuilt = False
+
+    def iterRecords(self, records, rebuild):
+        knownComponents = set()
+
+        for record in records:
+            entry = self.resolve(record)
+            if entry is None:
+                break
+
+            knownComponents.add(record['token'])
+            yield (entry,)
+        else:
+            return
+
+        try:
+            os.remove(self.fileName)
+        except OSError:
+            pass
+
+        self.isRebuilt = True
+        self.statistics = TraversalStatistics()
+
+        for component, fullPathName, depth in rebuild(self.statistics):
+            if getComponentKey(component) not in knownComponents:
+                yield (component, fullPathName, depth)
+
+    # entry of a stored record, None if a token can't be resolved
+    def resolve(self, record):
+        components = self.design.findEntityByToken(record['token'])
+        if not components:
+            return None
+
+        visibleBodies = []
+        for bodyToken in record['visible']:
+            bodies = self.design.findEntityByToken(bodyToken)
+            if not bodies:
+                return None
+
+            visibleBodies.append(bodies[0])
+
+        return AssemblyIndexEntry(components[0], record['name'], record['path'], record['depth'], record['kind'], record['bodies'], \
+                                  visibleBodies, record['occurrences'], record['linked'])
+
+    # stored entries are resolved already, entries of the new traversal are read now
+    def createEntry(self, *record):
+        if len(record) == 1:
+            return record[0]
+
+        return super().createEntry(*record)
+
+
+#
+# write a complete assembly index as JSON lines. The first line describes the
+# document version and the traversal, each further line describes a component
+#
+def saveAssemblyIndex(document, key, assemblyIndex):
+    fileName = getIndexFileName(document, key)
+    if fileName is None or not assemblyIndex.isComplete or assemblyIndex.failed:
+        return False
+
+    indexFolder = os.path.dirname(fileName)
+    os.makedirs(indexFolder, exist_ok=True)
+
+    header = {
+        'format': S_INDEX_FORMAT_VERSION,
+        'document': document.dataFile.id,
+        'version': document.dataFile.versionNumber,
+        'key': repr(key),
+        'count': len(assemblyIndex.entries),
+        'visited': assemblyIndex.statistics.visited,
+        'skipped': assemblyIndex.statistics.skipped
+    }
+
+    # write to a temporary file first, so a crash never leaves a partial index
+    temporaryFileName = fileName + '.tmp'
+    with open(temporaryFileName, 'w', encoding='utf-8') as indexFile:
+        indexFile.write(json.dumps(header) + '\n')
+
+        for entry in assemblyIndex.entries:
+            record = {
+                'token': entry.component.entityToken,
+                'name': entry.name,
+                'path': entry.fullPathName,
+                'depth': entry.depth,
+                'kind': entry.kind,
+                'bodies': entry.bodyCount,
+                'visible': [body.entityToken for body in entry.visibleBodies],
+                'occurrences': entry.occurrenceCount,
+                'linked': entry.isLinked
+            }
+            record['fingerprint'] = getEntryFingerprint(record)
+
+            indexFile.write(json.dumps(record) + '\n')
+
+    os.replace(temporaryFileName, fileName)
+
+    # remove indexes of older versions of the same document
+    documentPrefix = os.path.basename(fileName).split('-')[0] + '-'
+    versionPrefix = '-'.join(os.path.basename(fileName).split('-')[:2]) + '-'
+    for otherFileName in os.listdir(indexFolder):
+        if otherFileName.startswith(documentPrefix) and not otherFileName.startswith(versionPrefix):
+            try:
+                os.remove(os.path.join(indexFolder, otherFileName))
+            except OSError:
+                pass
+
+    return True
+
+
+#
+# read a stored assembly index. Returns None if there is no index for the
+# document version. The lines are checked against their fingerprints, which
+# doesn't call the API. A damaged index is removed, so the caller traverses
+# the design again. The tokens are resolved when the index is iterated, a
+# token that can't be resolved starts the traversal, see StoredAssemblyIndex.
+# rebuild(statistics) returns the records of a new traversal
+#
+def loadAssemblyIndex(document, design, key, rebuild):
+    fileName = getIndexFileName(document, key)
+    if fileName is None or not os.path.exists(fileName):
+        return None
+
+    try:
+        with open(fileName, 'r', encoding='utf-8') as indexFile:
+            header = json.loads(indexFile.readline())
+
+            if header['format'] != S_INDEX_FORMAT_VERSION or header['document'] != document.dataFile.id or \
+                    header['version'] != document.dataFile.versionNumber or header['key'] != repr(key):
+                raise ValueError()
+
+            records = [json.loads(line) for line in indexFile]
+
+        # an index that was cut or changed is never used
+        if len(records) != header['count']:
+            raise ValueError()
+
+        for record in records:
+            if record['fingerprint'] != getEntryFingerprint(record):
+                raise ValueError()
+
+        statistics = TraversalStatistics()
+        statistics.visited = header['visited']
+        statistics.skipped = header['skipped']
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        try:
+            os.remove(fileName)
+        except OSError:
+            pass
+
+        return None
+
+    return StoredAssemblyIndex(design, fileName, records, statistics, rebuild)
+
+
+#
+# save an assembly index and ignore problems, because the stored index is
+# only used to speed up the next export
+#
+def saveAssemblyIndexSilently(document, key, assemblyIndex):
+    try:
+        saveAssemblyIndex(document, key, assemblyIndex)
+    except Exception:
+        pass
+
+
+#
+# get the assembly index of an export. The index is taken from the traversal
+# cache of the add-in, from the index stored for the document version or it is
+# built and stored when the traversal is completed
+#
+def getAssemblyIndex(traversalCache, document, design, selection, includeSubComponents, filterLinkedComponents, includeRootComponent=False, componentFilter=None, \
+                     keepTreeOrder=True):
+    filterKey = componentFilter.componentKey if componentFilter is not None and componentFilter.hasComponentTerms else None
+    key = ('assemblyIndex', getSelectionKey(selection), includeSubComponents, filterLinkedComponents, includeRootComponent, filterKey, keepTreeOrder)
+    stamp = getDesignStamp(design)
+
+    assemblyIndex = traversalCache.get(document, key, stamp)
+
+    if assemblyIndex is None or assemblyIndex.failed:
+        # a stored index that doesn't match the design continues with a new traversal
+        rebuild = lambda statistics: iterAssemblyRecords(design, selection, includeSubComponents, filterLinkedComponents, includeRootComponent, \
+                                                         componentFilter, keepTreeOrder, statistics)
+        assemblyIndex = loadAssemblyIndex(document, design, key, rebuild)
+
+        if assemblyIndex is None:
+            assemblyIndex = buildAssemblyIndex(design, selection, includeSubComponents, filterLinkedComponents, includeRootComponent, componentFilter, \
+                                               keepTreeOrder)
+            assemblyIndex.onComplete = lambda completedIndex: saveAssemblyIndexSilently(document, key, completedIndex)
+        else:
+            assemblyIndex.onComplete = lambda completedIndex: completedIndex.isRebuilt and saveAssemblyIndexSilently(document, key, completedIndex)
+
+        traversalCache.put(document, key, assemblyIndex, stamp)
+
+    return assemblyIndex
@@ -0,0 +1,288 @@
+import os
+import time
+import contextlib
+
+from os.path import expanduser
+
+# Faked statics for easy code maintainance
+S_PROFILE_PHASE_DEFAULT = 'other'
+S_PROFILE_PHASE_SELECTION = 'selection'
+S_PROFILE_PHASE_TRAVERSAL = 'traversal'
+S_PROFILE_PHASE_BODIES = 'bodies'
+S_PROFILE_PHASE_EXPORT = 'export'
+S_PROFILE_REPORT_EXTENSION = '.txt'
+S_PROFILE_REPORT_TOP_ATTRIBUTES = 25
+
+# values returned by the API that are not wrapped
+S_PROFILE_PLAIN_TYPES = (str, bytes, int, float, bool, type(None))
+
+#
+# folder in the user profile that contains the profiling reports
+#
+def getProfileFolder():
+    return os.path.join(expanduser('~'), 'FilteredExport', 'profile')
+
+
+#
+# returns the API object behind a proxy. Lists and tuples are unwrapped
+# element by element, because the API doesn't accept proxies as arguments
+#
+def unwrapApiObject(value):
+    if isinstance(value, ApiProxy):
+        return object.__getattribute__(value, '_target')
+
+    if isinstance(value, (list, tuple)):
+        return type(value)(unwrapApiObject(element) for element in value)
+
+    return value
+
+
+#
+# stand-in for an adsk object. Every attribute access, method call and
+# iteration step is timed and recorded by the profiler. Returned API objects
+# are wrapped, too, so a whole traversal is recorded from a single proxy
+#
+class ApiProxy(object):
+    __slots__ = ('_target', '_profiler', '_typeName')
+
+    def __init__(self, target, profiler):
+        object.__setattr__(self, '_target', target)
+        object.__setattr__(self, '_profiler', profiler)
+        object.__setattr__(self, '_typeName', type(target).__name__)
+
+    def __getattr__(self, name):
+        target = object.__getattribute__(self, '_target')
+        profiler = object.__getattribute__(self, '_profiler')
+        attributeName = object.__getattribute__(self, '_typeName') + '.' + name
+
+        start = time.perf_counter()
+        value = getattr(target, name)
+        elapsed = time.perf_counter() - start
+
+        # methods are recorded when they are called
+        if callable(value) and not isinstance(value, S_PROFILE_PLAIN_TYPES):
+            return ApiMethodProxy(value, profiler, attributeName)
+
+        profiler.record(attributeName, elapsed)
+
+        return profiler.wrap(value)
+
+    def __setattr__(self, name, value):
+        target = object.__getattribute__(self, '_target')
+        profiler = object.__getattribute__(self, '_profiler')
+
+        start = time.perf_counter()
+        setattr(target, name, unwrapApiObject(value))
+        profiler.record(object.__getattribute__(self, '_typeName') + '.' + name + '=', time.perf_counter() - start)
+
+    def __iter__(self):
+        target = object.__getattribute__(self, '_target')
+        profiler = object.__getattribute__(self, '_profiler')
+        attributeName = object.__getattribute__(self, '_typeName') + '.__iter__'
+
+        iterator = iter(target)
+        while True:
+            start = time.perf_counter()
+            try:
+                value = next(iterator)
+            except StopIteration:
+                return
+            profiler.record(attributeName, time.perf_counter() - start)
+
+            yield profiler.wrap(value)
+
+    def __len__(self):
+        target = object.__getattribute__(self, '_target')
+        profiler = object.__getattribute__(self, '_profiler')
+
+        start = time.perf_counter()
+        length = len(target)
+        profiler.record(object.__getattribute__(self, '_typeName') + '.__len__', time.perf_counter() - start)
+
+        return length
+
+    def __getitem__(self, index):
+        target = object.__getattribute__(self, '_target')
+        profiler = object.__getattribute__(self, '_profiler')
+
+        start = time.perf_counter()
+        value = target[index]
+        profiler.record(object.__getattribute__(self, '_typeName') + '.__getitem__', time.perf_counter() - start)
+
+        return profiler.wrap(value)
+
+    def __bool__(self):
+        return bool(object.__getattribute__(self, '_target'))
+
+    def __eq__(self, other):
+        return object.__getattribute__(self, '_target') == unwrapApiObject(other)
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash(object.__getattribute__(self, '_target'))
+
+    def __repr__(self):
+        return 'ApiProxy(' + repr(object.__getattribute__(self, '_target')) + ')'
+
+
+#
+# stand-in for a method of an adsk object. Arguments are unwrapped, the
+# result is wrapped again
+#
+class ApiMethodProxy(object):
+    __slots__ = ('_method', '_profiler', '_attributeName')
+
+    def __init__(self, method, profiler, attributeName):
+        self._method = method
+        self._profiler = profiler
+        self._attributeName = attributeName + '()'
+
+    def __call__(self, *args, **kwargs):
+        args = [unwrapApiObject(arg) for arg in args]
+        kwargs = {name: unwrapApiObject(value) for name, value in kwargs.items()}
+
+        start = time.perf_counter()
+        value = self._method(*args, **kwargs)
+        self._profiler.record(self._attributeName, time.perf_counter() - start)
+
+        return self._profiler.wrap(value)
+
+
+#
+# counts calls and latency of API accesses per phase (e.g. traversal or
+# export) and per attribute. Disabled profilers don't wrap anything, so the
+# add-in runs without overhead
+#
+class ApiProfiler(object):
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.reset()
+
+    def reset(self):
+        # (phase, attribute) -> [calls, seconds]
+        self.calls = {}
+        # phase -> seconds
+        self.phaseTimes = {}
+        self.currentPhase = S_PROFILE_PHASE_DEFAULT
+
+    # start a new measurement, e.g. at the beginning of a command
+    def start(self):
+        self.reset()
+
+    def wrap(self, value):
+        if not self.enabled or isinstance(value, S_PROFILE_PLAIN_TYPES) or isinstance(value, ApiProxy):
+            return value
+
+        if isinstance(value, (list, tuple)):
+            return type(value)(self.wrap(element) for element in value)
+
+        return ApiProxy(value, self)
+
+    #
+    # wrap the objects of AppObjects that are used to read the design. The user
+    # interface is not wrapped, because dialogs would add the time the user
+    # needs to answer them
+    #
+    def wrapAppObjects(self, appObjects):
+        if self.enabled:
+            appObjects.app = self.wrap(appObjects.app)
+            appObjects.document = self.wrap(appObjects.document)
+            appObjects.product = self.wrap(appObjects.product)
+            appObjects._design = self.wrap(appObjects._design)
+
+        return appObjects
+
+    # wrap the selections of the command inputs
+    def wrapInputValues(self, input_values):
+        if not self.enabled:
+            return input_values
+
+        wrappedValues = dict(input_values)
+        for name, value in input_values.items():
+            if isinstance(value, list):
+                wrappedValues[name] = self.wrap(value)
+
+        return wrappedValues
+
+    def record(self, attributeName, elapsed):
+        key = (self.currentPhase, attributeName)
+
+        counter = self.calls.get(key)
+        if counter is None:
+            self.calls[key] = [1, elapsed]
+        else:
+            counter[0] += 1
+            counter[1] += elapsed
+
+    #
+    # record all API accesses within the block as accesses of the given phase.
+    # The wall clock time of the phase is recorded, too
+    #
+    @contextlib.contextmanager
+    def phase(self, name):
+        previousPhase = self.currentPhase
+        self.currentPhase = name
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.phaseTimes[name] = self.phaseTimes.get(name, 0.0) + time.perf_counter() - start
+            self.currentPhase = previousPhase
+
+    #
+    # number of calls per attribute summed over all phases. Used to compare
+    # runs, e.g. against the simulator
+    #
+    def getCallCounts(self):
+        callCounts = {}
+        for (phase, attributeName), (calls, seconds) in self.calls.items():
+            callCounts[attributeName] = callCounts.get(attributeName, 0) + calls
+
+        return callCounts
+
+    def render(self, title):
+        lines = [title, '', 'Wall times include nested phases, e.g. the traversal while exporting', '']
+
+        # time and API calls per phase
+        lines.append('{:<24}{:>12}{:>12}{:>12}'.format('Phase', 'Wall ms', 'API ms', 'API calls'))
+        phases = sorted(set(self.phaseTimes) | set(phase for phase, attributeName in self.calls))
+        for phase in phases:
+            calls = sum(counter[0] for key, counter in self.calls.items() if key[0] == phase)
+            seconds = sum(counter[1] for key, counter in self.calls.items() if key[0] == phase)
+            lines.append('{:<24}{:>12.1f}{:>12.1f}{:>12}'.format(phase, self.phaseTimes.get(phase, 0.0) * 1000.0, seconds * 1000.0, calls))
+
+        # slowest attributes per phase
+        for phase in phases:
+            counters = [(attributeName, counter) for (attributePhase, attributeName), counter in self.calls.items() if attributePhase == phase]
+            counters.sort(key=lambda item: item[1][1], reverse=True)
+
+            lines.append('')
+            lines.append('{:<48}{:>12}{:>12}{:>12}'.format(phase, 'Calls', 'Total ms', 'Mean us'))
+            for attributeName, (calls, seconds) in counters[:S_PROFILE_REPORT_TOP_ATTRIBUTES]:
+                lines.append('{:<48}{:>12}{:>12.2f}{:>12.1f}'.format(attributeName, calls, seconds * 1000.0, seconds * 1000000.0 / calls))
+
+        return '\n'.join(lines) + '\n'
+
+    #
+    # write the report of the last measurement into the user profile and return
+    # its file name
+    #
+    def writeReport(self, title):
+        profileFolder = getProfileFolder()
+        os.makedirs(profileFolder, exist_ok=True)
+
+        # several exports can be started within a second
+        timestamp = time.time()
+        fileName = os.path.join(profileFolder, title + '-' + time.strftime('%Y%m%d-%H%M%S', time.localtime(timestamp)) + \
+                                '-{:03d}'.format(int(timestamp * 1000) % 1000) + S_PROFILE_REPORT_EXTENSION)
+        with open(fileName, 'w', encoding='utf-8') as reportFile:
+            reportFile.write(self.render(title))
+
+        return fileName
+
+
+# profiler shared by all commands. Enabled in FilteredExport.py
+apiProfiler = ApiProfiler()
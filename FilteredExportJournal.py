@@ -0,0 +1,272 @@
+import os
+import json
+import time
+
+from .FilteredExportManifest import getSettingsFingerprint
+
+# Faked statics for easy code maintainance
+S_JOURNAL_FILE_PREFIX = '.filteredExportJournal_'
+S_JOURNAL_FILE_EXTENSION = '.ndjson'
+S_JOURNAL_FORMAT_VERSION = 1
+
+# seconds between two syncs of the journal to the disk
+S_JOURNAL_SYNC_SECONDS = 2.0
+
+# kinds of the journal lines
+S_JOURNAL_TYPE_START = 'start'
+S_JOURNAL_TYPE_RESUME = 'resume'
+S_JOURNAL_TYPE_ITEM = 'item'
+S_JOURNAL_TYPE_END = 'end'
+
+# status of an item and of the end of an export
+S_JOURNAL_STATUS_DONE = 'done'
+S_JOURNAL_STATUS_UNCHANGED = 'unchanged'
+S_JOURNAL_STATUS_COMPLETE = 'complete'
+S_JOURNAL_STATUS_CANCELLED = 'cancelled'
+
+#
+# file name of the journal of a command and output format. Each has its own
+# journal, so e.g. a STEP export doesn't overwrite the journal of an
+# unfinished STL export into the same folder
+#
+def getJournalFileName(journalName):
+    return S_JOURNAL_FILE_PREFIX + journalName + S_JOURNAL_FILE_EXTENSION
+
+
+#
+# value of a command input that can be written into a journal. Check box
+# lists are reduced to the selected names, selections to the paths of the
+# selected occurrences
+#
+def getInputSetting(value):
+    if value is None or isinstance(value, (str, bool, int, float)):
+        return value
+
+    names = []
+    for item in value:
+        if hasattr(item, 'isSelected'):
+            if item.isSelected:
+                names.append(item.name)
+        else:
+            names.append(getattr(item, 'fullPathName', None) or item.name)
+
+    return names
+
+
+#
+# fingerprint of the inputs of a command. Inputs that don't change the
+# written files (e.g. the number of threads) are ignored
+#
+def getInputFingerprint(input_values, ignoredKeys=()):
+    settings = {}
+    for key, value in input_values.items():
+        if key.endswith('_input') or key in ignoredKeys:
+            continue
+
+        settings[key] = getInputSetting(value)
+
+    return getSettingsFingerprint(settings)
+
+
+#
+# journal of an export in the export folder. Each finished file is appended
+# as one JSON line and handed to the operating system at once, so the
+# journal survives a crash of Fusion 360 and a resumed export skips the files
+# that are done. The lines are synced to the disk every few seconds and when
+# the journal is closed. A line that was cut by a crash is ignored. The
+# journal of a complete export is removed
+#
+class ExportJournal(object):
+    def __init__(self, exportPath, journalName):
+        self.fileName = os.path.join(exportPath, getJournalFileName(journalName))
+        self.exportPath = exportPath
+        self.commandName = None
+        self.settingsFingerprint = None
+        self.plannedNames = None
+        self.endStatus = None
+        self.entries = {}
+
+        # entries of files that wait for their post processing
+        self.pending = {}
+        self.journalFile = None
+        self.syncTime = None
+
+    def load(self):
+        self.commandName = None
+        self.settingsFingerprint = None
+        self.plannedNames = None
+        self.endStatus = None
+        self.entries = {}
+
+        try:
+            with open(self.fileName, 'r', encoding='utf-8') as journalFile:
+                for line in journalFile:
+                    try:
+                        self.replay(json.loads(line))
+                    except (ValueError, KeyError, TypeError, AttributeError):
+                        # line of a crashed export or of an unknown format
+                        continue
+        except OSError:
+            # no journal: nothing to resume
+            pass
+
+        return self
+
+    # apply one line of the journal
+    def replay(self, line):
+        if line['type'] == S_JOURNAL_TYPE_START:
+            if line['format'] != S_JOURNAL_FORMAT_VERSION:
+                self.commandName = None
+                return
+
+            self.commandName = line['command']
+            self.settingsFingerprint = line['settings']
+            self.plannedNames = line.get('names')
+            self.endStatus = None
+            self.entries = {}
+
+        elif self.commandName is None:
+            return
+
+        elif line['type'] == S_JOURNAL_TYPE_RESUME:
+            self.endStatus = None
+
+        elif line['type'] == S_JOURNAL_TYPE_ITEM:
+            self.entries[line['name']] = line
+
+        elif line['type'] == S_JOURNAL_TYPE_END:
+            self.endStatus = line['status']
+
+    #
+    # check that the loaded journal belongs to an unfinished export of the
+    # command with the same settings
+    #
+    def checkResume(self, commandName, settingsFingerprint):
+        if self.commandName is None or self.endStatus == S_JOURNAL_STATUS_COMPLETE:
+            raise ValueError('No unfinished export to resume in ' + self.exportPath + '.')
+
+        if self.commandName != commandName:
+            raise ValueError('The last export into ' + self.exportPath + ' was made by \'' + self.commandName + '\'.')
+
+        if self.settingsFingerprint != settingsFingerprint:
+            raise ValueError('The settings differ from the last export, resume needs the same settings.')
+
+    #
+    # start a new journal or continue the journal of a resumed export
+    #
+    def start(self, commandName, settingsFingerprint, plannedNames=None, resume=False):
+        if resume:
+            # a line that was cut by a crash must not swallow the next line
+            isCut = False
+            with open(self.fileName, 'rb') as journalFile:
+                journalFile.seek(0, os.SEEK_END)
+                if journalFile.tell() > 0:
+                    journalFile.seek(-1, os.SEEK_END)
+                    isCut = journalFile.read(1) != b'\n'
+
+            self.journalFile = open(self.fileName, 'a', encoding='utf-8')
+            if isCut:
+                self.journalFile.write('\n')
+
+            self.append({'type': S_JOURNAL_TYPE_RESUME, 'time': time.time()})
+        else:
+            self.entries = {}
+            self.journalFile = open(self.fileName, 'w', encoding='utf-8')
+            self.append({'type': S_JOURNAL_TYPE_START, 'format': S_JOURNAL_FORMAT_VERSION, 'command': commandName, \
+                         'settings': settingsFingerprint, 'names': plannedNames, 'time': time.time()})
+
+        self.commandName = commandName
+        self.settingsFingerprint = settingsFingerprint
+        self.plannedNames = plannedNames
+
+        return self
+
+    #
+    # True if the resumed export finished the file with the same geometry and
+    # settings and the file still exists
+    #
+    def isFinished(self, name, outputFileName, bodyFingerprint, settingsFingerprint):
+        entry = self.entries.get(name)
+        if entry is None:
+            return False
+
+        if entry['body'] != bodyFingerprint or entry['settings'] != settingsFingerprint:
+            return False
+
+        return os.path.exists(os.path.join(self.exportPath, outputFileName))
+
+    #
+    # write one line. The flush keeps the line if Fusion 360 crashes, the
+    # sync to the disk is left for later unless it is due
+    #
+    def append(self, line):
+        if self.journalFile is None:
+            self.journalFile = open(self.fileName, 'a', encoding='utf-8')
+
+        self.journalFile.write(json.dumps(line, sort_keys=True) + '\n')
+        self.journalFile.flush()
+
+        if self.syncTime is None or time.perf_counter() - self.syncTime >= S_JOURNAL_SYNC_SECONDS:
+            self.sync()
+
+    def sync(self):
+        os.fsync(self.journalFile.fileno())
+        self.syncTime = time.perf_counter()
+
+    def add(self, name, outputFileName, bodyFingerprint, settingsFingerprint, status=S_JOURNAL_STATUS_DONE):
+        self.append({'type': S_JOURNAL_TYPE_ITEM, 'name': name, 'file': outputFileName, 'body': bodyFingerprint, \
+                     'settings': settingsFingerprint, 'status': status})
+
+    #
+    # remember a file until its post processing is done. The file isn't in
+    # place before it is committed by the sink
+    #
+    def addPending(self, name, outputFileName, bodyFingerprint, settingsFingerprint):
+        self.pending[outputFileName] = (name, outputFileName, bodyFingerprint, settingsFingerprint)
+
+    # record a file whose post processing is done, called by the post processing pool
+    def commit(self, postProcessResult):
+        entry = self.pending.pop(postProcessResult.fileName, None)
+        if entry is not None:
+            self.add(*entry)
+
+    #
+    # mark the export as cancelled, a cancelled export can be resumed. There
+    # is nothing to resume after a complete export, so its journal is removed
+    #
+    def finish(self, isCancelled=False):
+        if isCancelled:
+            self.append({'type': S_JOURNAL_TYPE_END, 'status': S_JOURNAL_STATUS_CANCELLED, 'time': time.time()})
+            self.close()
+            return
+
+        if self.journalFile is not None:
+            self.journalFile.close()
+            self.journalFile = None
+
+        try:
+            os.remove(self.fileName)
+        except OSError:
+            pass
+
+    # the journal of a failed export stays for a resume
+    def close(self):
+        if self.journalFile is not None:
+            self.sync()
+            self.journalFile.close()
+            self.journalFile = None
+
+
+#
+# journal of an export into a folder. A resumed export continues the journal
+# of the last export with the same journal name, which must be unfinished and
+# use the same settings
+#
+def openJournal(exportPath, journalName, commandName, settingsFingerprint, plannedNames=None, resume=False):
+    journal = ExportJournal(exportPath, journalName)
+
+    if resume:
+        journal.load()
+        journal.checkResume(commandName, settingsFingerprint)
+
+    return journal.start(commandName, settingsFingerprint, plannedNames, resume)
@@ -0,0 +1,98 @@
+import os
+import json
+import hashlib
+
+# Faked statics for easy code maintainance
+S_MANIFEST_FILE_NAME = '.filteredExportManifest.json'
+S_MANIFEST_FORMAT_VERSION = 1
+
+#
+# cheap geometric fingerprint of a body. Volume, area, bounding box and the
+# number of faces, edges and vertices change with almost every modification
+#
+def getBodyFingerprint(body):
+    boundingBox = body.boundingBox
+    values = [
+        body.volume,
+        body.area,
+        boundingBox.minPoint.x, boundingBox.minPoint.y, boundingBox.minPoint.z,
+        boundingBox.maxPoint.x, boundingBox.maxPoint.y, boundingBox.maxPoint.z,
+        body.faces.count,
+        body.edges.count,
+        body.vertices.count
+    ]
+
+    # rounding hides noise of the geometry kernel
+    text = ';'.join('{:.9g}'.format(value) for value in values)
+
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+#
+# fingerprint of several bodies that are exported into one file
+#
+def getBodiesFingerprint(bodies):
+    if len(bodies) == 1:
+        return getBodyFingerprint(bodies[0])
+
+    text = ';'.join(getBodyFingerprint(body) for body in bodies)
+
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+#
+# fingerprint of export settings, e.g. format and refinement
+#
+def getSettingsFingerprint(settings):
+    return hashlib.sha1(json.dumps(settings, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+#
+# manifest of an export folder. Records per file the fingerprint of the body
+# and of the settings it was exported with
+#
+class ExportManifest(object):
+    def __init__(self, exportPath):
+        self.fileName = os.path.join(exportPath, S_MANIFEST_FILE_NAME)
+        self.exportPath = exportPath
+        self.files = {}
+
+    def load(self):
+        try:
+            with open(self.fileName, 'r', encoding='utf-8') as manifestFile:
+                content = json.load(manifestFile)
+
+            if content.get('format') == S_MANIFEST_FORMAT_VERSION:
+                self.files = content['files']
+        except (OSError, ValueError, KeyError):
+            # no or damaged manifest: everything is exported again
+            self.files = {}
+
+        return self
+
+    #
+    # True if the file exists and was exported from the same geometry with
+    # the same settings
+    #
+    def isUnchanged(self, fileName, outputFileName, bodyFingerprint, settingsFingerprint):
+        entry = self.files.get(fileName)
+        if entry is None:
+            return False
+
+        if entry['body'] != bodyFingerprint or entry['settings'] != settingsFingerprint:
+            return False
+
+        return os.path.exists(os.path.join(self.exportPath, outputFileName))
+
+    def update(self, fileName, bodyFingerprint, settingsFingerprint):
+        self.files[fileName] = {'body': bodyFingerprint, 'settings': settingsFingerprint}
+
+    def save(self):
+        content = {'format': S_MANIFEST_FORMAT_VERSION, 'files': self.files}
+
+        # write to a temporary file first, so a crash never leaves a partial manifest
+        temporaryFileName = self.fileName + '.tmp'
+        with open(temporaryFileName, 'w', encoding='utf-8') as manifestFile:
+            json.dump(content, manifestFile, indent=1, sort_keys=True)
+
+        os.replace(temporaryFileName, self.fileName)
@@ -0,0 +1,194 @@
+import math
+import struct
+
+from array import array
+
+# NumPy is optional. Without it the triangles are packed with struct
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Faked statics for easy code maintainance
+S_MESH_STL_HEADER = b'Filtered STL Export'
+S_MESH_STL_EXTENSION = '.stl'
+
+# the API returns cm, STL files are written in mm like the STL export of Fusion 360
+S_MESH_STL_SCALE = 10.0
+
+# binary STL record: normal, three vertices and attribute byte count
+S_MESH_STL_RECORD = struct.Struct('<12fH')
+
+#
+# tessellate a body with the mesh calculator. The surface deviation is given
+# in cm, the normal deviation in degrees. Returns the flat node coordinates
+# and the flat node indices (three per triangle)
+#
+def calculateMesh(body, surfaceDeviation, normalDeviation):
+    meshCalculator = body.meshManager.createMeshCalculator()
+    meshCalculator.surfaceTolerance = surfaceDeviation
+    meshCalculator.maxNormalDeviation = math.radians(normalDeviation)
+
+    triangleMesh = meshCalculator.calculate()
+
+    return triangleMesh.nodeCoordinatesAsFloat, triangleMesh.nodeIndices
+
+
+#
+# corners and normals of all triangles as NumPy arrays. Corners have the shape
+# (triangles, 3, 3), normals (triangles, 3)
+#
+def getTrianglesAsArrays(coordinates, indices, scale):
+    nodes = numpy.asarray(coordinates, dtype=numpy.float64).reshape(-1, 3) * scale
+    corners = nodes[numpy.asarray(indices, dtype=numpy.int64).reshape(-1, 3)]
+
+    normals = numpy.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    lengths = numpy.sqrt(normals[:, 0] * normals[:, 0] + normals[:, 1] * normals[:, 1] + normals[:, 2] * normals[:, 2])
+    normals /= numpy.where(lengths > 0.0, lengths, 1.0)[:, None]
+
+    return corners, normals
+
+
+#
+# corners and normal of each triangle as tuple of 12 floats. Same arithmetic
+# as getTrianglesAsArrays, so both create identical files
+#
+def iterTriangles(coordinates, indices, scale):
+    nodes = array('d', coordinates)
+
+    for index in range(0, len(indices) - 2, 3):
+        a = indices[index] * 3
+        b = indices[index + 1] * 3
+        c = indices[index + 2] * 3
+
+        ax, ay, az = nodes[a] * scale, nodes[a + 1] * scale, nodes[a + 2] * scale
+        bx, by, bz = nodes[b] * scale, nodes[b + 1] * scale, nodes[b + 2] * scale
+        cx, cy, cz = nodes[c] * scale, nodes[c + 1] * scale, nodes[c + 2] * scale
+
+        ux, uy, uz = bx - ax, by - ay, bz - az
+        vx, vy, vz = cx - ax, cy - ay, cz - az
+        nx, ny, nz = uy * vz - uz * vy, uz * vx - ux * vz, ux * vy - uy * vx
+
+        length = math.sqrt(nx * nx + ny * ny + nz * nz)
+        if length > 0.0:
+            nx, ny, nz = nx / length, ny / length, nz / length
+
+        yield (nx, ny, nz, ax, ay, az, bx, by, bz, cx, cy, cz)
+
+
+#
+# pack a mesh as binary STL
+#
+def packBinaryStl(coordinates, indices, scale=S_MESH_STL_SCALE, useNumpy=True):
+    triangleCount = len(indices) // 3
+    header = S_MESH_STL_HEADER.ljust(80, b' ') + struct.pack('<I', triangleCount)
+
+    if numpy is not None and useNumpy:
+        corners, normals = getTrianglesAsArrays(coordinates, indices, scale)
+
+        records = numpy.zeros(triangleCount, dtype=[('normal', '<f4', (3,)), ('corners', '<f4', (3, 3)), ('attribute', '<u2')])
+        records['normal'] = normals
+        records['corners'] = corners
+
+        return header + records.tobytes()
+
+    content = bytearray(len(header) + triangleCount * S_MESH_STL_RECORD.size)
+    content[:len(header)] = header
+
+    offset = len(header)
+    for triangle in iterTriangles(coordinates, indices, scale):
+        S_MESH_STL_RECORD.pack_into(content, offset, *triangle, 0)
+        offset += S_MESH_STL_RECORD.size
+
+    return bytes(content)
+
+
+#
+# pack a mesh as ASCII STL. Values are rounded to float like in binary files
+#
+def packAsciiStl(coordinates, indices, name, scale=S_MESH_STL_SCALE, useNumpy=True):
+    if numpy is not None and useNumpy:
+        corners, normals = getTrianglesAsArrays(coordinates, indices, scale)
+        triangles = numpy.concatenate((normals, corners.reshape(-1, 9)), axis=1).astype(numpy.float32).tolist()
+    else:
+        triangles = [array('f', triangle).tolist() for triangle in iterTriangles(coordinates, indices, scale)]
+
+    facet = 'facet normal %e %e %e\n outer loop\n  vertex %e %e %e\n  vertex %e %e %e\n  vertex %e %e %e\n endloop\nendfacet\n'
+
+    lines = ['solid ' + name + '\n']
+    lines.extend(facet % tuple(triangle) for triangle in triangles)
+    lines.append('endsolid ' + name + '\n')
+
+    return ''.join(lines).encode('ascii', 'replace')
+
+
+#
+# write a mesh as STL file
+#
+def writeStl(fileName, coordinates, indices, isBinary, name='', useNumpy=True):
+    if isBinary:
+        content = packBinaryStl(coordinates, indices, useNumpy=useNumpy)
+    else:
+        content = packAsciiStl(coordinates, indices, name, useNumpy=useNumpy)
+
+    with open(fileName, 'wb') as stlFile:
+        stlFile.write(content)
+
+    return len(indices) // 3
+
+
+#
+# tessellate a body and write it as STL file. Returns the number of triangles
+#
+def exportBodyAsStl(body, fileName, isBinary, surfaceDeviation, normalDeviation):
+    coordinates, indices = calculateMesh(body, surfaceDeviation, normalDeviation)
+
+    if not fileName.lower().endswith(S_MESH_STL_EXTENSION):
+        fileName += S_MESH_STL_EXTENSION
+
+    return writeStl(fileName, coordinates, indices, isBinary, body.name)
+
+
+#
+# merge meshes into one mesh. Indices of each mesh are shifted by the number
+# of nodes of the meshes before
+#
+def mergeMeshes(meshes):
+    if numpy is not None:
+        coordinates = []
+        indices = []
+        nodeCount = 0
+
+        for meshCoordinates, meshIndices in meshes:
+            coordinates.append(numpy.asarray(meshCoordinates, dtype=numpy.float64))
+            indices.append(numpy.asarray(meshIndices, dtype=numpy.int64) + nodeCount)
+            nodeCount += len(meshCoordinates) // 3
+
+        if len(coordinates) == 0:
+            return [], []
+
+        return numpy.concatenate(coordinates), numpy.concatenate(indices)
+
+    coordinates = array('d')
+    indices = array('q')
+
+    for meshCoordinates, meshIndices in meshes:
+        nodeCount = len(coordinates) // 3
+        coordinates.extend(meshCoordinates)
+        indices.extend(index + nodeCount for index in meshIndices)
+
+    return coordinates, indices
+
+
+#
+# tessellate bodies and write them into one STL file. Each body has its own
+# surface and normal deviation. Returns the number of triangles
+#
+def exportBodiesAsStl(bodies, fileName, isBinary, meshDeviations, name=''):
+    meshes = [calculateMesh(body, surfaceDeviation, normalDeviation) for body, (surfaceDeviation, normalDeviation) in zip(bodies, meshDeviations)]
+    coordinates, indices = mergeMeshes(meshes)
+
+    if not fileName.lower().endswith(S_MESH_STL_EXTENSION):
+        fileName += S_MESH_STL_EXTENSION
+
+    return writeStl(fileName, coordinates, indices, isBinary, name)
@@ -0,0 +1,264 @@
+import os
+import json
+import time
+
+from .FilteredExportManifest import getSettingsFingerprint
+
+# Faked statics for easy code maintainance
+S_PLAN_FORMAT_VERSION = 1
+S_PLAN_FILE_EXTENSION = '.plan.json'
+
+# bodies that can't be found or identified are listed up to this count
+S_PLAN_MISSING_NAMES_COUNT = 5
+
+#
+# bodies of an export plan that are written into one file per refinement.
+# Bodies are identified by their entity token, the path and the names are
+# kept for the reader of the plan and for designs whose tokens changed
+#
+class ExportPlanUnit(object):
+    def __init__(self, fileName, sourcePath, componentName):
+        self.fileName = fileName
+        self.sourcePath = sourcePath
+        self.componentName = componentName
+        self.bodyNames = []
+        self.bodyTokens = []
+
+        # per refinement the deviations of the bodies (None: deviations of the refinement)
+        self.meshDeviations = []
+
+        # bodies of the design, not part of the saved plan
+        self.bodies = []
+
+    def addBody(self, body):
+        self.bodyNames.append(body.name)
+        self.bodyTokens.append(body.entityToken)
+        self.bodies.append(body)
+
+    def toRecord(self, fileNames, includeTokens=True):
+        record = {
+            'name': self.fileName,
+            'path': self.sourcePath,
+            'component': self.componentName,
+            'bodies': [{'name': bodyName, 'token': bodyToken} if includeTokens else {'name': bodyName} \
+                        for bodyName, bodyToken in zip(self.bodyNames, self.bodyTokens)],
+            'deviations': self.meshDeviations
+        }
+
+        if fileNames is not None:
+            record['files'] = fileNames
+
+        return record
+
+    @staticmethod
+    def fromRecord(record):
+        unit = ExportPlanUnit(record['name'], record['path'], record['component'])
+        unit.bodyNames = [body['name'] for body in record['bodies']]
+        unit.bodyTokens = [body['token'] for body in record['bodies']]
+        unit.meshDeviations = [[tuple(bodyDeviation) for bodyDeviation in bodyDeviations] if bodyDeviations is not None else None \
+                                for bodyDeviations in record['deviations']]
+
+        return unit
+
+
+#
+# everything an export will produce, planned without writing anything: the
+# format options, the refinements and per unit the source path, the bodies
+# and the target file names. A plan can be saved as JSON and executed later,
+# the output sink and the post processing are chosen when the plan is
+# executed
+#
+class ExportPlan(object):
+    def __init__(self, commandName, designName, options):
+        self.commandName = commandName
+        self.designName = designName
+        self.documentId = None
+        self.versionNumber = None
+        self.options = options
+        self.extension = options.get('extension', '')
+
+        # (refinement, prefix, surface deviation, normal deviation, settings fingerprint)
+        self.refinements = []
+        self.units = []
+
+    @property
+    def isSingleFile(self):
+        return self.options.get('designFileName') is not None
+
+    # planned file names without extension, in the order they are exported
+    @property
+    def fileNames(self):
+        prefixes = [refinement[1] for refinement in self.refinements]
+
+        if self.isSingleFile:
+            return [prefix + self.options['designFileName'] for prefix in prefixes]
+
+        return [prefix + unit.fileName for unit in self.units for prefix in prefixes]
+
+    @property
+    def bodyCount(self):
+        return sum(len(unit.bodyTokens) for unit in self.units)
+
+    def addRefinement(self, refinement, prefix, surfaceDeviation, normalDeviation, settingsFingerprint):
+        self.refinements.append((refinement, prefix, surfaceDeviation, normalDeviation, settingsFingerprint))
+
+    def addUnit(self, unit):
+        self.units.append(unit)
+        return unit
+
+    def toRecord(self, includeTokens=True):
+        prefixes = [refinement[1] for refinement in self.refinements]
+
+        record = {
+            'format': S_PLAN_FORMAT_VERSION,
+            'command': self.commandName,
+            'design': self.designName,
+            'document': self.documentId,
+            'version': self.versionNumber,
+            'options': self.options,
+            'refinements': [{'name': refinement, 'prefix': prefix, 'surfaceDeviation': surfaceDeviation, 'normalDeviation': normalDeviation, \
+                             'settings': settingsFingerprint} for refinement, prefix, surfaceDeviation, normalDeviation, settingsFingerprint in self.refinements],
+            'units': [unit.toRecord(None if self.isSingleFile else [prefix + unit.fileName + self.extension for prefix in prefixes], includeTokens) \
+                        for unit in self.units],
+            'files': [fileName + self.extension for fileName in self.fileNames]
+        }
+
+        return record
+
+    #
+    # fingerprint of the files the plan produces. Entity tokens may change
+    # between two sessions and a new version of the document may produce the
+    # same files, so both are left out
+    #
+    def getFingerprint(self):
+        record = self.toRecord(False)
+        del record['document'], record['version']
+
+        return getSettingsFingerprint(record)
+
+    #
+    # write the plan as JSON. The temporary file keeps an older plan intact
+    # if writing fails
+    #
+    def save(self, fileName):
+        record = self.toRecord()
+        record['created'] = time.time()
+
+        temporaryFileName = fileName + '.tmp'
+        with open(temporaryFileName, 'w', encoding='utf-8') as planFile:
+            json.dump(record, planFile, indent=1)
+
+        os.replace(temporaryFileName, fileName)
+
+    #
+    # check that the plan was made for the document and version of the design.
+    # Plans of unsaved documents are checked by the name of the design
+    #
+    def checkDesign(self, design):
+        dataFile = design.parentDocument.dataFile
+
+        if self.documentId is None:
+            if design.rootComponent.name != self.designName:
+                raise ValueError('The export plan was made for the design \'' + self.designName + '\'.')
+
+            return
+
+        if dataFile is None or dataFile.id != self.documentId:
+            raise ValueError('The export plan was made for another document (' + self.designName + ').')
+
+        if dataFile.versionNumber != self.versionNumber:
+            raise ValueError('The export plan was made for version ' + str(self.versionNumber) + ' of the document, the design is version ' + \
+                             str(dataFile.versionNumber) + '.')
+
+    #
+    # find the bodies of a loaded plan in the design. A body whose token isn't
+    # found is looked up by the names of its component and body. Names that
+    # are used more than once can't identify a body
+    #
+    def resolve(self, design):
+        self.checkDesign(design)
+
+        components = None
+        missingNames = []
+        ambiguousNames = []
+
+        for unit in self.units:
+            unit.bodies = []
+
+            for bodyName, bodyToken in zip(unit.bodyNames, unit.bodyTokens):
+                entities = design.findEntityByToken(bodyToken)
+                if entities:
+                    unit.bodies.append(entities[0])
+                    continue
+
+                if components is None:
+                    components = {}
+                    for component in design.allComponents:
+                        components.setdefault(component.name, []).append(component)
+
+                namedComponents = components.get(unit.componentName, [])
+                bodies = [componentBody for component in namedComponents for componentBody in component.bRepBodies if componentBody.name == bodyName]
+
+                if len(bodies) == 1:
+                    unit.bodies.append(bodies[0])
+                elif len(bodies) == 0:
+                    missingNames.append(unit.componentName + '/' + bodyName)
+                else:
+                    ambiguousNames.append(unit.componentName + '/' + bodyName)
+
+        if missingNames:
+            raise ValueError('Bodies of the plan not found in the design: ' + renderNames(missingNames) + '.')
+
+        if ambiguousNames:
+            raise ValueError('Bodies of the plan found more than once in the design: ' + renderNames(ambiguousNames) + '.')
+
+        return self
+
+    def render(self):
+        return 'Files: ' + str(len(self.fileNames)) + ', bodies: ' + str(self.bodyCount) + ', units: ' + str(len(self.units)) + '\n   ' + \
+               'Refinements: ' + ', '.join(refinement[0] for refinement in self.refinements) + '\n   ' + \
+               'Options: ' + ', '.join(key + ' ' + str(value) for key, value in sorted(self.options.items()) if value is not None)
+
+
+#
+# the first names of a list and the number of the others
+#
+def renderNames(names):
+    text = ', '.join(names[:S_PLAN_MISSING_NAMES_COUNT])
+
+    if len(names) > S_PLAN_MISSING_NAMES_COUNT:
+        text += ' and ' + str(len(names) - S_PLAN_MISSING_NAMES_COUNT) + ' more'
+
+    return text
+
+
+#
+# read a plan written by ExportPlan.save()
+#
+def loadExportPlan(fileName, commandName):
+    try:
+        with open(fileName, 'r', encoding='utf-8') as planFile:
+            record = json.load(planFile)
+
+        if record.get('format') != S_PLAN_FORMAT_VERSION:
+            raise ValueError('Unknown format of the export plan ' + fileName + '.')
+
+        if record['command'] != commandName:
+            raise ValueError('The export plan ' + fileName + ' was made by \'' + record['command'] + '\'.')
+
+        plan = ExportPlan(record['command'], record['design'], record['options'])
+        plan.documentId = record['document']
+        plan.versionNumber = record['version']
+
+        for refinement in record['refinements']:
+            plan.addRefinement(refinement['name'], refinement['prefix'], refinement['surfaceDeviation'], refinement['normalDeviation'], \
+                                refinement['settings'])
+
+        for unitRecord in record['units']:
+            plan.addUnit(ExportPlanUnit.fromRecord(unitRecord))
+    except OSError as e:
+        raise ValueError('The export plan ' + fileName + ' can\'t be read: ' + str(e))
+    except (KeyError, TypeError, json.JSONDecodeError):
+        raise ValueError('The export plan ' + fileName + ' is damaged.')
+
+    return plan
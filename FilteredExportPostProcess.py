@@ -0,0 +1,155 @@
+import time
+import hashlib
+import collections
+import concurrent.futures
+
+from .FilteredExportValidation import validateStl
+
+# Faked statics for easy code maintainance
+S_POST_PROCESS_MAX_WORKERS = 8
+
+# files that may wait for post processing before the export waits, too
+S_POST_PROCESS_QUEUE_SIZE = 16
+
+S_POST_PROCESS_HASH_CHUNK_SIZE = 1024 * 1024
+
+#
+# SHA-256 of a file
+#
+def getFileHash(fileName):
+    fileHash = hashlib.sha256()
+
+    with open(fileName, 'rb') as hashFile:
+        for chunk in iter(lambda: hashFile.read(S_POST_PROCESS_HASH_CHUNK_SIZE), b''):
+            fileHash.update(chunk)
+
+    return fileHash.hexdigest()
+
+
+#
+# result of the post processing of one file
+#
+class PostProcessResult(object):
+    def __init__(self, fileName):
+        self.fileName = fileName
+        self.validation = None
+        self.checksum = None
+        self.isDuplicate = False
+        self.isLinked = False
+        self.exportSeconds = 0.0
+
+
+#
+# validate, hash and commit a file that was released by the sink. Files that
+# couldn't be released (None) are collected when the sink is closed
+#
+def postProcessFile(exportSink, fullFileName, fileName, validate=False, hashFile=False):
+    result = PostProcessResult(fileName)
+    if fullFileName is None:
+        return result
+
+    if validate:
+        result.validation = validateStl(fullFileName, fileName)
+
+    if hashFile:
+        result.checksum = getFileHash(fullFileName)
+
+    exportSink.commit(fullFileName, fileName)
+
+    return result
+
+
+#
+# create a file from the file of an identical body. The source is committed
+# before, so the duplicate waits for its post processing. The source of an
+# unchanged file has no future
+#
+def postProcessDuplicate(exportSink, sourceFileName, fileName, exportSeconds, sourceFuture=None):
+    sourceResult = sourceFuture.result() if sourceFuture is not None else None
+
+    result = PostProcessResult(fileName)
+    result.isDuplicate = True
+    result.exportSeconds = exportSeconds
+    result.isLinked = exportSink.duplicate(sourceFileName, fileName)
+
+    if sourceResult is not None:
+        result.checksum = sourceResult.checksum
+
+        if sourceResult.validation is not None:
+            result.validation = sourceResult.validation.copy(fileName)
+
+    return result
+
+
+#
+# pool of threads that post process the written files while the API thread
+# exports the next file. At most queueSize files wait, the export waits for
+# the oldest file if the queue is full. Results are collected in the order
+# the files were submitted. Without workers each file is processed at once.
+# onCollected is called with each result on the API thread, e.g. to record
+# the file in the journal of the export
+#
+class PostProcessPool(object):
+    def __init__(self, workerCount=0, queueSize=S_POST_PROCESS_QUEUE_SIZE, onCollected=None):
+        self.workerCount = max(min(workerCount, S_POST_PROCESS_MAX_WORKERS), 0)
+        self.queueSize = max(queueSize, 1)
+        self.onCollected = onCollected
+        self.pending = collections.deque()
+        self.results = []
+        self.waitSeconds = 0.0
+
+        self.executor = None
+        if self.workerCount > 0:
+            self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.workerCount, thread_name_prefix='FilteredExportPostProcess')
+
+    def submit(self, function, *args):
+        if self.executor is None:
+            future = concurrent.futures.Future()
+            future.set_result(function(*args))
+        else:
+            # backpressure: wait for the oldest file before a new one is queued
+            while len(self.pending) >= self.queueSize:
+                self.collectOldest()
+
+            future = self.executor.submit(function, *args)
+
+            # results of files that are done are collected at once
+            while self.pending and self.pending[0].done():
+                self.collectOldest()
+
+        self.pending.append(future)
+
+        if self.executor is None:
+            self.collectOldest()
+
+        return future
+
+    # errors of the post processing are raised in the API thread
+    def collectOldest(self):
+        future = self.pending.popleft()
+
+        startTime = time.perf_counter()
+        result = future.result()
+        self.waitSeconds += time.perf_counter() - startTime
+
+        self.results.append(result)
+
+        if self.onCollected is not None:
+            self.onCollected(result)
+
+    #
+    # wait for all files and stop the threads. Returns the results
+    #
+    def close(self):
+        try:
+            while self.pending:
+                self.collectOldest()
+        finally:
+            if self.executor is not None:
+                self.executor.shutdown(wait=True)
+
+        return self.results
+
+    def render(self):
+        return 'Files: ' + str(len(self.results)) + ' on ' + str(self.workerCount) + ' threads, ' + \
+               'waited for post processing: {:.1f} s'.format(self.waitSeconds)
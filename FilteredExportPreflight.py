@@ -0,0 +1,210 @@
+import math
+
+from .FilteredExportMesh import calculateMesh
+
+# Faked statics for easy code maintainance
+S_PREFLIGHT_FORMAT_BINARY = 'Binary'
+S_PREFLIGHT_FORMAT_TEXT = 'Text'
+S_PREFLIGHT_FORMAT_3MF = '3MF'
+S_PREFLIGHT_BINARY_HEADER_SIZE = 84
+S_PREFLIGHT_BINARY_TRIANGLE_SIZE = 50
+S_PREFLIGHT_TEXT_SOLID_SIZE = 32
+S_PREFLIGHT_TEXT_TRIANGLE_SIZE = 230
+
+# welded vertices and triangles of 3MF files after compression
+S_PREFLIGHT_3MF_TRIANGLE_SIZE = 20
+
+# area of an equilateral triangle with an edge length of 1
+S_PREFLIGHT_TRIANGLE_AREA = math.sqrt(3.0) / 4.0
+
+# upper limits of the deviation spinners of the STL export (cm and degree)
+S_PREFLIGHT_MAX_SURFACE_DEVIATION = 0.084635
+S_PREFLIGHT_MAX_NORMAL_DEVIATION = 41.0
+
+# bodies that are tessellated per refinement to calibrate the estimation
+S_PREFLIGHT_CALIBRATION_BODIES = 5
+
+#
+# measures of a body used by the estimation. The radius of curvature is
+# derived from volume and area: 3 * volume / area is exact for spheres and
+# smaller for thin or filleted parts, so the estimation errs on the safe side.
+# The diagonal of the bounding box limits the edge length of flat bodies
+#
+class BodyMeasures(object):
+    def __init__(self, body):
+        boundingBox = body.boundingBox
+        minPoint = boundingBox.minPoint
+        maxPoint = boundingBox.maxPoint
+
+        self.area = body.area
+        self.diagonal = math.sqrt((maxPoint.x - minPoint.x) ** 2 + (maxPoint.y - minPoint.y) ** 2 + (maxPoint.z - minPoint.z) ** 2)
+        self.faceCount = body.faces.count
+
+        self.radius = 0.0
+        if self.area > 0.0:
+            self.radius = min(3.0 * abs(body.volume) / self.area, self.diagonal / 2.0)
+
+
+#
+# expected edge length (cm) of the triangles. The chord height of an arc with
+# radius r and chord length l is about l² / 8r, the normals at both ends of
+# the chord differ by l / r radians
+#
+def getEdgeLength(measures, surfaceDeviation, normalDeviation):
+    chordLength = math.sqrt(8.0 * measures.radius * surfaceDeviation)
+    normalLength = measures.radius * math.radians(normalDeviation)
+
+    return min(chordLength, normalLength, measures.diagonal)
+
+
+#
+# number of triangles needed to cover the area of a body with triangles of
+# the expected edge length. None if the edge length can't be estimated
+#
+def getAreaTriangleCount(measures, surfaceDeviation, normalDeviation):
+    edgeLength = getEdgeLength(measures, surfaceDeviation, normalDeviation)
+    if edgeLength <= 0.0:
+        return None
+
+    return measures.area / (S_PREFLIGHT_TRIANGLE_AREA * edgeLength * edgeLength)
+
+
+#
+# estimated number of triangles of a body. The calibration factor scales the
+# area based count to the meshes of the writer (see getCalibrationFactor).
+# Each face needs two triangles at least
+#
+def estimateTriangleCount(measures, surfaceDeviation, normalDeviation, calibrationFactor=1.0):
+    minimumCount = 2 * measures.faceCount
+
+    triangleCount = getAreaTriangleCount(measures, surfaceDeviation, normalDeviation)
+    if triangleCount is None:
+        return minimumCount
+
+    return max(int(round(triangleCount * calibrationFactor)), minimumCount)
+
+
+#
+# factor between the triangles of the written meshes and the area based
+# estimation. The measures can't tell flat faces, which need few triangles,
+# from curved faces, so a few bodies spread over the range of areas are
+# tessellated with the deviations of the refinement. bodies is a list of
+# (body, measures) pairs
+#
+def getCalibrationFactor(bodies, surfaceDeviation, normalDeviation):
+    samples = [(body, measures) for body, measures in bodies \
+                if getAreaTriangleCount(measures, surfaceDeviation, normalDeviation)]
+    if not samples:
+        return 1.0
+
+    samples.sort(key=lambda sample: sample[1].area)
+    sampleCount = min(len(samples), S_PREFLIGHT_CALIBRATION_BODIES)
+    samples = [samples[(index * (len(samples) - 1)) // max(sampleCount - 1, 1)] for index in range(sampleCount)]
+
+    meshTriangleCount = 0
+    estimatedTriangleCount = 0.0
+    for body, measures in samples:
+        coordinates, indices = calculateMesh(body, surfaceDeviation, normalDeviation)
+        meshTriangleCount += len(indices) // 3
+        estimatedTriangleCount += getAreaTriangleCount(measures, surfaceDeviation, normalDeviation)
+
+    return meshTriangleCount / estimatedTriangleCount
+
+
+#
+# estimated size of a mesh in a binary STL, text STL or 3MF file in bytes
+#
+def estimateFileSize(triangleCount, fileFormat):
+    if fileFormat == S_PREFLIGHT_FORMAT_BINARY:
+        return S_PREFLIGHT_BINARY_HEADER_SIZE + triangleCount * S_PREFLIGHT_BINARY_TRIANGLE_SIZE
+
+    if fileFormat == S_PREFLIGHT_FORMAT_3MF:
+        return triangleCount * S_PREFLIGHT_3MF_TRIANGLE_SIZE
+
+    return S_PREFLIGHT_TEXT_SOLID_SIZE + triangleCount * S_PREFLIGHT_TEXT_TRIANGLE_SIZE
+
+
+#
+# surface and normal deviation that keep a body below the triangle budget.
+# Deviations are only increased and never exceed the limits of the spinners.
+# A budget of 0 disables the adjustment
+#
+def getBudgetDeviation(measures, surfaceDeviation, normalDeviation, triangleBudget, calibrationFactor=1.0):
+    if triangleBudget <= 0 or measures.radius <= 0.0:
+        return surfaceDeviation, normalDeviation
+
+    if estimateTriangleCount(measures, surfaceDeviation, normalDeviation, calibrationFactor) <= triangleBudget:
+        return surfaceDeviation, normalDeviation
+
+    # edge length that is needed to cover the area with the budget
+    edgeLength = math.sqrt(measures.area * calibrationFactor / (S_PREFLIGHT_TRIANGLE_AREA * triangleBudget))
+
+    surfaceDeviation = min(max(surfaceDeviation, edgeLength * edgeLength / (8.0 * measures.radius)), S_PREFLIGHT_MAX_SURFACE_DEVIATION)
+    normalDeviation = min(max(normalDeviation, math.degrees(edgeLength / measures.radius)), S_PREFLIGHT_MAX_NORMAL_DEVIATION)
+
+    return surfaceDeviation, normalDeviation
+
+
+#
+# formats a number of bytes, e.g. 12.3 MB
+#
+def formatFileSize(fileSize):
+    if fileSize < 1024:
+        return str(fileSize) + ' B'
+
+    for unit in ('KB', 'MB', 'GB'):
+        fileSize /= 1024.0
+        if fileSize < 1024.0 or unit == 'GB':
+            return '{:.1f} {}'.format(fileSize, unit)
+
+
+#
+# totals of the estimation of an export. Each mesh is a file, except for 3MF
+# where all meshes share one file. Meshes whose deviations were increased to
+# meet the triangle budget are counted as reduced, meshes that exceed the
+# budget even with the coarsest deviations are listed as over budget only
+#
+class PreflightEstimation(object):
+    def __init__(self, fileFormat, triangleBudget=0):
+        self.fileFormat = fileFormat
+        self.triangleBudget = triangleBudget
+        self.meshCount = 0
+        self.triangleCount = 0
+        self.fileSize = 0
+        self.largestFileName = ''
+        self.largestFileSize = 0
+        self.reducedNames = []
+        self.overBudgetNames = []
+
+    def add(self, fileName, triangleCount, isReduced=False):
+        fileSize = estimateFileSize(triangleCount, self.fileFormat)
+
+        self.meshCount += 1
+        self.triangleCount += triangleCount
+        self.fileSize += fileSize
+
+        if fileSize > self.largestFileSize:
+            self.largestFileName = fileName
+            self.largestFileSize = fileSize
+
+        if self.triangleBudget > 0 and triangleCount > self.triangleBudget:
+            self.overBudgetNames.append(fileName)
+        elif isReduced:
+            self.reducedNames.append(fileName)
+
+    def render(self):
+        lines = ['Meshes: ' + str(self.meshCount),
+                 'Triangles: ~' + str(self.triangleCount),
+                 'Size: ~' + formatFileSize(self.fileSize)]
+
+        if self.meshCount > 0:
+            lines.append('Largest mesh: ' + self.largestFileName + ' (~' + formatFileSize(self.largestFileSize) + ')')
+
+        if self.triangleBudget > 0:
+            lines.append('Triangle budget: ' + str(self.triangleBudget) + ' per mesh')
+            lines.append('Reduced to budget: ' + str(len(self.reducedNames)))
+
+            for fileName in self.overBudgetNames:
+                lines.append('Over budget: ' + fileName)
+
+        return '\n   '.join(lines)
@@ -0,0 +1,106 @@
+import adsk
+import os
+import time
+
+from .FilteredExportPreflight import formatFileSize
+
+# Faked statics for easy code maintainance
+S_PROGRESS_SLOWEST_COUNT = 5
+
+# seconds before the dialog is shown, short exports don't flash a dialog
+S_PROGRESS_DELAY = 1
+
+#
+# size of a written file, 0 if the file doesn't exist (e.g. cloud copies)
+#
+def getFileSize(fileName):
+    try:
+        return os.path.getsize(fileName)
+    except OSError:
+        return 0
+
+
+#
+# progress dialog of an export loop. Each item is started and finished, so
+# the wall time and the written bytes per item are known. The dialog can be
+# cancelled, the loop checks wasCancelled between items and keeps what was
+# exported so far. An item count of 0 shows a busy indicator for loops whose
+# length is unknown, e.g. exports during the traversal
+#
+class ExportProgress(object):
+    def __init__(self, ui, title, itemCount=0):
+        self.itemCount = itemCount
+        self.itemValue = 0
+        self.itemName = ''
+        self.itemStartTime = None
+        self.startTime = time.perf_counter()
+        self.items = []
+        self.byteCount = 0
+        self.isCancelled = False
+
+        self.dialog = ui.createProgressDialog()
+        self.dialog.isCancelButtonShown = True
+        self.dialog.cancelButtonText = 'Stop'
+        self.dialog.show(title, 'Starting export', 0, itemCount, S_PROGRESS_DELAY)
+
+    @property
+    def wasCancelled(self):
+        if not self.isCancelled:
+            self.isCancelled = self.dialog.wasCancelled
+
+        return self.isCancelled
+
+    # items and bytes per second since the start of the export
+    def getThroughput(self):
+        seconds = max(time.perf_counter() - self.startTime, 1e-9)
+
+        return len(self.items) / seconds, self.byteCount / seconds
+
+    def start(self, itemName):
+        self.itemName = itemName
+        self.itemStartTime = time.perf_counter()
+
+        itemsPerSecond, bytesPerSecond = self.getThroughput()
+
+        message = 'Exporting ' + str(self.itemValue + 1)
+        if self.itemCount > 0:
+            message += ' of ' + str(self.itemCount)
+
+        message += '\n' + itemName + '\n{:.1f} items/s, {:.1f} MB/s'.format(itemsPerSecond, bytesPerSecond / 1048576.0)
+        self.dialog.message = message
+
+    # record wall time and written bytes of the started item
+    def finish(self, byteCount=0):
+        self.items.append((time.perf_counter() - self.itemStartTime, self.itemName, byteCount))
+        self.byteCount += byteCount
+        self.advance()
+
+    # count an item that wasn't exported, e.g. an unchanged file
+    def advance(self):
+        self.itemValue += 1
+        self.dialog.progressValue = self.itemValue
+
+        # let Fusion 360 update the dialog and process the cancel button
+        adsk.doEvents()
+
+    def close(self):
+        self.dialog.hide()
+
+    def render(self):
+        seconds = time.perf_counter() - self.startTime
+        itemsPerSecond, bytesPerSecond = self.getThroughput()
+
+        lines = []
+        if self.isCancelled:
+            lines.append('Cancelled after ' + str(self.itemValue) + (' of ' + str(self.itemCount) if self.itemCount > 0 else '') + ' items')
+
+        text = 'Items: ' + str(len(self.items)) + ' in {:.1f} s, {:.1f} items/s'.format(seconds, itemsPerSecond)
+        if self.byteCount > 0:
+            text += ', ' + formatFileSize(self.byteCount) + ', {:.1f} MB/s'.format(bytesPerSecond / 1048576.0)
+
+        lines.append(text)
+
+        for itemSeconds, itemName, byteCount in sorted(self.items, key=lambda item: item[0], reverse=True)[:S_PROGRESS_SLOWEST_COUNT]:
+            lines.append('Slow: ' + itemName + ' ({:.2f} s)'.format(itemSeconds))
+
+        return '\n   '.join(lines)
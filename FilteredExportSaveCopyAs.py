@@ -2,7 +2,14 @@ import adsk.core
 import adsk.fusion
 import traceback
 
-from .FilteredExportUtil import getComponents
+from .FilteredExportIndexStore import getAssemblyIndex
+from .FilteredExportFilter import parseComponentFilterExpression
+from .FilteredExportSession import ExportSession
+from .FilteredExportInstrumentation import apiProfiler
+from .FilteredExportInstrumentation import S_PROFILE_PHASE_EXPORT
+from .FilteredExportUtil import normaliseSelection
+from .FilteredExportUtil import S_COMPONENT_KIND_LEAF
+from .FilteredExportUtil import S_COMPONENT_KIND_MIXED
 from .FilteredExportUtil import renderResultMessage
 from .FilteredExportUtil import FilteredExportResult
 
@@ -15,113 +22,137 @@ S_CPY_FILTER_TYPE_LOOKUP = 'cpyDropDownFilterType'
 S_CPY_FILTER_TYPET_TOP_LEVEL = 'Top level'
 S_CPY_FILTER_TYPE_LEAVES = 'Leaves'
 S_CPY_FILTER_TYPE_MIXED_LEAVES = 'Mixed leaves'
+S_CPY_FILTER_EXPRESSION = 'cpyFilterExpression'
+S_CPY_PROGRESS_TITLE = 'Save Copy As Export'
+
+#
+# session of an export. The number of components is unknown until the
+# traversal is done. The copies are saved to the data panel, so there are no
+# files to write or post process
+#
+def getSession(appObjects):
+    return ExportSession(appObjects.ui, S_CPY_PROGRESS_TITLE, None, None, 0)
+
 
 #
 # Export top level or selected components
 #
-def exportTopLevelMode(appObjects, input_values):
+def exportTopLevelMode(appObjects, input_values, traversalCache):
     # get root component
     rootComponent = appObjects.design.rootComponent
 
-    # get component list
-    components = []
-
-    # selection available?
-    if S_CPY_SELECTION_LOOKUP in input_values:
-        if input_values[S_CPY_SELECTION_LOOKUP][0] == rootComponent:
-            # process all components
-            components = getComponents(rootComponent.occurrences, components, False, False)
-        else:
-            # process selcted components
-            components = getComponents(input_values[S_CPY_SELECTION_LOOKUP], components, False, False)
-    else:
-        # process all components
-        components = getComponents(rootComponent.occurrences, components, False, False)
-
-     # list of processed file names
+    # process selected components without duplicates. All components are
+    # processed if nothing or the root component is selected
+    selection = normaliseSelection(input_values.get(S_CPY_SELECTION_LOOKUP), rootComponent, False)
+
+    # components that don't match the filter are skipped during the traversal
+    componentFilter = parseComponentFilterExpression(input_values.get(S_CPY_FILTER_EXPRESSION))
+
+    # get index of the components. Entries are created while they are processed
+    assemblyIndex = getAssemblyIndex(traversalCache, appObjects.document, appObjects.design, selection, False, False, False, componentFilter)
+
+    # list of processed file names
     processedComponents = []
 
     # get target folder
     documentFolder = appObjects.document.dataFile.parentFolder
 
-    # export all components
-    for component in components:
-        # create a copy and save it
-        component.saveCopyAs(component.name, documentFolder, '', '')
-        # amend
-        processedComponents.append(component.name)
+    # export each component as soon as the traversal returns it
+    with getSession(appObjects) as session:
+        progress = session.progress
+
+        for entry in assemblyIndex:
+            if progress.wasCancelled:
+                break
+
+            # create a copy and save it
+            progress.start(entry.name)
+            entry.component.saveCopyAs(entry.name, documentFolder, '', '')
+            progress.finish()
+            # amend
+            processedComponents.append(entry.name)
 
     # return resulting lists
-    return FilteredExportResult(documentFolder.name, processedComponents, '')
+    return session.addResults(FilteredExportResult(documentFolder.name, processedComponents, '', assemblyIndex.statistics))
 
 
 #
 # Export top level or selected components
 #
-def exportLeaveMode(appObjects, input_values):
-    # get root component
-    rootComponent = appObjects.design.rootComponent
+def exportLeaveMode(appObjects, input_values, traversalCache):
+    # reduce selection to disjoint subtrees. All components are processed if
+    # nothing or the root component is selected
+    selection = normaliseSelection(input_values.get(S_CPY_SELECTION_LOOKUP), appObjects.design.rootComponent, True)
 
-    # get component list
-    components = []
+    # components that don't match the filter are skipped during the traversal
+    componentFilter = parseComponentFilterExpression(input_values.get(S_CPY_FILTER_EXPRESSION))
 
-    # selection available?
-    if S_CPY_SELECTION_LOOKUP in input_values:
-        # process selcted components
-        components = getComponents(input_values[S_CPY_SELECTION_LOOKUP], components, True, False)
-    else:
-        # process all components
-        components = getComponents(rootComponent.occurrences, components, True, False)
+    # get index of the components. Entries are created while they are processed.
+    # The files are named after the components, so the order doesn't matter
+    assemblyIndex = getAssemblyIndex(traversalCache, appObjects.document, appObjects.design, selection, True, False, False, componentFilter, False)
 
-     # list of processed and skipped file names
+    # list of processed and skipped file names
     processedComponents = []
     skippedComponents = []
 
     # get target folder
     documentFolder = appObjects.document.dataFile.parentFolder
 
-    for component in components:
-        if component.bRepBodies and not component.occurrences:
-            # export leave component (contains bodies but no other components)
-            component.saveCopyAs(component.name, documentFolder, '', '')
-            processedComponents.append(component.name)
-        elif component.bRepBodies and component.occurrencesByComponent:
-            # skip export because this component contains bodies and components
-            skippedComponents.append(component.name)
+    with getSession(appObjects) as session:
+        progress = session.progress
+
+        for entry in assemblyIndex:
+            if progress.wasCancelled:
+                break
+
+            if entry.kind == S_COMPONENT_KIND_LEAF:
+                # export leave component (contains bodies but no other components)
+                progress.start(entry.name)
+                entry.component.saveCopyAs(entry.name, documentFolder, '', '')
+                progress.finish()
+                processedComponents.append(entry.name)
+            elif entry.kind == S_COMPONENT_KIND_MIXED:
+                # skip export because this component contains bodies and components
+                skippedComponents.append(entry.name)
 
     # return resulting lists
-    return FilteredExportResult(documentFolder.name, processedComponents, skippedComponents)
+    return session.addResults(FilteredExportResult(documentFolder.name, processedComponents, skippedComponents, assemblyIndex.statistics))
 
 #
 # Export top mixed level or selected components
 #
-def exportMixedLeaveMode(appObjects, input_values):
-    # get root component
-    rootComponent = appObjects.design.rootComponent
+def exportMixedLeaveMode(appObjects, input_values, traversalCache):
+    # reduce selection to disjoint subtrees. All components are processed if
+    # nothing or the root component is selected
+    selection = normaliseSelection(input_values.get(S_CPY_SELECTION_LOOKUP), appObjects.design.rootComponent, True)
 
-    # get component list
-    components = []
+    # components that don't match the filter are skipped during the traversal
+    componentFilter = parseComponentFilterExpression(input_values.get(S_CPY_FILTER_EXPRESSION))
 
-    # selection available?
-    if S_CPY_SELECTION_LOOKUP in input_values:
-        # process selcted components
-        components = getComponents(input_values[S_CPY_SELECTION_LOOKUP], components, True, False)
-    else:
-        # process all components
-        components = getComponents(rootComponent.occurrences, components, True, False)
+    # get index of the components. Entries are created while they are processed.
+    # The files are named after the components, so the order doesn't matter
+    assemblyIndex = getAssemblyIndex(traversalCache, appObjects.document, appObjects.design, selection, True, False, False, componentFilter, False)
 
-     # list of processed and skipped file names
+    # list of processed and skipped file names
     processedComponents = []
 
     # get target folder
     documentFolder = appObjects.document.dataFile.parentFolder
 
-    for component in components:
-        component.saveCopyAs(component.name, documentFolder, '', '')
-        processedComponents.append(component.name)
+    with getSession(appObjects) as session:
+        progress = session.progress
+
+        for entry in assemblyIndex:
+            if progress.wasCancelled:
+                break
+
+            progress.start(entry.name)
+            entry.component.saveCopyAs(entry.name, documentFolder, '', '')
+            progress.finish()
+            processedComponents.append(entry.name)
 
     # return resulting lists
-    return FilteredExportResult(documentFolder.name, processedComponents, '')
+    return session.addResults(FilteredExportResult(documentFolder.name, processedComponents, '', assemblyIndex.statistics))
 
 
 #
@@ -131,7 +162,10 @@ class FilteredExportSaveCopyAs(Fusion360CommandBase):
     # Run when the user presses OK
     def on_execute(self, command: adsk.core.Command, inputs: adsk.core.CommandInputs, args, input_values):
         try:
-            appObjects = AppObjects()
+            # API calls are only counted if profiling is enabled
+            apiProfiler.start()
+            appObjects = apiProfiler.wrapAppObjects(AppObjects())
+            input_values = apiProfiler.wrapInputValues(input_values)
 
             # no design? Nothing to do
             if not appObjects.design:
@@ -140,16 +174,23 @@ class FilteredExportSaveCopyAs(Fusion360CommandBase):
             # export components
             exportResult = None
 
-            if input_values[S_CPY_FILTER_TYPE_LOOKUP] == S_CPY_FILTER_TYPET_TOP_LEVEL:
-                # export top level mode
-                exportResult = exportTopLevelMode(appObjects, input_values)
-            elif input_values[S_CPY_FILTER_TYPE_LOOKUP] == S_CPY_FILTER_TYPE_LEAVES:
-                # export leave mode
-                exportResult = exportLeaveMode(appObjects, input_values)
-            elif input_values[S_CPY_FILTER_TYPE_LOOKUP] == S_CPY_FILTER_TYPE_MIXED_LEAVES:
-                # export mixed leave mode
-                exportResult = exportMixedLeaveMode(appObjects, input_values)
+            with apiProfiler.phase(S_PROFILE_PHASE_EXPORT):
+                if input_values[S_CPY_FILTER_TYPE_LOOKUP] == S_CPY_FILTER_TYPET_TOP_LEVEL:
+                    # export top level mode
+                    exportResult = exportTopLevelMode(appObjects, input_values, self.traversal_cache)
+                elif input_values[S_CPY_FILTER_TYPE_LOOKUP] == S_CPY_FILTER_TYPE_LEAVES:
+                    # export leave mode
+                    exportResult = exportLeaveMode(appObjects, input_values, self.traversal_cache)
+                elif input_values[S_CPY_FILTER_TYPE_LOOKUP] == S_CPY_FILTER_TYPE_MIXED_LEAVES:
+                    # export mixed leave mode
+                    exportResult = exportMixedLeaveMode(appObjects, input_values, self.traversal_cache)
             
+            if self.debug:
+                exportResult.cacheReport = self.traversal_cache.render()
+
+            if apiProfiler.enabled:
+                exportResult.profileReport = apiProfiler.writeReport(self.cmd_id)
+
             # show result list
             appObjects.ui.messageBox(renderResultMessage(exportResult))
 
@@ -175,6 +216,9 @@ class FilteredExportSaveCopyAs(Fusion360CommandBase):
         dropDownCpyFilterTypeItems.add(S_CPY_FILTER_TYPE_LEAVES, False, '')
         dropDownCpyFilterTypeItems.add(S_CPY_FILTER_TYPE_MIXED_LEAVES, False, '')
 
+        # Filter expression, e.g. !name:Screw*;path:Hardware
+        inputs.addStringValueInput(S_CPY_FILTER_EXPRESSION, 'Filter', '')
+
     # Run whenever a user makes any change to a value or selection in the addin UI
     def on_preview(self, command: adsk.core.Command, inputs: adsk.core.CommandInputs, args, input_values):
         pass
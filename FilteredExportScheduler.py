@@ -0,0 +1,201 @@
+import adsk.core
+import time
+import threading
+import traceback
+import collections
+
+# Faked statics for easy code maintainance
+S_SCHEDULER_EVENT_ID = 'FilteredExportSchedulerEvent'
+
+# a slice ends after this many items or seconds, whatever comes first
+S_SCHEDULER_SLICE_ITEMS = 25
+S_SCHEDULER_SLICE_SECONDS = 0.2
+
+# pause between two slices, Fusion 360 processes the user input in between
+S_SCHEDULER_FIRE_INTERVAL = 0.02
+
+#
+# run the steps of an export until they are done. Each step is one item,
+# the result is the return value of the generator
+#
+def runSteps(exportSteps):
+    while True:
+        try:
+            next(exportSteps)
+        except StopIteration as e:
+            return e.value
+
+
+#
+# text of a failed export. Errors of the user are shown as they are
+#
+def renderJobError(error):
+    if isinstance(error, ValueError):
+        return str(error)
+
+    return 'Failed:\n' + ''.join(traceback.format_exception(type(error), error, error.__traceback__))
+
+
+#
+# export that is processed by the scheduler. exportSteps is a generator that
+# yields after each item and returns the result. onFinished gets the result,
+# onFailed the exception
+#
+class ExportJob(object):
+    def __init__(self, name, exportSteps, onFinished, onFailed):
+        self.name = name
+        self.exportSteps = exportSteps
+        self.onFinished = onFinished
+        self.onFailed = onFailed
+        self.itemCount = 0
+        self.sliceCount = 0
+
+    #
+    # process items until the slice is used up. Returns True when the job is done
+    #
+    def runSlice(self, sliceItems, sliceSeconds):
+        self.sliceCount += 1
+        endTime = time.perf_counter() + sliceSeconds
+
+        for itemIndex in range(sliceItems):
+            try:
+                next(self.exportSteps)
+            except StopIteration as e:
+                self.onFinished(e.value)
+                return True
+            except Exception as e:
+                self.onFailed(e)
+                return True
+
+            self.itemCount += 1
+
+            if time.perf_counter() >= endTime:
+                break
+
+        return False
+
+    # stop the job, the generator closes its sink and progress dialog
+    def cancel(self):
+        self.exportSteps.close()
+
+
+#
+# runs the custom event handler on the UI thread of Fusion 360
+#
+class ExportSchedulerEventHandler(adsk.core.CustomEventHandler):
+    def __init__(self, scheduler):
+        super().__init__()
+        self.scheduler_ = scheduler
+
+    def notify(self, args):
+        self.scheduler_.runSlice()
+
+
+#
+# queue of exports that are processed in slices. Each slice runs in the
+# handler of a custom event on the UI thread, because the API must not be
+# called from other threads. A helper thread only fires the event while the
+# queue isn't empty, so Fusion 360 stays responsive between two slices
+#
+class ExportScheduler(object):
+    def __init__(self, eventId=S_SCHEDULER_EVENT_ID, sliceItems=S_SCHEDULER_SLICE_ITEMS, sliceSeconds=S_SCHEDULER_SLICE_SECONDS, \
+                 fireInterval=S_SCHEDULER_FIRE_INTERVAL):
+        self.eventId = eventId
+        self.sliceItems = sliceItems
+        self.sliceSeconds = sliceSeconds
+        self.fireInterval = fireInterval
+
+        self.jobs = collections.deque()
+        self.isRunningSlice = False
+
+        self.customEvent = None
+        self.handler = None
+        self.thread = None
+        self.wakeUp = threading.Event()
+        self.isStopping = False
+
+    @property
+    def isBusy(self):
+        return len(self.jobs) > 0
+
+    def start(self):
+        if self.customEvent is not None:
+            return
+
+        app = adsk.core.Application.get()
+
+        self.customEvent = app.registerCustomEvent(self.eventId)
+        self.handler = ExportSchedulerEventHandler(self)
+        self.customEvent.add(self.handler)
+
+        self.isStopping = False
+        self.thread = threading.Thread(target=self.fireEvents, name='FilteredExportScheduler', daemon=True)
+        self.thread.start()
+
+    #
+    # cancel all jobs and unregister the custom event
+    #
+    def stop(self):
+        if self.customEvent is None:
+            return
+
+        self.isStopping = True
+        self.wakeUp.set()
+        self.thread.join()
+
+        while self.jobs:
+            self.jobs.popleft().cancel()
+
+        app = adsk.core.Application.get()
+        self.customEvent.remove(self.handler)
+        app.unregisterCustomEvent(self.eventId)
+
+        self.customEvent = None
+        self.handler = None
+        self.thread = None
+
+    def submit(self, job):
+        self.start()
+
+        self.jobs.append(job)
+        self.wakeUp.set()
+
+    #
+    # helper thread: fire the event whenever a slice is due
+    #
+    def fireEvents(self):
+        app = adsk.core.Application.get()
+
+        while True:
+            self.wakeUp.wait()
+            if self.isStopping:
+                return
+
+            self.wakeUp.clear()
+            time.sleep(self.fireInterval)
+
+            if not self.isStopping:
+                app.fireCustomEvent(self.eventId, '')
+
+    #
+    # process one slice of the first job. Events that arrive while a slice
+    # runs (e.g. from doEvents of a progress dialog) are ignored
+    #
+    def runSlice(self):
+        if self.isRunningSlice or not self.jobs:
+            return
+
+        self.isRunningSlice = True
+        try:
+            if self.jobs[0].runSlice(self.sliceItems, self.sliceSeconds):
+                self.jobs.popleft()
+        finally:
+            self.isRunningSlice = False
+
+            # the next slice is fired by the helper thread
+            if self.jobs:
+                self.wakeUp.set()
+
+
+# scheduler shared by all commands
+exportScheduler = ExportScheduler()
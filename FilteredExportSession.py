@@ -0,0 +1,53 @@
+from .FilteredExportProgress import ExportProgress
+from .FilteredExportPostProcess import PostProcessPool
+
+#
+# lifecycle of an export loop, used as context manager. The progress dialog
+# and the post processing pool are created for the loop, the journal records
+# each file when its post processing is done. At the end the pool is
+# drained, the dialog hidden and the sink closed, also if the loop fails or
+# its generator is closed. The journal of a loop that ran to its end is
+# finished, a failed export leaves it unfinished for a resume. Exports
+# without local files, like Save Copy As, have neither sink nor journal
+#
+class ExportSession(object):
+    def __init__(self, ui, title, exportSink, journal, postProcessThreads, itemCount=0):
+        self.exportSink = exportSink
+        self.journal = journal
+        self.progress = ExportProgress(ui, title, itemCount)
+        self.postProcessPool = PostProcessPool(postProcessThreads, onCollected=journal.commit if journal is not None else None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, excTraceback):
+        try:
+            self.postProcessPool.close()
+        finally:
+            self.progress.close()
+
+            try:
+                if self.exportSink is not None:
+                    self.exportSink.close()
+            finally:
+                if self.journal is not None:
+                    # a cancelled export can be resumed
+                    if excType is None:
+                        self.journal.finish(self.progress.isCancelled)
+                    else:
+                        self.journal.close()
+
+        return False
+
+    #
+    # progress and post processing of the export. The results are in the
+    # order of the files
+    #
+    def addResults(self, exportResult):
+        exportResult.progressReport = self.progress.render()
+        exportResult.postProcessResults = self.postProcessPool.results
+
+        if self.postProcessPool.workerCount > 0:
+            exportResult.postProcessReport = self.postProcessPool.render()
+
+        return exportResult
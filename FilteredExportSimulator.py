@@ -0,0 +1,1256 @@
+import sys
+import time
+import queue
+import uuid
+import types
+import random
+import struct
+
+#
+# Offline stand-in for the subset of adsk.core / adsk.fusion used by this add-in.
+# Call install() before the add-in modules are imported and use
+# generateAssembly() to build synthetic designs of any size. See
+# FilteredExportBenchmark.py for an example.
+#
+
+#
+# base class of all simulated API objects
+#
+class SimObject(object):
+    @classmethod
+    def classType(cls):
+        return cls.__module__ + '::' + cls.__name__
+
+    @property
+    def objectType(self):
+        return self.classType()
+
+    @property
+    def isValid(self):
+        return True
+
+    @classmethod
+    def cast(cls, obj):
+        if obj is None or isinstance(obj, cls):
+            return obj
+        return None
+
+
+#
+# read only list wrapper that behaves like an adsk collection
+#
+class SimCollection(SimObject):
+    def __init__(self, items=None):
+        self._items = list(items) if items else []
+
+    @property
+    def count(self):
+        return len(self._items)
+
+    def item(self, index):
+        return self._items[index]
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __getitem__(self, index):
+        return self._items[index]
+
+
+#
+# simple event with handler registration
+#
+class SimEvent(SimObject):
+    def __init__(self):
+        self.handlers = []
+
+    def add(self, handler):
+        self.handlers.append(handler)
+        return True
+
+    def remove(self, handler):
+        if handler in self.handlers:
+            self.handlers.remove(handler)
+        return True
+
+    def fire(self, args):
+        for handler in list(self.handlers):
+            handler.notify(args)
+
+
+class SimEventArgs(SimObject):
+    def __init__(self, **kwargs):
+        for key, value in kwargs.items():
+            setattr(self, key, value)
+
+
+class SimEventHandler(SimObject):
+    def __init__(self):
+        pass
+
+    def notify(self, args):
+        pass
+
+
+#
+# adsk.core
+#
+class DialogResults(object):
+    DialogError = -1
+    DialogOK = 0
+    DialogCancel = 1
+    DialogYes = 2
+    DialogNo = 3
+
+
+class DropDownStyles(object):
+    TextListDropDownStyle = 0
+    LabeledIconDropDownStyle = 1
+    CheckBoxDropDownStyle = 2
+
+
+class CommandTerminationReason(object):
+    UnknownTerminationReason = 0
+    CompletedTerminationReason = 1
+    CancelledTerminationReason = 2
+    AbortedTerminationReason = 3
+    PreEmptedTerminationReason = 4
+    SessionEndingTerminationReason = 5
+
+
+class MessageBoxButtonTypes(object):
+    OKButtonType = 0
+    OKCancelButtonType = 1
+    RetryCancelButtonType = 2
+    YesNoButtonType = 3
+    YesNoCancelButtonType = 4
+
+
+class MessageBoxIconTypes(object):
+    NoIconIconType = 0
+    QuestionIconType = 1
+    InformationIconType = 2
+    WarningIconType = 3
+    CriticalIconType = 4
+
+
+class Point3D(SimObject):
+    def __init__(self, x=0.0, y=0.0, z=0.0):
+        self.x = x
+        self.y = y
+        self.z = z
+
+    @staticmethod
+    def create(x=0.0, y=0.0, z=0.0):
+        return Point3D(x, y, z)
+
+
+class BoundingBox3D(SimObject):
+    def __init__(self, minPoint, maxPoint):
+        self.minPoint = minPoint
+        self.maxPoint = maxPoint
+
+
+class Matrix3D(SimObject):
+    def __init__(self, cells=None):
+        self._cells = list(cells) if cells else [1.0, 0.0, 0.0, 0.0,
+                                                 0.0, 1.0, 0.0, 0.0,
+                                                 0.0, 0.0, 1.0, 0.0,
+                                                 0.0, 0.0, 0.0, 1.0]
+
+    @staticmethod
+    def create():
+        return Matrix3D()
+
+    def asArray(self):
+        return tuple(self._cells)
+
+    def getCell(self, row, column):
+        return self._cells[row * 4 + column]
+
+    def setCell(self, row, column, value):
+        self._cells[row * 4 + column] = value
+        return True
+
+    def transformBy(self, matrix):
+        # self = matrix * self
+        a = matrix.asArray()
+        b = self._cells
+        self._cells = [sum(a[row * 4 + k] * b[k * 4 + column] for k in range(4)) for row in range(4) for column in range(4)]
+        return True
+
+    def copy(self):
+        return Matrix3D(self._cells)
+
+
+class ObjectCollection(SimCollection):
+    @staticmethod
+    def create():
+        return ObjectCollection()
+
+    def add(self, item):
+        self._items.append(item)
+        return True
+
+
+# event handler base classes used by Fusion360CommandBase
+class CommandEventHandler(SimEventHandler):
+    pass
+
+
+class CommandCreatedEventHandler(SimEventHandler):
+    pass
+
+
+class InputChangedEventHandler(SimEventHandler):
+    pass
+
+
+class HTMLEventHandler(SimEventHandler):
+    pass
+
+
+class UserInterfaceGeneralEventHandler(SimEventHandler):
+    pass
+
+
+class ApplicationCommandEventHandler(SimEventHandler):
+    pass
+
+
+class DocumentEventHandler(SimEventHandler):
+    pass
+
+
+class CustomEventHandler(SimEventHandler):
+    pass
+
+
+class HTMLEventArgs(SimEventArgs):
+    pass
+
+
+class CustomEvent(SimEvent):
+    def __init__(self, eventId):
+        super().__init__()
+        self.eventId = eventId
+
+
+class CustomEventArgs(SimEventArgs):
+    pass
+
+
+class CommandInputs(SimCollection):
+    pass
+
+
+class Command(SimObject):
+    pass
+
+
+class Palette(SimObject):
+    pass
+
+
+# command input types referenced by get_inputs
+class BoolValueCommandInput(SimObject):
+    pass
+
+
+class DistanceValueCommandInput(SimObject):
+    pass
+
+
+class FloatSliderCommandInput(SimObject):
+    pass
+
+
+class FloatSpinnerCommandInput(SimObject):
+    pass
+
+
+class IntegerSliderCommandInput(SimObject):
+    pass
+
+
+class IntegerSpinnerCommandInput(SimObject):
+    pass
+
+
+class ValueCommandInput(SimObject):
+    pass
+
+
+class SliderCommandInput(SimObject):
+    pass
+
+
+class StringValueCommandInput(SimObject):
+    pass
+
+
+class ButtonRowCommandInput(SimObject):
+    pass
+
+
+class DropDownCommandInput(SimObject):
+    pass
+
+
+class RadioButtonGroupCommandInput(SimObject):
+    pass
+
+
+class SelectionCommandInput(SimObject):
+    pass
+
+
+class UnitsManager(SimObject):
+    pass
+
+
+#
+# folder dialog that returns a preconfigured folder
+#
+class FolderDialog(SimObject):
+    def __init__(self, ui):
+        self._ui = ui
+        self.title = ''
+        self.folder = ''
+
+    def showDialog(self):
+        if self._ui.dialogFolder is None:
+            return DialogResults.DialogCancel
+
+        self.folder = self._ui.dialogFolder
+        return DialogResults.DialogOK
+
+
+#
+# file dialog that returns a preconfigured file
+#
+class FileDialog(SimObject):
+    def __init__(self, ui):
+        self._ui = ui
+        self.title = ''
+        self.filter = ''
+        self.isMultiSelectEnabled = False
+        self.filename = ''
+
+    def showOpen(self):
+        if self._ui.dialogFile is None:
+            return DialogResults.DialogCancel
+
+        self.filename = self._ui.dialogFile
+        return DialogResults.DialogOK
+
+    def showSave(self):
+        return self.showOpen()
+
+
+#
+# progress dialog that records its values. The dialog is cancelled once the
+# progress value reaches ui.progressCancelAfter
+#
+class ProgressDialog(SimObject):
+    def __init__(self, ui):
+        self._ui = ui
+        self.isCancelButtonShown = True
+        self.cancelButtonText = 'Cancel'
+        self.isBackgroundTranslucent = False
+        self.isShowing = False
+        self.title = ''
+        self.message = ''
+        self.minimumValue = 0
+        self.maximumValue = 0
+        self._progressValue = 0
+        self.wasCancelled = False
+        self.messages = []
+
+    def show(self, title, message, minimumValue, maximumValue, delay=0):
+        self.title = title
+        self.message = message
+        self.minimumValue = minimumValue
+        self.maximumValue = maximumValue
+        self.isShowing = True
+        return True
+
+    @property
+    def progressValue(self):
+        return self._progressValue
+
+    @progressValue.setter
+    def progressValue(self, value):
+        self._progressValue = value
+        self.messages.append(self.message)
+
+        cancelAfter = self._ui.progressCancelAfter
+        if self.isCancelButtonShown and cancelAfter is not None and value >= cancelAfter:
+            self.wasCancelled = True
+
+    def hide(self):
+        self.isShowing = False
+        return True
+
+
+#
+# user interface that records every message box instead of showing it
+#
+class UserInterface(SimObject):
+    def __init__(self):
+        self.messages = []
+        self.messageBoxResult = DialogResults.DialogOK
+        self.dialogFolder = None
+        self.dialogFile = None
+        self.progressCancelAfter = None
+        self.progressDialogs = []
+        self.commandTerminated = SimEvent()
+        self.commandStarting = SimEvent()
+
+    def messageBox(self, text, title='', buttons=0, icon=0):
+        self.messages.append(text)
+        return self.messageBoxResult
+
+    def createFolderDialog(self):
+        return FolderDialog(self)
+
+    def createFileDialog(self):
+        return FileDialog(self)
+
+    def createProgressDialog(self):
+        progressDialog = ProgressDialog(self)
+        self.progressDialogs.append(progressDialog)
+        return progressDialog
+
+
+#
+# simulated cloud folder collecting saveCopyAs results
+#
+class DataFolder(SimObject):
+    def __init__(self, name):
+        self.name = name
+        self.savedNames = []
+
+
+class DataFile(SimObject):
+    def __init__(self, id, versionNumber, parentFolder):
+        self.id = id
+        self.versionNumber = versionNumber
+        self.parentFolder = parentFolder
+
+
+class Products(SimCollection):
+    def itemByProductType(self, productType):
+        for product in self._items:
+            if product.productType == productType:
+                return product
+        return None
+
+
+class Document(SimObject):
+    def __init__(self, name, design, dataFile=None):
+        self.name = name
+        self.dataFile = dataFile
+        self.isModified = False
+        self.isSaved = dataFile is not None
+        self.products = Products([design])
+        design.parentDocument = self
+
+
+class Application(SimObject):
+    _instance = None
+
+    def __init__(self):
+        self.userInterface = UserInterface()
+        self.activeDocument = None
+        self.documents = []
+        self.importManager = None
+        self.documentActivated = SimEvent()
+        self.documentSaved = SimEvent()
+        self.documentClosed = SimEvent()
+
+        # custom events are fired from any thread and processed by the
+        # simulated event loop, see processEvents()
+        self.customEvents = {}
+        self.pendingEvents = queue.Queue()
+
+    @staticmethod
+    def get():
+        if Application._instance is None:
+            Application._instance = Application()
+        return Application._instance
+
+    @property
+    def activeProduct(self):
+        if self.activeDocument is None:
+            return None
+        return self.activeDocument.products.item(0)
+
+    #
+    # simulate the end of a command, e.g. an edit of the design
+    #
+    def terminateCommand(self, commandId, terminationReason=CommandTerminationReason.CompletedTerminationReason):
+        self.userInterface.commandTerminated.fire(SimEventArgs(commandId=commandId, terminationReason=terminationReason))
+
+    def registerCustomEvent(self, eventId):
+        customEvent = CustomEvent(eventId)
+        self.customEvents[eventId] = customEvent
+        return customEvent
+
+    def unregisterCustomEvent(self, eventId):
+        return self.customEvents.pop(eventId, None) is not None
+
+    # thread safe like in Fusion 360, the handlers run in processEvents()
+    def fireCustomEvent(self, eventId, additionalInfo=''):
+        if eventId not in self.customEvents:
+            return False
+
+        self.pendingEvents.put((eventId, additionalInfo))
+        return True
+
+    #
+    # simulated event loop: wait up to timeout seconds for a custom event and
+    # run its handlers in the calling thread. Returns True if an event was processed
+    #
+    def processEvents(self, timeout=0.0):
+        try:
+            eventId, additionalInfo = self.pendingEvents.get(timeout=timeout) if timeout > 0.0 else self.pendingEvents.get_nowait()
+        except queue.Empty:
+            return False
+
+        customEvent = self.customEvents.get(eventId)
+        if customEvent is not None:
+            customEvent.fire(CustomEventArgs(firingEvent=customEvent, additionalInfo=additionalInfo))
+
+        return True
+
+    #
+    # process custom events until the condition is met. Raises TimeoutError
+    # if it isn't met within timeout seconds
+    #
+    def runEventLoop(self, condition, timeout=60.0):
+        endTime = time.perf_counter() + timeout
+
+        while not condition():
+            if time.perf_counter() > endTime:
+                raise TimeoutError('Event loop timed out')
+
+            self.processEvents(0.05)
+
+    #
+    # make a document the active one and fire the activation event
+    #
+    def activateDocument(self, document):
+        self.activeDocument = document
+        self.documentActivated.fire(SimEventArgs(document=document))
+
+
+#
+# adsk.fusion
+#
+class DesignTypes(object):
+    DirectDesignType = 0
+    ParametricDesignType = 1
+
+
+class Attribute(SimObject):
+    def __init__(self, groupName, name, value):
+        self.groupName = groupName
+        self.name = name
+        self.value = value
+
+
+class Attributes(SimCollection):
+    def add(self, groupName, name, value):
+        attribute = Attribute(groupName, name, value)
+        self._items.append(attribute)
+        return attribute
+
+    def itemByName(self, groupName, name):
+        for attribute in self._items:
+            if attribute.groupName == groupName and attribute.name == name:
+                return attribute
+        return None
+
+
+class Material(SimObject):
+    def __init__(self, name):
+        self.name = name
+
+
+class Appearance(SimObject):
+    def __init__(self, name):
+        self.name = name
+
+
+class PhysicalProperties(SimObject):
+    def __init__(self, body):
+        self._body = body
+
+    @property
+    def volume(self):
+        return self._body.volume
+
+    @property
+    def area(self):
+        return self._body.area
+
+    @property
+    def mass(self):
+        return self._body.volume
+
+    @property
+    def centerOfMass(self):
+        ox, oy, oz = self._body.origin
+        sx, sy, sz = self._body.size
+        return Point3D(ox + sx / 2.0, oy + sy / 2.0, oz + sz / 2.0)
+
+    def getPrincipalMomentsOfInertia(self):
+        sx, sy, sz = self._body.size
+        mass = self._body.volume
+        return (True, mass * (sy * sy + sz * sz) / 12.0, mass * (sx * sx + sz * sz) / 12.0, mass * (sx * sx + sy * sy) / 12.0)
+
+
+class BRepVertex(SimObject):
+    def __init__(self, x, y, z):
+        self.geometry = Point3D(x, y, z)
+
+
+#
+# axis aligned box body. Each body carries a closed 12 triangle mesh, so every
+# writer produces valid, watertight files. Extra vertices (offsets from the
+# origin) give a body a shape that isn't symmetric, e.g. to mirror it
+#
+class BRepBody(SimObject):
+    def __init__(self, name, parentComponent, size, origin=(0.0, 0.0, 0.0), material='Steel', appearance='Steel - Satin'):
+        self.name = name
+        self.parentComponent = parentComponent
+        self.size = tuple(size)
+        self.origin = tuple(origin)
+        self.isLightBulbOn = True
+        self.isVisible = True
+        self.material = Material(material)
+        self.appearance = Appearance(appearance)
+        self.entityToken = parentComponent.entityToken + '/' + name
+        self.attributes = Attributes()
+        self.extraVertices = []
+        parentComponent.parentDesign._entities[self.entityToken] = self
+
+    @property
+    def volume(self):
+        return self.size[0] * self.size[1] * self.size[2]
+
+    @property
+    def area(self):
+        sx, sy, sz = self.size
+        return 2.0 * (sx * sy + sy * sz + sx * sz)
+
+    @property
+    def boundingBox(self):
+        ox, oy, oz = self.origin
+        sx, sy, sz = self.size
+        return BoundingBox3D(Point3D(ox, oy, oz), Point3D(ox + sx, oy + sy, oz + sz))
+
+    @property
+    def faces(self):
+        return SimCollection([None] * 6)
+
+    @property
+    def edges(self):
+        return SimCollection([None] * 12)
+
+    @property
+    def vertices(self):
+        ox, oy, oz = self.origin
+        sx, sy, sz = self.size
+        corners = [(x, y, z) for x in (0.0, sx) for y in (0.0, sy) for z in (0.0, sz)]
+
+        return SimCollection([BRepVertex(ox + x, oy + y, oz + z) for x, y, z in corners + list(self.extraVertices)])
+
+    @property
+    def physicalProperties(self):
+        return PhysicalProperties(self)
+
+    def getPhysicalProperties(self, accuracy=0):
+        return PhysicalProperties(self)
+
+    @property
+    def meshManager(self):
+        return MeshManager(self)
+
+    #
+    # vertices and outward facing triangles of the box. Each face is split
+    # into divisions x divisions quads, so finer tolerances create more
+    # triangles like in Fusion 360
+    #
+    def boxMesh(self, divisions=1):
+        ox, oy, oz = self.origin
+        sx, sy, sz = self.size
+
+        # corner and edge vectors of each face. The cross product of the edges
+        # points outwards
+        faces = [((ox, oy, oz), (0.0, sy, 0.0), (sx, 0.0, 0.0)),
+                 ((ox, oy, oz + sz), (sx, 0.0, 0.0), (0.0, sy, 0.0)),
+                 ((ox, oy, oz), (sx, 0.0, 0.0), (0.0, 0.0, sz)),
+                 ((ox, oy + sy, oz), (0.0, 0.0, sz), (sx, 0.0, 0.0)),
+                 ((ox, oy, oz), (0.0, 0.0, sz), (0.0, sy, 0.0)),
+                 ((ox + sx, oy, oz), (0.0, sy, 0.0), (0.0, 0.0, sz))]
+
+        nodes = []
+        normals = []
+        indices = []
+        for corner, u, v in faces:
+            normal = (u[1] * v[2] - u[2] * v[1], u[2] * v[0] - u[0] * v[2], u[0] * v[1] - u[1] * v[0])
+            length = (normal[0] ** 2 + normal[1] ** 2 + normal[2] ** 2) ** 0.5
+            normal = tuple(component / length for component in normal)
+
+            first = len(nodes) // 3
+            for i in range(divisions + 1):
+                for j in range(divisions + 1):
+                    for axis in range(3):
+                        nodes.append(corner[axis] + u[axis] * i / divisions + v[axis] * j / divisions)
+                    normals.extend(normal)
+
+            for i in range(divisions):
+                for j in range(divisions):
+                    a = first + i * (divisions + 1) + j
+                    b = a + divisions + 1
+                    indices.extend((a, b, b + 1, a, b + 1, a + 1))
+
+        return nodes, indices, normals
+
+
+#
+# mesh calculation of a body. Like in Fusion 360 the tolerance is given in cm
+# and the normal deviation in radians
+#
+class TriangleMeshQualityOptions(object):
+    LowQualityTriangleMesh = 8
+    NormalQualityTriangleMesh = 11
+    HighQualityTriangleMesh = 13
+    VeryHighQualityTriangleMesh = 15
+
+
+class TriangleMesh(SimObject):
+    def __init__(self, nodes, indices, normals):
+        self.nodeCoordinatesAsFloat = nodes
+        self.nodeCoordinatesAsDouble = nodes
+        self.nodeIndices = indices
+        self.normalVectorsAsFloat = normals
+        self.normalVectorsAsDouble = normals
+        self.nodeCount = len(nodes) // 3
+        self.triangleCount = len(indices) // 3
+
+
+class MeshCalculator(SimObject):
+    def __init__(self, body):
+        self._body = body
+        self.surfaceTolerance = 0.001016
+        self.maxNormalDeviation = 10.0 * 3.141592653589793 / 180.0
+        self.maxSideLength = 0.0
+        self.maxAspectRatio = 0.0
+
+    def setQuality(self, quality):
+        self.surfaceTolerance = {TriangleMeshQualityOptions.LowQualityTriangleMesh: 0.008069,
+                                 TriangleMeshQualityOptions.NormalQualityTriangleMesh: 0.003212,
+                                 TriangleMeshQualityOptions.HighQualityTriangleMesh: 0.001016,
+                                 TriangleMeshQualityOptions.VeryHighQualityTriangleMesh: 0.000508}[quality]
+        return True
+
+    def calculate(self):
+        return TriangleMesh(*self._body.boxMesh(getDivisions(self.surfaceTolerance)))
+
+
+class MeshManager(SimObject):
+    def __init__(self, body):
+        self._body = body
+
+    def createMeshCalculator(self):
+        return MeshCalculator(self._body)
+
+
+#
+# number of quads per face edge for a surface tolerance (cm)
+#
+def getDivisions(surfaceTolerance):
+    if surfaceTolerance <= 0.0:
+        return 1
+
+    return max(1, min(64, int(round(0.01 / surfaceTolerance))))
+
+
+class BRepBodies(SimCollection):
+    def add(self, body):
+        self._items.append(body)
+        return body
+
+
+#
+# native occurrence (the child of exactly one component)
+#
+class NativeOccurrence(object):
+    def __init__(self, parentComponent, component, index):
+        self.parentComponent = parentComponent
+        self.component = component
+        self.name = component.name + ':' + str(index)
+        self.isLightBulbOn = True
+        self.isReferencedComponent = False
+        self.transform = Matrix3D()
+
+
+#
+# occurrence seen through an assembly context. Like in Fusion, every access
+# creates a fresh wrapper, so occurrences must not be compared by identity.
+#
+class Occurrence(SimObject):
+    def __init__(self, native, assemblyContext):
+        self._native = native
+        self.assemblyContext = assemblyContext
+
+    def __eq__(self, other):
+        return isinstance(other, Occurrence) and self._native is other._native and self.assemblyContext == other.assemblyContext
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    __hash__ = None
+
+    @property
+    def component(self):
+        return self._native.component
+
+    @property
+    def name(self):
+        return self._native.name
+
+    # occurrences from the root down to this occurrence
+    def _path(self):
+        path = []
+        occurrence = self
+        while occurrence is not None:
+            path.append(occurrence)
+            occurrence = occurrence.assemblyContext
+        path.reverse()
+        return path
+
+    @property
+    def fullPathName(self):
+        return '+'.join(occurrence._native.name for occurrence in self._path())
+
+    @property
+    def entityToken(self):
+        return 'occ:' + self.fullPathName
+
+    @property
+    def isLightBulbOn(self):
+        return self._native.isLightBulbOn
+
+    @property
+    def isVisible(self):
+        return all(occurrence._native.isLightBulbOn for occurrence in self._path())
+
+    @property
+    def isReferencedComponent(self):
+        return self._native.isReferencedComponent
+
+    @property
+    def childOccurrences(self):
+        return SimCollection([Occurrence(native, self) for native in self._native.component._occurrences])
+
+    @property
+    def transform(self):
+        return self._native.transform.copy()
+
+    @property
+    def transform2(self):
+        matrix = Matrix3D()
+        for occurrence in reversed(self._path()):
+            matrix.transformBy(occurrence._native.transform)
+        return matrix
+
+    @property
+    def bRepBodies(self):
+        return self._native.component.bRepBodies
+
+
+class Component(SimObject):
+    def __init__(self, design, name):
+        self.parentDesign = design
+        self.name = name
+        self.entityToken = 'cmp:' + str(len(design._components)) + ':' + name
+        self.bRepBodies = BRepBodies()
+        self.attributes = Attributes()
+        self._occurrences = []
+
+    @property
+    def occurrences(self):
+        return SimCollection([Occurrence(native, None) for native in self._occurrences])
+
+    @property
+    def allOccurrences(self):
+        result = []
+        stack = [occurrence for occurrence in reversed(list(self.occurrences))]
+        while stack:
+            occurrence = stack.pop()
+            result.append(occurrence)
+            stack.extend(reversed(list(occurrence.childOccurrences)))
+        return SimCollection(result)
+
+    def occurrencesByComponent(self, component):
+        return SimCollection([occurrence for occurrence in self.occurrences if occurrence.component is component])
+
+    def allOccurrencesByComponent(self, component):
+        if self is not self.parentDesign.rootComponent:
+            return SimCollection([occurrence for occurrence in self.allOccurrences if occurrence.component is component])
+
+        # walk up from the instances of the component instead of expanding the
+        # whole tree. Each stack entry holds the natives below the component
+        result = []
+        stack = [(component, [])]
+        while stack:
+            current, chain = stack.pop()
+            for native in reversed(current._instances):
+                if native.parentComponent is self:
+                    occurrence = Occurrence(native, None)
+                    for child in chain:
+                        occurrence = Occurrence(child, occurrence)
+                    result.append(occurrence)
+                else:
+                    stack.append((native.parentComponent, [native] + chain))
+
+        return SimCollection(result)
+
+    def addOccurrence(self, component):
+        native = NativeOccurrence(self, component, sum(1 for n in component._instances) + 1)
+        component._instances.append(native)
+        self._occurrences.append(native)
+        return native
+
+    #
+    # simulated save copy as. Records the copy in the data folder
+    #
+    def saveCopyAs(self, name, dataFolder, description, tag):
+        dataFolder.savedNames.append(name)
+        return True
+
+    def addBody(self, name, size, origin=(0.0, 0.0, 0.0)):
+        return self.bRepBodies.add(BRepBody(name, self, size, origin))
+
+
+class MeshRefinementSettings(object):
+    MeshRefinementHigh = 0
+    MeshRefinementMedium = 1
+    MeshRefinementLow = 2
+    MeshRefinementCustom = 3
+
+
+#
+# export options. Files are written by ExportManager.execute
+#
+class ExportOptions(SimObject):
+    def __init__(self, geometry, filename, extension):
+        self.geometry = geometry
+        self.filename = filename
+        self.extension = extension
+
+
+class STLExportOptions(ExportOptions):
+    def __init__(self, geometry, filename):
+        super().__init__(geometry, filename, '.stl')
+        self.isBinaryFormat = True
+        self.meshRefinement = MeshRefinementSettings.MeshRefinementHigh
+        self.surfaceDeviation = 0.0
+        self.normalDeviation = 0.0
+        self.maximumEdgeLength = 0.0
+        self.aspectRatio = 0.0
+        self.setToPrintUtility = False
+        self.sendToPrintUtility = False
+
+
+class STEPExportOptions(ExportOptions):
+    def __init__(self, geometry, filename):
+        super().__init__(geometry, filename, '.step')
+
+
+#
+# export manager writing small but valid placeholder files
+#
+class ExportManager(SimObject):
+    def __init__(self, design):
+        self._design = design
+        self.executeCount = 0
+        self.executeOverhead = 0.0
+
+    def createSTLExportOptions(self, geometry, filename=''):
+        return STLExportOptions(geometry, filename)
+
+    def createSTEPExportOptions(self, filename, geometry=None):
+        return STEPExportOptions(geometry, filename)
+
+    def execute(self, exportOptions):
+        self.executeCount += 1
+
+        if self.executeOverhead:
+            time.sleep(self.executeOverhead)
+
+        fileName = exportOptions.filename
+        if not fileName.lower().endswith(exportOptions.extension):
+            fileName += exportOptions.extension
+
+        if isinstance(exportOptions, STLExportOptions):
+            bodies = geometryBodies(exportOptions.geometry)
+            writeSimStl(fileName, bodies, exportOptions.isBinaryFormat, getSurfaceTolerance(exportOptions))
+        else:
+            with open(fileName, 'w') as stepFile:
+                stepFile.write('ISO-10303-21;\n/* ' + exportOptions.geometry.name + ' */\nEND-ISO-10303-21;\n')
+
+        return True
+
+
+#
+# surface tolerance of STL export options. Refinements High (0), Medium (1)
+# and Low (2) use the presets of the STL export, Custom (3) its own value
+#
+def getSurfaceTolerance(exportOptions):
+    if exportOptions.meshRefinement in (0, 1, 2):
+        return (0.001016, 0.003212, 0.008069)[exportOptions.meshRefinement]
+
+    return exportOptions.surfaceDeviation
+
+
+#
+# bodies that belong to an export geometry (body, occurrence or component)
+#
+def geometryBodies(geometry):
+    if isinstance(geometry, BRepBody):
+        return [geometry]
+
+    result = []
+    for body in geometry.bRepBodies:
+        if body.isLightBulbOn:
+            result.append(body)
+    return result
+
+
+#
+# write the box meshes of bodies as one STL file
+#
+def writeSimStl(fileName, bodies, isBinary, surfaceTolerance):
+    triangles = []
+    for body in bodies:
+        nodes, indices, normals = body.boxMesh(getDivisions(surfaceTolerance))
+        for index in range(0, len(indices), 3):
+            triangles.append([nodes[indices[index + corner] * 3:indices[index + corner] * 3 + 3] for corner in range(3)])
+
+    if isBinary:
+        with open(fileName, 'wb') as stlFile:
+            stlFile.write(b'simulator'.ljust(80, b' '))
+            stlFile.write(struct.pack('<I', len(triangles)))
+            for triangle in triangles:
+                stlFile.write(struct.pack('<12fH', 0.0, 0.0, 0.0, *triangle[0], *triangle[1], *triangle[2], 0))
+    else:
+        with open(fileName, 'w') as stlFile:
+            stlFile.write('solid simulator\n')
+            for triangle in triangles:
+                stlFile.write('facet normal 0 0 0\nouter loop\n')
+                for vertex in triangle:
+                    stlFile.write('vertex %f %f %f\n' % tuple(vertex))
+                stlFile.write('endloop\nendfacet\n')
+            stlFile.write('endsolid simulator\n')
+
+
+#
+# timeline of a parametric design. Moving the marker or adding features
+# changes markerPosition and count
+#
+class Timeline(SimObject):
+    def __init__(self):
+        self.markerPosition = 0
+        self.count = 0
+
+
+class Design(SimObject):
+    def __init__(self, rootName='Root'):
+        self.productType = 'DesignProductType'
+        self.designType = DesignTypes.ParametricDesignType
+        self.timeline = Timeline()
+        self.parentDocument = None
+        self._components = []
+        self._entities = {}
+        self.rootComponent = self.addComponent(rootName)
+        self.exportManager = ExportManager(self)
+        self.fusionUnitsManager = UnitsManager()
+
+    @property
+    def allComponents(self):
+        return SimCollection(self._components)
+
+    def addComponent(self, name):
+        component = Component(self, name)
+        component._instances = []
+        self._components.append(component)
+        self._entities[component.entityToken] = component
+        return component
+
+    def findEntityByToken(self, entityToken):
+        entity = self._entities.get(entityToken)
+        return [entity] if entity is not None else []
+
+
+#
+# create a design containing a parameterised synthetic assembly.
+#
+#   depth               number of component levels below the root
+#   fanOut              child occurrences per assembly component
+#   reuse               probability that a child reuses an existing component of the same level
+#   linkedRatio         probability that a new component is a linked (referenced) component
+#   hiddenRatio         probability that an occurrence or body is hidden
+#   bodiesPerComponent  bodies per leaf component
+#   mixedRatio          probability that an assembly component holds bodies, too
+#   maxOccurrences      stop generating once this many occurrences exist
+#   duplicateRatio      probability that a body has the size of an existing body
+#
+def generateAssembly(depth=3, fanOut=4, reuse=0.0, linkedRatio=0.0, hiddenRatio=0.0, bodiesPerComponent=2,
+                     mixedRatio=0.0, maxOccurrences=100000, seed=0, rootName='Root v1', duplicateRatio=0.0):
+    generator = random.Random(seed)
+    design = Design(rootName)
+    state = {'occurrences': 0}
+    levelPool = {}
+    sizes = []
+
+    def addBodies(component, count):
+        for index in range(count):
+            if sizes and generator.random() < duplicateRatio:
+                size = generator.choice(sizes)
+            else:
+                size = (round(generator.uniform(0.5, 10.0), 3), round(generator.uniform(0.5, 10.0), 3), round(generator.uniform(0.5, 10.0), 3))
+                sizes.append(size)
+            body = component.addBody('Body' + str(index + 1), size)
+            if generator.random() < hiddenRatio:
+                body.isLightBulbOn = False
+
+    # expanded number of occurrences below a component
+    def expandedSize(component):
+        return sum(1 + expandedSize(native.component) for native in component._occurrences)
+
+    def build(parent, level, linked):
+        for index in range(fanOut):
+            if state['occurrences'] >= maxOccurrences:
+                return
+
+            pool = levelPool.setdefault((level, linked), [])
+            if pool and generator.random() < reuse:
+                component = generator.choice(pool)
+                subtreeSize = component._subtreeSize
+                if state['occurrences'] + 1 + subtreeSize > maxOccurrences:
+                    continue
+                native = parent.addOccurrence(component)
+                state['occurrences'] += 1 + subtreeSize
+            else:
+                component = design.addComponent('Part L' + str(level) + ' N' + str(len(design._components)) + ' v1')
+                component._isLinked = linked or generator.random() < linkedRatio
+                native = parent.addOccurrence(component)
+                state['occurrences'] += 1
+
+                if level < depth:
+                    build(component, level + 1, component._isLinked)
+                    if generator.random() < mixedRatio:
+                        addBodies(component, bodiesPerComponent)
+                else:
+                    addBodies(component, bodiesPerComponent)
+
+                component._subtreeSize = expandedSize(component)
+                pool.append(component)
+
+            native.isReferencedComponent = component._isLinked
+            native.transform.setCell(0, 3, float(index) * 20.0)
+            native.transform.setCell(1, 3, float(level) * 20.0)
+            if generator.random() < hiddenRatio:
+                native.isLightBulbOn = False
+
+    build(design.rootComponent, 1, False)
+
+    return design
+
+
+#
+# make a design the active document of the simulated application
+#
+def openDesign(design, name='Simulated design', dataFileId=None, versionNumber=1):
+    app = Application.get()
+
+    # unique id, so stored indexes of other runs are never reused
+    if dataFileId is None:
+        dataFileId = 'urn:sim:design:' + uuid.uuid4().hex
+
+    dataFile = DataFile(dataFileId, versionNumber, DataFolder('Simulated folder'))
+    document = Document(name, design, dataFile)
+    app.documents.append(document)
+    app.activateDocument(document)
+    return document
+
+
+def doEvents():
+    return True
+
+
+def terminate():
+    return True
+
+
+#
+# register the simulated modules as adsk, adsk.core, adsk.fusion and adsk.cam
+#
+def install():
+    if 'adsk' in sys.modules and getattr(sys.modules['adsk'], 'isSimulator', False):
+        return sys.modules['adsk']
+
+    this = sys.modules[__name__]
+
+    adsk = types.ModuleType('adsk')
+    adsk.isSimulator = True
+    adsk.doEvents = doEvents
+    adsk.terminate = terminate
+    adsk.autoTerminate = terminate
+
+    core = types.ModuleType('adsk.core')
+    for name in ('DialogResults', 'CommandTerminationReason', 'DropDownStyles', 'MessageBoxButtonTypes', 'MessageBoxIconTypes', 'Point3D',
+                 'BoundingBox3D', 'Matrix3D', 'ObjectCollection', 'CommandEventHandler', 'CommandCreatedEventHandler',
+                 'InputChangedEventHandler', 'HTMLEventHandler', 'UserInterfaceGeneralEventHandler',
+                 'ApplicationCommandEventHandler', 'DocumentEventHandler', 'CustomEventHandler', 'HTMLEventArgs', 'CustomEvent', 'CustomEventArgs',
+                 'CommandInputs', 'Command', 'Palette', 'BoolValueCommandInput', 'DistanceValueCommandInput',
+                 'FloatSliderCommandInput', 'FloatSpinnerCommandInput', 'IntegerSliderCommandInput',
+                 'IntegerSpinnerCommandInput', 'ValueCommandInput', 'SliderCommandInput', 'StringValueCommandInput',
+                 'ButtonRowCommandInput', 'DropDownCommandInput', 'RadioButtonGroupCommandInput',
+                 'SelectionCommandInput', 'UnitsManager', 'Application', 'UserInterface', 'FolderDialog', 'FileDialog', 'ProgressDialog',
+                 'DataFolder', 'DataFile', 'Document'):
+        setattr(core, name, getattr(this, name))
+
+    fusion = types.ModuleType('adsk.fusion')
+    for name in ('DesignTypes', 'Design', 'Component', 'Occurrence', 'BRepBody', 'BRepBodies', 'ExportManager',
+                 'STLExportOptions', 'STEPExportOptions', 'MeshRefinementSettings', 'Attributes', 'Attribute', 'PhysicalProperties', 'Timeline',
+                 'MeshManager', 'MeshCalculator', 'TriangleMesh', 'TriangleMeshQualityOptions'):
+        setattr(fusion, name, getattr(this, name))
+
+    # types only referenced in annotations of the Fusion 360 utilities
+    for name in ('ValueInput', 'Matrix2D'):
+        setattr(core, name, type(name, (SimObject,), {}))
+    for name in ('BRepFace', 'ConstructionPlane', 'ExtrudeFeature', 'FeatureOperations', 'Sketch', 'Sketches'):
+        setattr(fusion, name, type(name, (SimObject,), {}))
+
+    cam = types.ModuleType('adsk.cam')
+    cam.CAM = SimObject
+
+    adsk.core = core
+    adsk.fusion = fusion
+    adsk.cam = cam
+
+    sys.modules['adsk'] = adsk
+    sys.modules['adsk.core'] = core
+    sys.modules['adsk.fusion'] = fusion
+    sys.modules['adsk.cam'] = cam
+
+    return adsk
@@ -3,7 +3,23 @@ import adsk.fusion
 import traceback
 import os.path
 
-from .FilteredExportUtil import getComponents
+from .FilteredExportIndexStore import getAssemblyIndex
+from .FilteredExportFilter import parseComponentFilterExpression
+from .FilteredExportArchive import createSink
+from .FilteredExportArchive import S_SINK_FOLDER
+from .FilteredExportArchive import S_SINK_ZIP_DEFLATE
+from .FilteredExportArchive import S_SINK_ZIP_LZMA
+from .FilteredExportFileNames import getCleanName
+from .FilteredExportProgress import getFileSize
+from .FilteredExportPostProcess import postProcessFile
+from .FilteredExportSession import ExportSession
+from .FilteredExportJournal import openJournal
+from .FilteredExportJournal import getInputFingerprint
+from .FilteredExportInstrumentation import apiProfiler
+from .FilteredExportInstrumentation import S_PROFILE_PHASE_EXPORT
+from .FilteredExportUtil import normaliseSelection
+from .FilteredExportUtil import S_COMPONENT_KIND_LEAF
+from .FilteredExportUtil import S_COMPONENT_KIND_MIXED
 from .FilteredExportUtil import renderResultMessage
 from .FilteredExportUtil import FilteredExportResult
 
@@ -16,6 +32,18 @@ S_CPY_FILTER_TYPE_LOOKUP = 'cpyDropDownFilterType'
 S_CPY_FILTER_TYPET_TOP_LEVEL = 'Top level'
 S_CPY_FILTER_TYPE_LEAVES = 'Leaves'
 S_CPY_FILTER_TYPE_MIXED_LEAVES = 'Mixed leaves'
+S_CPY_FILTER_EXPRESSION = 'cpyFilterExpression'
+S_CPY_SINK_LOOKUP = 'cpyDropDownSink'
+S_CPY_GZIP_FILES = 'cpyGzipFiles'
+S_CPY_POST_PROCESS_THREADS = 'cpyPostProcessThreads'
+S_CPY_WRITE_CHECKSUMS = 'cpyWriteChecksums'
+S_CPY_STEP_EXTENSION = '.step'
+S_CPY_RESUME_LAST_EXPORT = 'cpyResumeLastExport'
+S_CPY_PROGRESS_TITLE = 'Export STEP/STP'
+S_CPY_JOURNAL_NAME = 'STEP'
+
+# inputs that don't change the written files, a resumed export may use other values
+S_CPY_JOURNAL_IGNORED_INPUTS = (S_CPY_RESUME_LAST_EXPORT, S_CPY_POST_PROCESS_THREADS, S_CPY_WRITE_CHECKSUMS)
 
 #
 # get path via dialog
@@ -41,69 +69,146 @@ def getPath(appObjects):
     # return formated path
     return exportPath
 
+#
+# get the sink of the export: files in the export folder, gzip compressed
+# files or one zip archive named after the design. Exports into a folder are
+# journaled, a resumed export skips the components that the journal of the
+# last export records as finished. Returns the sink and the journal
+#
+def getSink(appObjects, input_values):
+    sinkType = input_values.get(S_CPY_SINK_LOOKUP, S_SINK_FOLDER)
+    resumeExport = input_values.get(S_CPY_RESUME_LAST_EXPORT, False)
+    if resumeExport and sinkType != S_SINK_FOLDER:
+        raise ValueError('Only exports into a folder can be resumed.')
+
+    exportPath = getPath(appObjects)
+
+    # the components are found during the export, so no names are planned
+    journal = None
+    if sinkType == S_SINK_FOLDER:
+        journal = openJournal(exportPath, S_CPY_JOURNAL_NAME, S_CPY_PROGRESS_TITLE, getInputFingerprint(input_values, S_CPY_JOURNAL_IGNORED_INPUTS), None, resumeExport)
+
+    exportSink = createSink(sinkType, exportPath, getCleanName(appObjects.design.rootComponent.name, True, True) + '_STEP', \
+                            input_values.get(S_CPY_GZIP_FILES, False))
+
+    return exportSink, journal
+
+#
+# True if the component was exported by the export that is resumed. The
+# journal of a STEP export has no fingerprints of the geometry
+#
+def isResumed(journal, exportSink, entry):
+    if journal is None:
+        return False
+
+    return journal.isFinished(entry.name, entry.name + S_CPY_STEP_EXTENSION + exportSink.fileSuffix, None, journal.settingsFingerprint)
+
+#
+# export a component as STEP file into the sink of the session. The wall
+# time and the size of the file are recorded by the progress dialog. Hashing
+# and moving the file are left to the post processing pool, the journal
+# records the file when it is in place
+#
+def exportComponentAsStep(appObjects, session, input_values, entry):
+    exportSink = session.exportSink
+    progress = session.progress
+    journal = session.journal
+
+    progress.start(entry.name)
+
+    fullFileName = os.path.join(exportSink.outputPath, entry.name)
+    outputFileName = entry.name + S_CPY_STEP_EXTENSION
+    exportSink.prepare(outputFileName)
+
+    stpExportOptions = appObjects.export_manager.createSTEPExportOptions(fullFileName, entry.component)
+    appObjects.export_manager.execute(stpExportOptions)
+
+    byteCount = getFileSize(fullFileName + S_CPY_STEP_EXTENSION)
+    if journal is not None:
+        journal.addPending(entry.name, outputFileName, None, journal.settingsFingerprint)
+
+    session.postProcessPool.submit(postProcessFile, exportSink, exportSink.release(outputFileName), outputFileName, False, \
+                                    input_values.get(S_CPY_WRITE_CHECKSUMS, False))
+
+    progress.finish(byteCount)
+
+
+#
+# session of an export. The number of components is unknown until the
+# traversal is done. The post processing hashes and moves the written files
+# while the next component is exported
+#
+def getSession(appObjects, exportSink, journal, input_values):
+    return ExportSession(appObjects.ui, S_CPY_PROGRESS_TITLE, exportSink, journal, input_values.get(S_CPY_POST_PROCESS_THREADS, 0))
+
+
 #
 # Export top level or selected components
 #
-def exportTopLevelMode(appObjects, input_values):
+def exportTopLevelMode(appObjects, input_values, traversalCache):
     # get root component
     rootComponent = appObjects.design.rootComponent
 
-    # get component list
-    components = []
-
-    # selection available?
-    if S_CPY_SELECTION_LOOKUP in input_values:
-        if input_values[S_CPY_SELECTION_LOOKUP][0] == rootComponent:
-            # process all components
-            components = getComponents(rootComponent.occurrences, components, False, False)
-        else:
-            # process selcted components
-            components = getComponents(input_values[S_CPY_SELECTION_LOOKUP], components, False, False)
-    else:
-        # process all components
-        components = getComponents(rootComponent.occurrences, components, False, False)
+    # process selected components without duplicates. All components are
+    # processed if nothing or the root component is selected
+    selection = normaliseSelection(input_values.get(S_CPY_SELECTION_LOOKUP), rootComponent, False)
+
+    # components that don't match the filter are skipped during the traversal
+    componentFilter = parseComponentFilterExpression(input_values.get(S_CPY_FILTER_EXPRESSION))
+
+    # get index of the components. Entries are created while they are processed
+    assemblyIndex = getAssemblyIndex(traversalCache, appObjects.document, appObjects.design, selection, False, False, False, componentFilter)
 
-     # list of processed file names
+    # list of processed file names
     processedComponents = []
 
     # get target folder
 #    documentFolder = appObjects.document.dataFile.parentFolder
 
     # get export path
-    exportPath = getPath(appObjects)
+    exportSink, journal = getSink(appObjects, input_values)
+    resumedComponents = []
+
+    # export each component as soon as the traversal returns it
+    with getSession(appObjects, exportSink, journal, input_values) as session:
+        progress = session.progress
 
-    # export all components
-    for component in components:
-        fullFileName = os.path.join(exportPath, component.name) 
+        for entry in assemblyIndex:
+            if progress.wasCancelled:
+                break
 
-        stpExportOptions = appObjects.export_manager.createSTEPExportOptions(fullFileName, component)       
-        appObjects.export_manager.execute(stpExportOptions)
-        
-        processedComponents.append(component.name)
+            if isResumed(journal, exportSink, entry):
+                resumedComponents.append(entry.name)
+                progress.advance()
+                continue
+
+            exportComponentAsStep(appObjects, session, input_values, entry)
+            
+            processedComponents.append(entry.name)
 
     # return resulting lists
-    return FilteredExportResult(exportPath, processedComponents, '')
+    exportResult = FilteredExportResult(exportSink.location, processedComponents, '', assemblyIndex.statistics)
+    exportResult.resumedNames = resumedComponents
+
+    return session.addResults(exportResult)
 
 
 #
 # Export top level or selected components
 #
-def exportLeaveMode(appObjects, input_values):
-    # get root component
-    rootComponent = appObjects.design.rootComponent
+def exportLeaveMode(appObjects, input_values, traversalCache):
+    # reduce selection to disjoint subtrees. All components are processed if
+    # nothing or the root component is selected
+    selection = normaliseSelection(input_values.get(S_CPY_SELECTION_LOOKUP), appObjects.design.rootComponent, True)
 
-    # get component list
-    components = []
+    # components that don't match the filter are skipped during the traversal
+    componentFilter = parseComponentFilterExpression(input_values.get(S_CPY_FILTER_EXPRESSION))
 
-    # selection available?
-    if S_CPY_SELECTION_LOOKUP in input_values:
-        # process selcted components
-        components = getComponents(input_values[S_CPY_SELECTION_LOOKUP], components, True, False)
-    else:
-        # process all components
-        components = getComponents(rootComponent.occurrences, components, True, False)
+    # get index of the components. Entries are created while they are processed.
+    # The files are named after the components, so the order doesn't matter
+    assemblyIndex = getAssemblyIndex(traversalCache, appObjects.document, appObjects.design, selection, True, False, False, componentFilter, False)
 
-     # list of processed and skipped file names
+    # list of processed and skipped file names
     processedComponents = []
     skippedComponents = []
 
@@ -111,62 +216,83 @@ def exportLeaveMode(appObjects, input_values):
 #    documentFolder = appObjects.document.dataFile.parentFolder
 
     # get export path
-    exportPath = getPath(appObjects)
-
-    for component in components:
-        if component.bRepBodies and not component.occurrences:
-            # export leave component (contains bodies but no other components)
-            fullFileName = os.path.join(exportPath, component.name) 
-    
-            stpExportOptions = appObjects.export_manager.createSTEPExportOptions(fullFileName, component)       
-            appObjects.export_manager.execute(stpExportOptions)
-            
-            processedComponents.append(component.name)
-        elif component.bRepBodies and component.occurrencesByComponent:
-            # skip export because this component contains bodies and components
-            skippedComponents.append(component.name)
+    exportSink, journal = getSink(appObjects, input_values)
+    resumedComponents = []
+
+    with getSession(appObjects, exportSink, journal, input_values) as session:
+        progress = session.progress
+
+        for entry in assemblyIndex:
+            if progress.wasCancelled:
+                break
+
+            if entry.kind == S_COMPONENT_KIND_LEAF:
+                if isResumed(journal, exportSink, entry):
+                    resumedComponents.append(entry.name)
+                    progress.advance()
+                    continue
+
+                # export leave component (contains bodies but no other components)
+                exportComponentAsStep(appObjects, session, input_values, entry)
+                
+                processedComponents.append(entry.name)
+            elif entry.kind == S_COMPONENT_KIND_MIXED:
+                # skip export because this component contains bodies and components
+                skippedComponents.append(entry.name)
 
     # return resulting lists
-    return FilteredExportResult(exportPath, processedComponents, skippedComponents)
+    exportResult = FilteredExportResult(exportSink.location, processedComponents, skippedComponents, assemblyIndex.statistics)
+    exportResult.resumedNames = resumedComponents
+
+    return session.addResults(exportResult)
 
 
 #
 # Export top mixed level or selected components
 #
-def exportMixedLeaveMode(appObjects, input_values):
-    # get root component
-    rootComponent = appObjects.design.rootComponent
+def exportMixedLeaveMode(appObjects, input_values, traversalCache):
+    # reduce selection to disjoint subtrees. All components are processed if
+    # nothing or the root component is selected
+    selection = normaliseSelection(input_values.get(S_CPY_SELECTION_LOOKUP), appObjects.design.rootComponent, True)
 
-    # get component list
-    components = []
+    # components that don't match the filter are skipped during the traversal
+    componentFilter = parseComponentFilterExpression(input_values.get(S_CPY_FILTER_EXPRESSION))
 
-    # selection available?
-    if S_CPY_SELECTION_LOOKUP in input_values:
-        # process selcted components
-        components = getComponents(input_values[S_CPY_SELECTION_LOOKUP], components, True, False)
-    else:
-        # process all components
-        components = getComponents(rootComponent.occurrences, components, True, False)
+    # get index of the components. Entries are created while they are processed.
+    # The files are named after the components, so the order doesn't matter
+    assemblyIndex = getAssemblyIndex(traversalCache, appObjects.document, appObjects.design, selection, True, False, False, componentFilter, False)
 
-     # list of processed and skipped file names
+    # list of processed and skipped file names
     processedComponents = []
 
     # get target folder
 #    documentFolder = appObjects.document.dataFile.parentFolder
 
     # get export path
-    exportPath = getPath(appObjects)
+    exportSink, journal = getSink(appObjects, input_values)
+    resumedComponents = []
     
-    for component in components:
-        fullFileName = os.path.join(exportPath, component.name) 
+    with getSession(appObjects, exportSink, journal, input_values) as session:
+        progress = session.progress
 
-        stpExportOptions = appObjects.export_manager.createSTEPExportOptions(fullFileName, component)       
-        appObjects.export_manager.execute(stpExportOptions)
-        
-        processedComponents.append(component.name)
+        for entry in assemblyIndex:
+            if progress.wasCancelled:
+                break
+
+            if isResumed(journal, exportSink, entry):
+                resumedComponents.append(entry.name)
+                progress.advance()
+                continue
+
+            exportComponentAsStep(appObjects, session, input_values, entry)
+            
+            processedComponents.append(entry.name)
 
     # return resulting lists
-    return FilteredExportResult(exportPath, processedComponents, '')
+    exportResult = FilteredExportResult(exportSink.location, processedComponents, '', assemblyIndex.statistics)
+    exportResult.resumedNames = resumedComponents
+
+    return session.addResults(exportResult)
 
 
 #
@@ -176,7 +302,10 @@ class FilteredExportStp(Fusion360CommandBase):
     # Run when the user presses OK
     def on_execute(self, command: adsk.core.Command, inputs: adsk.core.CommandInputs, args, input_values):
         try:
-            appObjects = AppObjects()
+            # API calls are only counted if profiling is enabled
+            apiProfiler.start()
+            appObjects = apiProfiler.wrapAppObjects(AppObjects())
+            input_values = apiProfiler.wrapInputValues(input_values)
 
             # no design? Nothing to do
             if not appObjects.design:
@@ -185,16 +314,23 @@ class FilteredExportStp(Fusion360CommandBase):
             # export components
             exportResult = None
 
-            if input_values[S_CPY_FILTER_TYPE_LOOKUP] == S_CPY_FILTER_TYPET_TOP_LEVEL:
-                # export top level mode
-                exportResult = exportTopLevelMode(appObjects, input_values)
-            elif input_values[S_CPY_FILTER_TYPE_LOOKUP] == S_CPY_FILTER_TYPE_LEAVES:
-                # export leave mode
-                exportResult = exportLeaveMode(appObjects, input_values)
-            elif input_values[S_CPY_FILTER_TYPE_LOOKUP] == S_CPY_FILTER_TYPE_MIXED_LEAVES:
-                # export mixed leave mode
-                exportResult = exportMixedLeaveMode(appObjects, input_values)
+            with apiProfiler.phase(S_PROFILE_PHASE_EXPORT):
+                if input_values[S_CPY_FILTER_TYPE_LOOKUP] == S_CPY_FILTER_TYPET_TOP_LEVEL:
+                    # export top level mode
+                    exportResult = exportTopLevelMode(appObjects, input_values, self.traversal_cache)
+                elif input_values[S_CPY_FILTER_TYPE_LOOKUP] == S_CPY_FILTER_TYPE_LEAVES:
+                    # export leave mode
+                    exportResult = exportLeaveMode(appObjects, input_values, self.traversal_cache)
+                elif input_values[S_CPY_FILTER_TYPE_LOOKUP] == S_CPY_FILTER_TYPE_MIXED_LEAVES:
+                    # export mixed leave mode
+                    exportResult = exportMixedLeaveMode(appObjects, input_values, self.traversal_cache)
             
+            if self.debug:
+                exportResult.cacheReport = self.traversal_cache.render()
+
+            if apiProfiler.enabled:
+                exportResult.profileReport = apiProfiler.writeReport(self.cmd_id)
+
             # show result list
             appObjects.ui.messageBox(renderResultMessage(exportResult))
 
@@ -220,6 +356,28 @@ class FilteredExportStp(Fusion360CommandBase):
         dropDownCpyFilterTypeItems.add(S_CPY_FILTER_TYPE_LEAVES, False, '')
         dropDownCpyFilterTypeItems.add(S_CPY_FILTER_TYPE_MIXED_LEAVES, False, '')
 
+        # Filter expression, e.g. !name:Screw*;path:Hardware
+        inputs.addStringValueInput(S_CPY_FILTER_EXPRESSION, 'Filter', '')
+
+        # Sink (files in the export folder or one zip archive)
+        dropDownCpySink = inputs.addDropDownCommandInput(S_CPY_SINK_LOOKUP, 'Output sink', adsk.core.DropDownStyles.LabeledIconDropDownStyle);
+        dropDownCpySinkItems = dropDownCpySink.listItems
+        dropDownCpySinkItems.add(S_SINK_FOLDER, True, '')
+        dropDownCpySinkItems.add(S_SINK_ZIP_DEFLATE, False, '')
+        dropDownCpySinkItems.add(S_SINK_ZIP_LZMA, False, '')
+
+        # gzip compress each file
+        inputs.addBoolValueInput(S_CPY_GZIP_FILES, 'Gzip files', True, '', False).value = False
+
+        # Threads that hash and compress the written files (0 = API thread)
+        inputs.addIntegerSpinnerCommandInput(S_CPY_POST_PROCESS_THREADS, 'Post processing threads', 0, 8, 1, 0)
+
+        # List the SHA-256 checksum of each written file in the result
+        inputs.addBoolValueInput(S_CPY_WRITE_CHECKSUMS, 'Checksums', True, '', False).value = False
+
+        # Skip the components that the last, unfinished export into the same folder wrote
+        inputs.addBoolValueInput(S_CPY_RESUME_LAST_EXPORT, 'Resume last export', True, '', False).value = False
+
     # Run whenever a user makes any change to a value or selection in the addin UI
     def on_preview(self, command: adsk.core.Command, inputs: adsk.core.CommandInputs, args, input_values):
         pass
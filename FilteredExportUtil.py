@@ -1,43 +1,508 @@
 import adsk.core
 import adsk.fusion
+import math
+import itertools
+
+from .FilteredExportFilter import S_FILTER_INCLUDE
+from .FilteredExportFilter import S_FILTER_DESCEND
+from .FilteredExportFilter import S_FILTER_PRUNE
+from .FilteredExportInstrumentation import apiProfiler
+from .FilteredExportInstrumentation import S_PROFILE_PHASE_TRAVERSAL
+
+# Faked statics for easy code maintainance
+S_COMPONENT_KIND_EMPTY = 'empty'
+S_COMPONENT_KIND_LEAF = 'leaf'
+S_COMPONENT_KIND_ASSEMBLY = 'assembly'
+S_COMPONENT_KIND_MIXED = 'mixed'
+
+# the flat enumeration needs fewer API calls than the tree walk on wide and
+# flat designs, but more on deep designs. Designs with a few components are
+# always walked
+S_FLAT_ENUMERATION_MAX_DEPTH = 4.0
+S_FLAT_ENUMERATION_MIN_COMPONENTS = 100
+
+#
+# returns a hashable identity for a component. Every API access creates a new
+# python wrapper, so the wrappers themselves can't be used as dictionary keys
+#
+def getComponentKey(component):
+    return component.entityToken
+
+
+#
+# counts the occurences skipped during a traversal grouped by the reason
+#
+class TraversalStatistics(object):
+    def __init__(self):
+        self.visited = 0
+        self.skipped = {}
+
+    # count a skipped occurence
+    def skip(self, reason):
+        self.skipped[reason] = self.skipped.get(reason, 0) + 1
+
+    @property
+    def skippedCount(self):
+        return sum(self.skipped.values())
+
+    # render reasons and counts like 'hidden: 3, duplicate: 12'
+    def render(self):
+        return ', '.join(reason + ': ' + str(self.skipped[reason]) for reason in sorted(self.skipped))
+
+
+#
+# walk the occurence tree below a list of occurences and yield each unique
+# component as (component, fullPathName, depth) record. The walk uses an
+# explicit stack of iterators, so deeply nested assemblies don't hit the
+# recursion limit and the caller can start working on the first component
+# before the walk is finished. Occurences that are skipped are counted in
+# statistics together with the reason. An optional component filter (see
+# FilterExpression) prunes excluded subtrees before they are visited.
+#
+def iterComponents(occurences, includeSubComponents, filterLinkedComponents, statistics=None, knownComponents=None, componentFilter=None):
+    if statistics is None:
+        statistics = TraversalStatistics()
+
+    # keys of all components that were already returned
+    if knownComponents is None:
+        knownComponents = set()
+
+    # decisions of filters without path terms are the same for each occurence
+    # of a component, so components that are only descended are walked once
+    decisions = {} if componentFilter and not componentFilter.hasPathTerms else None
+
+    stack = [(iter(occurences), 0)]
+
+    while stack:
+        occurenceIterator, depth = stack[-1]
+
+        try:
+            occurence = next(occurenceIterator)
+        except StopIteration:
+            stack.pop()
+            continue
+
+        statistics.visited += 1
+
+        try:
+            # skip linked components if requested
+            if filterLinkedComponents and occurence.isReferencedComponent:
+                statistics.skip('linked')
+                continue
+
+            # skip hidden components including their children
+            if not occurence.isLightBulbOn:
+                statistics.skip('hidden')
+                continue
+
+            component = occurence.component
+            if not component:
+                statistics.skip('no component')
+                continue
+
+            # skip excluded subtrees without visiting them
+            componentKey = getComponentKey(component)
+            fullPathName = None
+            decision = S_FILTER_INCLUDE
+            if componentFilter:
+                if decisions is None:
+                    fullPathName = occurence.fullPathName
+                    decision = componentFilter.checkOccurrence(component, fullPathName)
+                else:
+                    decision = decisions.get(componentKey)
+                    if decision is None:
+                        decision = componentFilter.checkOccurrence(component, None)
+                        decisions[componentKey] = decision
+
+                if decision == S_FILTER_PRUNE:
+                    statistics.skip('filtered')
+                    continue
+
+            # each component is processed only once. Its children were
+            # processed with the first occurence, too
+            if componentKey in knownComponents:
+                statistics.skip('duplicate')
+                continue
+
+            if decision == S_FILTER_INCLUDE or decisions is not None:
+                knownComponents.add(componentKey)
+
+            if fullPathName is None:
+                fullPathName = occurence.fullPathName
+
+            childOccurrences = occurence.childOccurrences if includeSubComponents else None
+        except Exception as e:
+            statistics.skip('failed (' + type(e).__name__ + ')')
+            continue
+
+        # components that don't match the filter are not returned, but their
+        # sub components might match
+        if decision == S_FILTER_DESCEND:
+            statistics.skip('not matching')
+        else:
+            yield (component, fullPathName, depth)
+
+        # process the sub components before the next sibling
+        if childOccurrences:
+            stack.append((iter(childOccurrences), depth + 1))
+
+
+#
+# check a single occurence with the rules of iterComponents. The occurence
+# and its parents must be visible (and not linked if linked components are
+# filtered), no parent may be pruned by the component filter and the filter
+# must include the occurence itself. Used for occurences the traversal didn't
+# return, because their component was found before
+#
+def isOccurrenceIncluded(occurence, filterLinkedComponents, componentFilter=None):
+    if componentFilter is not None and not componentFilter.hasComponentTerms:
+        componentFilter = None
+
+    # parents before children, like the traversal
+    path = []
+    while occurence is not None:
+        path.append(occurence)
+        occurence = occurence.assemblyContext
+
+    decision = S_FILTER_INCLUDE
+    for occurence in reversed(path):
+        if filterLinkedComponents and occurence.isReferencedComponent:
+            return False
+
+        if not occurence.isLightBulbOn:
+            return False
+
+        if componentFilter:
+            decision = componentFilter.checkOccurrence(occurence.component, occurence.fullPathName)
+            if decision == S_FILTER_PRUNE:
+                return False
+
+    return decision == S_FILTER_INCLUDE
+
+
+#
+# yield each unique component of a design as (component, fullPathName, depth)
+# record without walking the occurence tree. The loop iterates once over the
+# unique components of the design and looks for the first occurence that is
+# visible (and not linked if linked components are filtered). Components
+# without such an occurence are counted in statistics. The components are
+# returned in design order, not in tree order.
+#
+def iterAllComponents(design, filterLinkedComponents, statistics=None):
+    if statistics is None:
+        statistics = TraversalStatistics()
+
+    rootComponent = design.rootComponent
+    rootComponentKey = getComponentKey(rootComponent)
+
+    for component in design.allComponents:
+        # the root component is not an occurence
+        if getComponentKey(component) == rootComponentKey:
+            continue
+
+        try:
+            fullPathName = None
+            reason = 'no occurrence'
+
+            for occurence in rootComponent.allOccurrencesByComponent(component):
+                statistics.visited += 1
+
+                # occurences below a linked occurence are linked, too
+                if filterLinkedComponents and occurence.isReferencedComponent:
+                    reason = 'linked'
+                    continue
+
+                # isVisible respects the light bulbs of all parent occurences
+                if not occurence.isVisible:
+                    reason = 'hidden'
+                    continue
+
+                fullPathName = occurence.fullPathName
+                break
+        except Exception as e:
+            statistics.skip('failed (' + type(e).__name__ + ')')
+            continue
+
+        if fullPathName is None:
+            statistics.skip(reason)
+            continue
+
+        yield (component, fullPathName, fullPathName.count('+'))
+
+
+#
+# True if the flat enumeration is expected to need fewer API calls than the
+# tree walk. The depth of the design is estimated from the number of unique
+# components and the number of top level occurences, which costs two calls
+#
+def isFlatEnumerationPreferred(design):
+    componentCount = design.allComponents.count
+    width = design.rootComponent.occurrences.count
+
+    if componentCount < S_FLAT_ENUMERATION_MIN_COMPONENTS or width < 2:
+        return False
+
+    return math.log(componentCount) / math.log(width) <= S_FLAT_ENUMERATION_MAX_DEPTH
+
+
+#
+# reduce a selection to a minimal list of disjoint subtrees before it is
+# traversed. Returns None if the root component is selected, because the
+# whole design is processed in this case. If sub components are included,
+# occurences below another selected occurence are removed, because their
+# subtree is processed with the parent anyway. Otherwise only occurences
+# that were selected twice are removed. The order of the selection is kept.
+#
+def normaliseSelection(selection, rootComponent, includeSubComponents):
+    if not selection:
+        return None
+
+    # the root component contains everything else
+    for entity in selection:
+        if entity == rootComponent:
+            return None
+
+    fullPathNames = [entity.fullPathName for entity in selection]
+
+    # process parents before children. A path is part of another subtree if
+    # one of its prefixes was selected, too
+    selectedPaths = set()
+    for fullPathName in sorted(set(fullPathNames), key=lambda path: path.count('+')):
+        if includeSubComponents:
+            pathElements = fullPathName.split('+')
+            isNested = False
+            for length in range(1, len(pathElements)):
+                if '+'.join(pathElements[:length]) in selectedPaths:
+                    isNested = True
+                    break
+
+            if isNested:
+                continue
+
+        selectedPaths.add(fullPathName)
+
+    # keep first occurence of each remaining path in selection order
+    normalisedSelection = []
+    for entity, fullPathName in zip(selection, fullPathNames):
+        if fullPathName in selectedPaths:
+            normalisedSelection.append(entity)
+            selectedPaths.remove(fullPathName)
+
+    return normalisedSelection
+
+
+#
+# yield the unique components of a selection. If selection is None, all
+# components of the design are processed. The occurence tree is walked, so
+# the components and with them the file names come in tree order. Callers
+# whose results don't depend on the order (keepTreeOrder False) get the flat
+# enumeration over design.allComponents for whole designs with sub
+# components and without component filter, if the design is wide and flat
+#
+def iterSelectedComponents(design, selection, includeSubComponents, filterLinkedComponents, statistics=None, componentFilter=None, keepTreeOrder=True):
+    if componentFilter is not None and not componentFilter.hasComponentTerms:
+        componentFilter = None
+
+    if selection is None:
+        if not keepTreeOrder and includeSubComponents and componentFilter is None and isFlatEnumerationPreferred(design):
+            return iterAllComponents(design, filterLinkedComponents, statistics)
+
+        selection = design.rootComponent.occurrences
+
+    return iterComponents(selection, includeSubComponents, filterLinkedComponents, statistics, None, componentFilter)
+
+
+#
+# get all child occurences (components) recursively from a list of occurences
+# and return a unique list of [component, fullPathName] pairs.
+#
+def getComponentPaths(occurences, componentPaths, includeSubComponents, filterLinkedComponents, statistics=None):
+    # keys of all components that are already in the list
+    knownComponents = set()
+    for componentPath in componentPaths:
+        knownComponents.add(getComponentKey(componentPath[0]))
+
+    for component, fullPathName, depth in iterComponents(occurences, includeSubComponents, filterLinkedComponents, statistics, knownComponents):
+        componentPaths.append([component, fullPathName])
+
+    return componentPaths
+
 
 #
 # get all child occurences (components) recursively from a component
 # and return a unique list of components
 #
-def getComponents(occurences, components, includeSubComponents, filterLinkedComponents):
-    # iterate over all occurences
-    for occurence in occurences:
-        if (filterLinkedComponents == True and occurence.isReferencedComponent == False) or filterLinkedComponents == False: 
-
-            try:           
-                # if the component is not hidden process the component
-                if occurence.isLightBulbOn:
-                    # validate if the current component was already processed
-                    componentFound = False
-                    component = adsk.fusion.Component.cast(None)
-        
-                    # itereate over unique component list and compoare current
-                    # occource with element of unique component list
-                    for component in components:
-                        if component == occurence.component:
-                            # component exisits in filted list. No need to process
-                            # the full list
-                            componentFound = True
-                            break
-        
-                    # if occurence not found in unique list of components, add this
-                    # occurence because it's new
-                    if not componentFound and occurence.component:
-                        components.append(occurence.component)
-        
-                    # if this occurence has sub components process them, too
-                    if occurence.childOccurrences and not componentFound and includeSubComponents:
-                        components = getComponents(occurence.childOccurrences, components, includeSubComponents, filterLinkedComponents)
-            except:
-                pass
-            
-    return components
+def getComponents(occurences, components, includeSubComponents, filterLinkedComponents, statistics=None):
+    componentPaths = []
+    for component in components:
+        componentPaths.append([component, ''])
+
+    componentPaths = getComponentPaths(occurences, componentPaths, includeSubComponents, filterLinkedComponents, statistics)
+
+    return [componentPath[0] for componentPath in componentPaths]
+
+
+#
+# snapshot of a component taken while the assembly index is built. Holds
+# everything the commands need, so they don't have to call the API again.
+#
+class AssemblyIndexEntry(object):
+    def __init__(self, component, name, fullPathName, depth, kind, bodyCount, visibleBodies, occurrenceCount, isLinked):
+        self.component = component
+        self.name = name
+        self.fullPathName = fullPathName
+        self.depth = depth
+        self.kind = kind
+        self.bodyCount = bodyCount
+        self.visibleBodies = visibleBodies
+        self.occurrenceCount = occurrenceCount
+        self.isLinked = isLinked
+
+
+#
+# index of all unique components of an export. The entries are created while
+# the traversal runs, so the first entries can be processed before the walk
+# is finished. Iterating the index a second time replays the stored entries
+# without calling the API again.
+#
+class AssemblyIndex(object):
+    def __init__(self, design, records, statistics, entries=None):
+        self.rootComponent = design.rootComponent
+        self.entries = entries if entries is not None else []
+        self.statistics = statistics
+        self.failed = False
+        self._records = iter(records) if records is not None else None
+
+        # called with the index after the last entry was created
+        self.onComplete = None
+
+    @property
+    def isComplete(self):
+        return self._records is None
+
+    def __iter__(self):
+        position = 0
+
+        while True:
+            # replay entries that were already created
+            if position < len(self.entries):
+                yield self.entries[position]
+                position += 1
+                continue
+
+            if self._records is None:
+                return
+
+            # create next entry from the traversal. A traversal that failed
+            # can't be continued, so the index is marked as failed. API calls
+            # of the traversal are profiled apart from the calls of the caller
+            with apiProfiler.phase(S_PROFILE_PHASE_TRAVERSAL):
+                try:
+                    record = next(self._records, None)
+                except:
+                    self._records = None
+                    self.failed = True
+                    raise
+
+                if record is not None:
+                    self.entries.append(self.createEntry(*record))
+
+            if record is None:
+                self._records = None
+
+                if self.onComplete:
+                    self.onComplete(self)
+
+                return
+
+    # read all properties of a component in one go
+    def createEntry(self, component, fullPathName, depth):
+        bodyCount = 0
+        visibleBodies = []
+        for body in component.bRepBodies:
+            bodyCount += 1
+            if body.isLightBulbOn:
+                visibleBodies.append(body)
+
+        hasSubComponents = component.occurrences.count > 0
+
+        if bodyCount > 0 and hasSubComponents:
+            kind = S_COMPONENT_KIND_MIXED
+        elif bodyCount > 0:
+            kind = S_COMPONENT_KIND_LEAF
+        elif hasSubComponents:
+            kind = S_COMPONENT_KIND_ASSEMBLY
+        else:
+            kind = S_COMPONENT_KIND_EMPTY
+
+        # the root component has no occurence
+        occurrenceCount = 1
+        isLinked = False
+        if getComponentKey(component) != getComponentKey(self.rootComponent):
+            occurences = self.rootComponent.allOccurrencesByComponent(component)
+            occurrenceCount = occurences.count
+            isLinked = occurrenceCount > 0 and occurences.item(0).isReferencedComponent
+
+        return AssemblyIndexEntry(component, component.name, fullPathName, depth, kind, bodyCount, visibleBodies, occurrenceCount, isLinked)
+
+    # read the complete traversal
+    def complete(self):
+        for entry in self:
+            pass
+
+        return self
+
+
+#
+# records of the assembly index for a selection (see iterSelectedComponents).
+# The root component can be added as last record, because it can contain
+# bodies, too
+#
+def iterAssemblyRecords(design, selection, includeSubComponents, filterLinkedComponents, includeRootComponent, componentFilter, keepTreeOrder, statistics):
+    records = iterSelectedComponents(design, selection, includeSubComponents, filterLinkedComponents, statistics, componentFilter, keepTreeOrder)
+
+    # the root component is filtered like an occurence
+    if includeRootComponent and componentFilter is not None and componentFilter.hasComponentTerms:
+        includeRootComponent = componentFilter.checkOccurrence(design.rootComponent, design.rootComponent.name) == S_FILTER_INCLUDE
+
+    if includeRootComponent:
+        records = itertools.chain(records, [(design.rootComponent, design.rootComponent.name, 0)])
+
+    return records
+
+
+#
+# build the assembly index for a selection, see iterAssemblyRecords
+#
+def buildAssemblyIndex(design, selection, includeSubComponents, filterLinkedComponents, includeRootComponent=False, componentFilter=None, keepTreeOrder=True):
+    statistics = TraversalStatistics()
+    records = iterAssemblyRecords(design, selection, includeSubComponents, filterLinkedComponents, includeRootComponent, componentFilter, keepTreeOrder, \
+                                  statistics)
+
+    return AssemblyIndex(design, records, statistics)
+
+
+#
+# returns a hashable key for a selection
+#
+def getSelectionKey(selection):
+    if selection is None:
+        return None
+
+    # occurences are identified by their path, components by their name
+    return tuple(getattr(entity, 'fullPathName', None) or entity.name for entity in selection)
+
+
+#
+# returns a stamp that changes if the timeline marker is moved or features
+# are added or removed. Direct designs don't have a timeline
+#
+def getDesignStamp(design):
+    if design.designType != adsk.fusion.DesignTypes.ParametricDesignType:
+        return None
+
+    timeline = design.timeline
+    return (timeline.markerPosition, timeline.count)
 
 
 #
@@ -52,21 +517,85 @@ def renderResultMessage(exportResult):
     for export in exportResult.exportNames:
         resultMessage += '   ' + export + '\n'
     
-    if len(exportResult.skippedNames) == 0:
-        return resultMessage
-        
-    # render list of processed files   
-    resultMessage += 'Skipped:\n'
-    for export in exportResult.skippedNames:
-        resultMessage += '   ' + export + '\n'
-       
+    # render list of files that were unchanged and not exported again
+    if exportResult.unchangedNames:
+        resultMessage += 'Unchanged:\n'
+        for export in exportResult.unchangedNames:
+            resultMessage += '   ' + export + '\n'
+
+    # render list of files that were finished by the resumed export
+    if exportResult.resumedNames:
+        resultMessage += 'Resumed:\n'
+        for export in exportResult.resumedNames:
+            resultMessage += '   ' + export + '\n'
+
+    # render list of skipped files
+    if len(exportResult.skippedNames) > 0:
+        resultMessage += 'Skipped:\n'
+        for export in exportResult.skippedNames:
+            resultMessage += '   ' + export + '\n'
+
+    # render number of skipped occurences and why they were skipped
+    if exportResult.traversalStatistics and exportResult.traversalStatistics.skippedCount > 0:
+        resultMessage += 'Skipped occurrences: ' + str(exportResult.traversalStatistics.skippedCount) + '\n'
+        resultMessage += '   ' + exportResult.traversalStatistics.render() + '\n'
+
+    # render timing of the items and the slowest items
+    if exportResult.progressReport:
+        resultMessage += 'Progress:\n   ' + exportResult.progressReport + '\n'
+
+    # render estimated triangles and file sizes (preflight or triangle budget only)
+    if exportResult.estimationReport:
+        resultMessage += 'Estimation:\n   ' + exportResult.estimationReport + '\n'
+
+    # render checks and statistics of the written meshes (validation only)
+    if exportResult.validationResults:
+        resultMessage += 'Validation:\n'
+        for validation in exportResult.validationResults:
+            resultMessage += '   ' + validation.render() + '\n'
+
+    # render checksums of the written files (checksums only)
+    checksumResults = [result for result in exportResult.postProcessResults if result.checksum is not None]
+    if checksumResults:
+        resultMessage += 'Checksums (SHA-256):\n'
+        for result in checksumResults:
+            resultMessage += '   ' + result.checksum + '  ' + result.fileName + '\n'
+
+    # render number of files and wait time of the post processing threads (threads only)
+    if exportResult.postProcessReport:
+        resultMessage += 'Post processing:\n   ' + exportResult.postProcessReport + '\n'
+
+    # render files that were created from identical bodies (duplicate detection only)
+    if exportResult.duplicateReport:
+        resultMessage += 'Duplicates:\n   ' + exportResult.duplicateReport + '\n'
+
+    # render hit and miss counters of the traversal cache (debug only)
+    if exportResult.cacheReport:
+        resultMessage += 'Traversal cache:\n   ' + exportResult.cacheReport + '\n'
+
+    # render file name of the API profile (profile only)
+    if exportResult.profileReport:
+        resultMessage += 'API profile:\n   ' + exportResult.profileReport + '\n'
+
     return resultMessage
 
+
 #
 # result set from a stl export
 #
 class FilteredExportResult(object):
-    def __init__(self, exportPath, exportNames, skippedNames):
+    def __init__(self, exportPath, exportNames, skippedNames, traversalStatistics=None, unchangedNames=None):
         self.exportPath = exportPath
         self.exportNames = exportNames
         self.skippedNames = skippedNames
+        self.unchangedNames = unchangedNames if unchangedNames is not None else []
+        self.resumedNames = []
+        self.traversalStatistics = traversalStatistics
+        self.progressReport = None
+        self.estimationReport = None
+        self.duplicateReport = None
+        self.validationResults = []
+        self.postProcessResults = []
+        self.postProcessReport = None
+        self.cacheReport = None
+        self.profileReport = None
@@ -0,0 +1,256 @@
+import os
+import sys
+
+# NumPy is needed to validate the meshes
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Faked statics for easy code maintainance
+S_VALIDATION_BINARY_HEADER_SIZE = 84
+S_VALIDATION_TEXT_START = b'solid'
+
+# binary STL record: normal, three vertices and attribute byte count
+S_VALIDATION_RECORD_TYPE = [('normal', '<f4', (3,)), ('corners', '<f4', (3, 3)), ('attribute', '<u2')]
+
+# triangles with an area below this fraction of the squared bounding box
+# diagonal are degenerate
+S_VALIDATION_AREA_TOLERANCE = 1e-14
+
+#
+# True if mesh validation is available
+#
+def isValidationAvailable():
+    return numpy is not None
+
+
+#
+# corners (triangles, 3, 3) and stored normals (triangles, 3) of a binary STL.
+# The records are memory mapped, so the file isn't read into memory at once
+#
+def readBinaryStl(fileName, triangleCount):
+    if triangleCount == 0:
+        return numpy.zeros((0, 3, 3), dtype=numpy.float32), numpy.zeros((0, 3), dtype=numpy.float32)
+
+    records = numpy.memmap(fileName, dtype=S_VALIDATION_RECORD_TYPE, mode='r', offset=S_VALIDATION_BINARY_HEADER_SIZE, shape=(triangleCount,))
+
+    return records['corners'], records['normal']
+
+
+#
+# corners (triangles, 3, 3) and stored normals (triangles, 3) of a text STL
+#
+def readTextStl(fileName):
+    corners = []
+    normals = []
+
+    with open(fileName, 'r', encoding='ascii', errors='replace') as stlFile:
+        for line in stlFile:
+            values = line.split()
+            if not values:
+                continue
+
+            if values[0] == 'vertex':
+                corners.append(values[1:4])
+            elif values[0] == 'facet':
+                normals.append(values[2:5])
+
+    corners = numpy.array(corners, dtype=numpy.float32).reshape(-1, 3, 3)
+    normals = numpy.array(normals, dtype=numpy.float32).reshape(-1, 3)
+
+    if len(corners) != len(normals):
+        raise ValueError('Number of facets and vertices differs.')
+
+    return corners, normals
+
+
+#
+# read the triangles of a binary or text STL. A binary file is recognised by
+# its size, because binary files may start with 'solid', too
+#
+def readStl(fileName):
+    fileSize = os.path.getsize(fileName)
+
+    if fileSize >= S_VALIDATION_BINARY_HEADER_SIZE:
+        triangleCount = int(numpy.fromfile(fileName, dtype='<u4', count=1, offset=80)[0])
+        if S_VALIDATION_BINARY_HEADER_SIZE + triangleCount * numpy.dtype(S_VALIDATION_RECORD_TYPE).itemsize == fileSize:
+            return readBinaryStl(fileName, triangleCount)
+
+    with open(fileName, 'rb') as stlFile:
+        isText = stlFile.read(len(S_VALIDATION_TEXT_START)) == S_VALIDATION_TEXT_START
+
+    if not isText:
+        raise ValueError('Size of binary file doesn\'t match the number of triangles.')
+
+    return readTextStl(fileName)
+
+
+#
+# unique keys and how often each key occurs
+#
+def countKeys(keys):
+    if len(keys) == 0:
+        return keys, keys
+
+    return numpy.unique(keys, return_counts=True)
+
+
+#
+# checks and statistics of one STL file
+#
+class MeshValidation(object):
+    def __init__(self, fileName):
+        self.fileName = fileName
+        self.triangleCount = 0
+        self.minPoint = None
+        self.maxPoint = None
+        self.degenerateCount = 0
+        self.flippedNormalCount = 0
+        self.openEdgeCount = 0
+        self.nonManifoldEdgeCount = 0
+        self.inconsistentEdgeCount = 0
+        self.isWatertight = False
+        self.error = None
+
+    #
+    # bad facets are degenerate triangles and triangles whose stored normal
+    # points against their winding
+    #
+    @property
+    def badFacetCount(self):
+        return self.degenerateCount + self.flippedNormalCount
+
+    @property
+    def isValid(self):
+        return self.error is None and self.isWatertight and self.badFacetCount == 0 and self.inconsistentEdgeCount == 0
+
+    #
+    # validate the triangles. Corners are welded by their exact coordinates,
+    # because all writers repeat the same float for a shared vertex
+    #
+    def validate(self, corners, normals):
+        self.triangleCount = len(corners)
+        if self.triangleCount == 0:
+            return self
+
+        # adding 0.0 turns -0.0 into 0.0, so both are welded
+        points = numpy.asarray(corners, dtype=numpy.float32).reshape(-1, 3) + numpy.float32(0.0)
+        self.minPoint = tuple(float(value) for value in points.min(axis=0))
+        self.maxPoint = tuple(float(value) for value in points.max(axis=0))
+
+        uniquePoints, pointIndexes = numpy.unique(points, axis=0, return_inverse=True)
+        triangles = pointIndexes.reshape(-1, 3).astype(numpy.int64)
+
+        # area and winding normal of each triangle
+        vertices = points.astype(numpy.float64).reshape(-1, 3, 3)
+        crossProducts = numpy.cross(vertices[:, 1] - vertices[:, 0], vertices[:, 2] - vertices[:, 0])
+        doubleAreas = numpy.sqrt((crossProducts * crossProducts).sum(axis=1))
+
+        diagonal = numpy.subtract(self.maxPoint, self.minPoint)
+        areaTolerance = float((diagonal * diagonal).sum()) * S_VALIDATION_AREA_TOLERANCE
+
+        isCollapsed = (triangles[:, 0] == triangles[:, 1]) | (triangles[:, 1] == triangles[:, 2]) | (triangles[:, 0] == triangles[:, 2])
+        isDegenerate = isCollapsed | (doubleAreas <= areaTolerance)
+        self.degenerateCount = int(isDegenerate.sum())
+
+        # a stored normal of 0, 0, 0 is allowed and means 'compute it yourself'
+        storedNormals = numpy.asarray(normals, dtype=numpy.float64)
+        isFlipped = ((storedNormals * crossProducts).sum(axis=1) < 0.0) & ~isDegenerate
+        self.flippedNormalCount = int(isFlipped.sum())
+
+        # edges of the triangles that didn't collapse. Each edge of a closed
+        # mesh is used by two triangles, once in each direction
+        triangles = triangles[~isCollapsed]
+        startPoints = triangles.reshape(-1)
+        endPoints = triangles[:, [1, 2, 0]].reshape(-1)
+        pointCount = len(uniquePoints)
+
+        directedKeys = startPoints * pointCount + endPoints
+        undirectedKeys = numpy.minimum(startPoints, endPoints) * pointCount + numpy.maximum(startPoints, endPoints)
+
+        edgeKeys, edgeCounts = countKeys(undirectedKeys)
+        self.openEdgeCount = int((edgeCounts == 1).sum())
+        self.nonManifoldEdgeCount = int((edgeCounts > 2).sum())
+
+        # an edge that is used twice in the same direction joins triangles
+        # with inconsistent winding
+        directedEdgeKeys, directedEdgeCounts = countKeys(directedKeys)
+        self.inconsistentEdgeCount = int((directedEdgeCounts > 1).sum())
+
+        self.isWatertight = self.openEdgeCount == 0 and self.nonManifoldEdgeCount == 0
+
+        return self
+
+    #
+    # result of a file with another name, e.g. a link to a validated file
+    #
+    def copy(self, fileName):
+        result = MeshValidation(fileName)
+        result.__dict__.update({key: value for key, value in self.__dict__.items() if key != 'fileName'})
+
+        return result
+
+    def render(self):
+        if self.error is not None:
+            return self.fileName + ': ' + self.error
+
+        text = self.fileName + ': ' + str(self.triangleCount) + ' triangles'
+
+        if self.triangleCount > 0:
+            text += ', box ' + ' x '.join('{:.3f}'.format(high - low) for low, high in zip(self.minPoint, self.maxPoint))
+
+        text += ', watertight' if self.isWatertight else ', not watertight'
+
+        if self.badFacetCount > 0:
+            text += ', bad facets ' + str(self.badFacetCount) + ' (degenerate ' + str(self.degenerateCount) + \
+                    ', flipped normals ' + str(self.flippedNormalCount) + ')'
+
+        if self.openEdgeCount > 0:
+            text += ', open edges ' + str(self.openEdgeCount)
+
+        if self.nonManifoldEdgeCount > 0:
+            text += ', non manifold edges ' + str(self.nonManifoldEdgeCount)
+
+        if self.inconsistentEdgeCount > 0:
+            text += ', inconsistent winding ' + str(self.inconsistentEdgeCount)
+
+        return text
+
+
+#
+# validate a binary or text STL file. Errors while reading the file are part
+# of the result
+#
+def validateStl(fullFileName, fileName=None):
+    result = MeshValidation(fileName if fileName is not None else os.path.basename(fullFileName))
+
+    try:
+        corners, normals = readStl(fullFileName)
+        result.validate(corners, normals)
+
+        # release the memory map, the file may be moved or deleted next
+        del corners, normals
+    except (OSError, ValueError) as e:
+        result.error = str(e)
+
+    return result
+
+
+#
+# validate STL files without Fusion 360, e.g. python FilteredExportValidation.py *.stl
+#
+def main():
+    if numpy is None:
+        print('Mesh validation needs NumPy.')
+        return 2
+
+    results = [validateStl(fileName) for fileName in sys.argv[1:]]
+    for result in results:
+        print(result.render())
+
+    return 0 if all(result.isValid for result in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
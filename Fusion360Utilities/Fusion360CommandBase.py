@@ -153,6 +153,130 @@ def get_controls(command_in_nav_bar, workspace, toolbar_panel_id, ui):
         raise RuntimeError
 
 
+# Returns a key that identifies a document within the session
+def document_key(document):
+    if document.dataFile is not None:
+        return document.dataFile.id
+
+    return document.name
+
+
+# Per document cache for traversal results that are shared by all commands of the add-in.
+# Entries of a document are dropped when the document is activated or saved and after any
+# command that modified the design. An optional stamp (e.g. the timeline marker position)
+# is compared on every lookup, so changes without a command event are detected, too.
+class TraversalCache:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+        # document key -> {cache key: (stamp, value)}
+        self.entries = {}
+
+        # commands that never modify a design (e.g. the export commands of this add-in)
+        self.ignored_command_ids = set()
+
+        self.handlers = []
+
+    def start(self):
+        if self.handlers:
+            return
+
+        app = adsk.core.Application.cast(adsk.core.Application.get())
+
+        on_document_changed = TraversalCacheDocumentHandler(self)
+        app.documentActivated.add(on_document_changed)
+        app.documentSaved.add(on_document_changed)
+        app.documentClosed.add(on_document_changed)
+        self.handlers.append(on_document_changed)
+
+        on_command_terminated = TraversalCacheCommandHandler(self)
+        app.userInterface.commandTerminated.add(on_command_terminated)
+        self.handlers.append(on_command_terminated)
+
+    def stop(self):
+        if not self.handlers:
+            return
+
+        app = adsk.core.Application.cast(adsk.core.Application.get())
+
+        app.documentActivated.remove(self.handlers[0])
+        app.documentSaved.remove(self.handlers[0])
+        app.documentClosed.remove(self.handlers[0])
+        app.userInterface.commandTerminated.remove(self.handlers[1])
+
+        self.handlers = []
+        self.clear()
+
+    def ignore_command(self, cmd_id):
+        self.ignored_command_ids.add(cmd_id)
+
+    def get(self, document, key, stamp=None):
+        document_entries = self.entries.get(document_key(document), {})
+        entry = document_entries.get(key)
+
+        if entry is None or entry[0] != stamp:
+            document_entries.pop(key, None)
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return entry[1]
+
+    def put(self, document, key, value, stamp=None):
+        self.entries.setdefault(document_key(document), {})[key] = (stamp, value)
+
+    def invalidate(self, document):
+        if self.entries.pop(document_key(document), None) is not None:
+            self.invalidations += 1
+
+    def clear(self):
+        self.entries = {}
+
+    def render(self):
+        return 'hits: {}, misses: {}, invalidations: {}'.format(self.hits, self.misses, self.invalidations)
+
+
+# Drops the cached traversal results of an activated, saved or closed document
+class TraversalCacheDocumentHandler(adsk.core.DocumentEventHandler):
+    def __init__(self, cache):
+        super().__init__()
+        self.cache_ = cache
+
+    def notify(self, args):
+        try:
+            if args.document:
+                self.cache_.invalidate(args.document)
+        except:
+            self.cache_.clear()
+
+
+# Drops the cached traversal results of the active document after a command was completed
+class TraversalCacheCommandHandler(adsk.core.ApplicationCommandEventHandler):
+    def __init__(self, cache):
+        super().__init__()
+        self.cache_ = cache
+
+    def notify(self, args):
+        try:
+            if args.commandId in self.cache_.ignored_command_ids:
+                return
+
+            if args.terminationReason != adsk.core.CommandTerminationReason.CompletedTerminationReason:
+                return
+
+            app = adsk.core.Application.cast(adsk.core.Application.get())
+            if app.activeDocument:
+                self.cache_.invalidate(app.activeDocument)
+        except:
+            self.cache_.clear()
+
+
+# traversal cache shared by all commands
+traversal_cache = TraversalCache()
+
+
 # Base Class for creating Fusion 360 Commands
 class Fusion360CommandBase:
     def __init__(self, cmd_def, debug):
@@ -178,6 +302,9 @@ class Fusion360CommandBase:
 
         self.debug = debug
 
+        # traversal results shared by all commands
+        self.traversal_cache = traversal_cache
+
         # global set of event handlers to keep them referenced for the duration of the command
         self.handlers = []
 
@@ -209,6 +336,9 @@ class Fusion360CommandBase:
 
         try:
 
+            self.traversal_cache.start()
+            self.traversal_cache.ignore_command(self.cmd_id)
+
             cmd_definitions = ui.commandDefinitions
 
             controls_to_add_to = get_controls(self.command_in_nav_bar, self.workspace, self.toolbar_panel_id, ui)
@@ -262,6 +392,8 @@ class Fusion360CommandBase:
 
         try:
 
+            self.traversal_cache.stop()
+
             controls_to_delete_from = get_controls(self.command_in_nav_bar, self.workspace, self.toolbar_panel_id, ui)
 
             # If it is in a drop down
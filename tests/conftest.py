@@ -0,0 +1,107 @@
+import os
+import sys
+
+import pytest
+
+# the add-in is loaded as package on top of the simulated adsk modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import FilteredExportSimulator
+
+from FilteredExportBenchmark import loadAddIn
+
+
+@pytest.fixture(scope='session')
+def addIn():
+    return loadAddIn()
+
+
+@pytest.fixture
+def simulator():
+    return FilteredExportSimulator
+
+
+# inputs of the STL export with the defaults of the dialog
+@pytest.fixture
+def stlValues():
+    return {
+        'stlDropDownStlFormat': 'Binary',
+        'stlDropDownStlRefinement': 'Low',
+        'stlSurfaceDeviation': 0.001016,
+        'stlNormalDeviation': 10.0,
+        'stlExportFilterLinkedComponents': False,
+        'stlExportAddRefinmentNameToName': False,
+        'stlExportAddRootNameToFilename': True,
+        'stlExportAddComponentNameToFilename': True,
+        'stlDropDownExportComponentNameType': 'Last From Path',
+        'stlExportFileRemoveVersionTagFromNames': True,
+        'stlExportFileRemoveSpacesFromNames': True
+    }
+
+
+#
+# run the STL export of the active design into a folder. Returns the last
+# message, None while an export runs in the background
+#
+@pytest.fixture
+def runStlExport(addIn):
+    def run(input_values, exportPath):
+        stl = addIn('FilteredExportAsStlCommand')
+
+        userInterface = FilteredExportSimulator.Application.get().userInterface
+        userInterface.dialogFolder = str(exportPath)
+        userInterface.messages.clear()
+
+        command = stl.FilteredExportAsStlCommand({'cmd_id': 'cmdID_testStl'}, False)
+        command.on_execute(None, None, None, input_values)
+
+        return userInterface.messages[-1] if userInterface.messages else None
+
+    return run
+
+
+# inputs of the STEP export
+@pytest.fixture
+def stepValues():
+    return {
+        'cpySelection': None,
+        'cpyDropDownFilterType': 'Top level',
+        'cpyFilterExpression': '',
+        'cpyDropDownSink': 'Folder',
+        'cpyGzipFiles': False,
+        'cpyPostProcessThreads': 0,
+        'cpyWriteChecksums': False,
+        'cpyResumeLastExport': False
+    }
+
+
+#
+# run the STEP export into a folder and return its result message
+#
+@pytest.fixture
+def runStepExport(addIn):
+    def run(input_values, exportPath):
+        stp = addIn('FilteredExportStp')
+
+        userInterface = FilteredExportSimulator.Application.get().userInterface
+        userInterface.dialogFolder = str(exportPath)
+        userInterface.messages.clear()
+
+        command = stp.FilteredExportStp({'cmd_id': 'cmdID_testStep'}, False)
+        command.on_execute(None, None, None, dict(input_values))
+
+        return userInterface.messages[-1]
+
+    return run
+
+
+#
+# stored indexes are written into the user profile, so each test gets its own
+#
+@pytest.fixture(autouse=True)
+def userProfile(tmp_path, monkeypatch):
+    profileFolder = tmp_path / 'profile'
+    profileFolder.mkdir()
+    monkeypatch.setenv('HOME', str(profileFolder))
+
+    return profileFolder
@@ -0,0 +1,122 @@
+import os
+import zipfile
+
+import pytest
+
+
+#
+# Root
+#   Hardware:1      Screw:1, Screw:2
+#   Frame:1         Screw:3
+#   Frame:2         Screw:3 (Frame:2 is linked)
+#
+@pytest.fixture
+def design(simulator):
+    design = simulator.Design('Root v1')
+    rootComponent = design.rootComponent
+
+    hardware = design.addComponent('Hardware')
+    frame = design.addComponent('Frame')
+    screw = design.addComponent('Screw')
+    screw.addBody('Body1', (0.3, 0.3, 2.0))
+    frame.addBody('Body1', (10.0, 1.0, 1.0))
+
+    hardware.addOccurrence(screw)
+    hardware.addOccurrence(screw)
+    frame.addOccurrence(screw)
+    rootComponent.addOccurrence(hardware)
+    rootComponent.addOccurrence(frame)
+    rootComponent.addOccurrence(frame).isReferencedComponent = True
+
+    return design
+
+
+def getScrewPaths(addIn, design, filterLinkedComponents, filterText):
+    threeMf = addIn('FilteredExport3mf')
+    componentFilter = addIn('FilteredExportFilter').parseFilterExpression(filterText)
+    rootComponent = design.rootComponent
+    screw = [component for component in design.allComponents if component.name == 'Screw'][0]
+
+    transforms = threeMf.getOccurrenceTransforms(screw, rootComponent, None, filterLinkedComponents, componentFilter)
+    paths = [occurrence.fullPathName for occurrence in rootComponent.allOccurrencesByComponent(screw)]
+
+    # the transforms are returned in the order of the occurrences
+    return len(transforms), paths
+
+
+@pytest.mark.parametrize('filterLinkedComponents, filterText, placementCount', [
+    (False, '', 4),
+    (False, '!path:Hardware', 2),
+    (True, '', 3),
+    (True, '!path:Hardware', 1),
+    (False, 'path:Frame', 2),
+    (False, '!name:Frame', 2)
+])
+def testPlacementsFollowTheFilters(addIn, design, filterLinkedComponents, filterText, placementCount):
+    count, paths = getScrewPaths(addIn, design, filterLinkedComponents, filterText)
+
+    assert len(paths) == 4
+    assert count == placementCount
+
+
+#
+# occurrences the traversal would include if components weren't deduplicated
+#
+def getIncludedPaths(occurrences, filterLinkedComponents, componentFilter, includedPaths):
+    for occurrence in occurrences:
+        if filterLinkedComponents and occurrence.isReferencedComponent:
+            continue
+
+        if not occurrence.isLightBulbOn:
+            continue
+
+        decision = componentFilter.checkOccurrence(occurrence.component, occurrence.fullPathName) if componentFilter else 'include'
+        if decision == 'prune':
+            continue
+
+        if decision == 'include':
+            includedPaths.setdefault(occurrence.component.entityToken, []).append(occurrence.fullPathName)
+
+        getIncludedPaths(occurrence.childOccurrences, filterLinkedComponents, componentFilter, includedPaths)
+
+    return includedPaths
+
+
+@pytest.mark.parametrize('filterLinkedComponents', [True, False])
+@pytest.mark.parametrize('filterText', ['', '!path:Part L1 N1 v1', '!name:Part L2 N1*', 'path:Part L1 N1*'])
+def testPlacementsMatchFullWalk(addIn, simulator, filterLinkedComponents, filterText):
+    threeMf = addIn('FilteredExport3mf')
+    filterModule = addIn('FilteredExportFilter')
+    componentFilter = filterModule.parseFilterExpression(filterText)
+    assert filterModule.S_FILTER_INCLUDE == 'include' and filterModule.S_FILTER_PRUNE == 'prune'
+
+    design = simulator.generateAssembly(depth=3, fanOut=4, reuse=0.6, linkedRatio=0.2, hiddenRatio=0.1, seed=7)
+    rootComponent = design.rootComponent
+    includedPaths = getIncludedPaths(rootComponent.occurrences, filterLinkedComponents, componentFilter, {})
+
+    for component in design.allComponents:
+        if component == rootComponent:
+            continue
+
+        transforms = threeMf.getOccurrenceTransforms(component, rootComponent, None, filterLinkedComponents, componentFilter)
+        assert len(transforms) == len(includedPaths.get(component.entityToken, []))
+
+
+@pytest.mark.parametrize('filterLinkedComponents, filterText, itemCount', [
+    (False, '', 6),
+    (False, '!path:Hardware', 4),
+    (True, '', 4)
+])
+def testExcludedInstancesAreNotPlaced(addIn, simulator, design, stlValues, runStlExport, tmp_path, filterLinkedComponents, filterText, itemCount):
+    simulator.openDesign(design)
+
+    stlValues['stlDropDownStlFormat'] = '3MF'
+    stlValues['stlExportFilterLinkedComponents'] = filterLinkedComponents
+    stlValues['stlFilterExpression'] = filterText
+    assert runStlExport(stlValues, tmp_path).startswith('Path:')
+
+    with zipfile.ZipFile(os.path.join(str(tmp_path), 'Root.3mf')) as threeMfFile:
+        model = threeMfFile.read('3D/3dmodel.model').decode('utf-8')
+
+    # screws and frames
+    assert model.count('<item ') == itemCount
@@ -0,0 +1,84 @@
+import os
+import gzip
+import zipfile
+
+import pytest
+
+
+def testStagedSinkCantBeCreated(addIn, tmp_path):
+    archive = addIn('FilteredExportArchive')
+
+    with pytest.raises(TypeError):
+        archive.StagedSink(str(tmp_path))
+
+
+@pytest.mark.parametrize('sinkType, gzipFiles', [
+    ('Folder', True),
+    ('Zip (deflate)', False),
+    ('Zip (deflate)', True),
+    ('Zip (LZMA)', False)
+])
+def testStagedFilesAreStored(addIn, tmp_path, sinkType, gzipFiles):
+    archive = addIn('FilteredExportArchive')
+    exportPath = tmp_path / 'export'
+    exportPath.mkdir()
+    exportSink = archive.createSink(sinkType, str(exportPath), 'Root', gzipFiles)
+
+    # one file is collected when the sink is closed, one is released and committed
+    for fileName in ('collected.stl', 'released.stl'):
+        exportSink.prepare(fileName)
+        with open(os.path.join(exportSink.outputPath, fileName), 'wb') as stlFile:
+            stlFile.write(fileName.encode('utf-8'))
+
+    exportSink.commit(exportSink.release('released.stl'), 'released.stl')
+    exportSink.close()
+
+    if exportSink.isArchive:
+        with zipfile.ZipFile(str(exportPath / 'Root.zip')) as zipFile:
+            contents = {name: zipFile.read(name) for name in zipFile.namelist()}
+    else:
+        contents = {name: open(str(exportPath / name), 'rb').read() for name in os.listdir(str(exportPath))}
+
+    if gzipFiles:
+        contents = {name[:-3]: gzip.decompress(content) for name, content in contents.items()}
+
+    assert contents == {'collected.stl': b'collected.stl', 'released.stl': b'released.stl'}
+    assert not os.path.exists(exportSink.outputPath)
+
+
+#
+# export into a folder whose files are hard linked to files outside of it,
+# e.g. by 'Export duplicates once' or a backup. The export replaces the
+# files instead of writing through the links
+#
+@pytest.mark.parametrize('command, extension', [
+    ('STL', '.stl'),
+    ('3MF', '.3mf'),
+    ('STEP', '.step')
+])
+def testLinkedFilesAreReplaced(addIn, simulator, stlValues, runStlExport, stepValues, runStepExport, tmp_path, command, extension):
+    simulator.openDesign(simulator.generateAssembly(depth=2, fanOut=2, seed=18))
+    exportPath = tmp_path / 'export'
+    exportPath.mkdir()
+    linkPath = tmp_path / 'links'
+    linkPath.mkdir()
+
+    if command == 'STEP':
+        runExport = lambda: runStepExport(stepValues, exportPath)
+    else:
+        stlValues['stlDropDownStlFormat'] = 'Binary' if command == 'STL' else '3MF'
+        runExport = lambda: runStlExport(stlValues, exportPath)
+
+    assert runExport().startswith('Path:')
+
+    fileNames = sorted(fileName for fileName in os.listdir(str(exportPath)) if fileName.endswith(extension))
+    assert fileNames
+    for fileName in fileNames:
+        os.link(str(exportPath / fileName), str(linkPath / fileName))
+        (linkPath / fileName).write_bytes(b'linked')
+
+    assert runExport().startswith('Path:')
+
+    for fileName in fileNames:
+        assert (linkPath / fileName).read_bytes() == b'linked'
+        assert (exportPath / fileName).read_bytes() != b'linked'
@@ -0,0 +1,52 @@
+import struct
+
+import pytest
+
+
+@pytest.fixture
+def appObjects(addIn, simulator):
+    design = simulator.Design('Root v1')
+    design.rootComponent.addBody('Body1', (1.0, 2.0, 3.0))
+    simulator.openDesign(design)
+
+    return addIn('Fusion360Utilities.Fusion360Utilities').AppObjects()
+
+
+def getTriangleCount(fileName):
+    with open(fileName, 'rb') as stlFile:
+        stlFile.seek(80)
+        return struct.unpack('<I', stlFile.read(4))[0]
+
+
+#
+# the simulator splits each of the 6 faces of a box into divisions x divisions
+# quads, so the triangle count shows the surface deviation that was used
+#
+@pytest.mark.parametrize('refinement, surfaceDeviation', [
+    ('High', 0.001016),
+    ('Medium', 0.003212),
+    ('Low', 0.008069),
+    ('Ultra', 0.000508),
+    ('Custom', 0.0025)
+])
+def testExportManagerUsesDeviationsOfRefinement(addIn, simulator, appObjects, tmp_path, refinement, surfaceDeviation):
+    stl = addIn('FilteredExportAsStlCommand')
+    body = appObjects.design.rootComponent.bRepBodies.item(0)
+    input_values = {stl.S_STL_SURFACE_DEVIATION: 0.0025, stl.S_STL_NORMAL_DEVIATION: 20.0}
+
+    fileName = str(tmp_path / 'body')
+    stl.exportStlWithExportManager(body, fileName, True, refinement, input_values, appObjects)
+
+    divisions = simulator.getDivisions(surfaceDeviation)
+    assert getTriangleCount(fileName + '.stl') == 12 * divisions * divisions
+
+
+def testExportManagerUsesMeshDeviation(addIn, simulator, appObjects, tmp_path):
+    stl = addIn('FilteredExportAsStlCommand')
+    body = appObjects.design.rootComponent.bRepBodies.item(0)
+
+    fileName = str(tmp_path / 'body')
+    stl.exportStlWithExportManager(body, fileName, True, 'High', {}, appObjects, (0.005, 30.0))
+
+    divisions = simulator.getDivisions(0.005)
+    assert getTriangleCount(fileName + '.stl') == 12 * divisions * divisions
@@ -0,0 +1,77 @@
+import os
+
+import pytest
+
+
+#
+# Root
+#   Left:1      Block (size 1, at the origin)
+#   Right:1     Block (size 1, at the origin)
+#   Moved:1     Block (size 1, moved by 2 along x)
+#
+@pytest.fixture
+def design(simulator):
+    design = simulator.Design('Root')
+    root = design.rootComponent
+
+    for name, origin in (('Left', (0.0, 0.0, 0.0)), ('Right', (0.0, 0.0, 0.0)), ('Moved', (2.0, 0.0, 0.0))):
+        component = design.addComponent(name)
+        component.addBody('Block', (1.0, 1.0, 1.0), origin)
+        root.addOccurrence(component)
+
+    return design
+
+
+def getBodies(design):
+    components = dict((component.name, component) for component in design.allComponents)
+
+    return [components[name].bRepBodies.item(0) for name in ('Left', 'Right', 'Moved')]
+
+
+def testOnlyBodiesAtTheSamePositionAreDuplicates(addIn, design):
+    duplicates = addIn('FilteredExportDuplicates')
+
+    assert duplicates.findDuplicates(getBodies(design)) == [0, 0, 2]
+
+
+def testFilesOfDuplicatesMatchANormalExport(addIn, simulator, design, stlValues, runStlExport, tmp_path):
+    simulator.openDesign(design)
+
+    contents = []
+    for duplicatesOnce in (False, True):
+        exportPath = tmp_path / ('once' if duplicatesOnce else 'normal')
+        exportPath.mkdir()
+
+        stlValues['stlExportDuplicatesOnce'] = duplicatesOnce
+        assert runStlExport(stlValues, exportPath).startswith('Path:')
+
+        files = {}
+        for fileName in sorted(os.listdir(str(exportPath))):
+            if fileName.endswith('.stl'):
+                with open(os.path.join(str(exportPath), fileName), 'rb') as stlFile:
+                    files[fileName] = stlFile.read()
+
+        contents.append(files)
+
+    assert len(contents[0]) == 3
+    assert contents[0] == contents[1]
+
+
+#
+# a body and its mirror image at the same place have the same volume, area,
+# moments of inertia, bounding box and center of mass. Only the vertices
+# differ, like the helix of a left hand and a right hand thread
+#
+def testMirrorImagesAreNotDuplicates(addIn, simulator):
+    duplicates = addIn('FilteredExportDuplicates')
+    design = simulator.Design('Root')
+
+    bodies = []
+    for name, extraVertices in (('Left', [(0.25, 0.5, 0.1)]), ('Right', [(0.75, 0.5, 0.1)]), ('Same', [(0.25, 0.5, 0.1)])):
+        component = design.addComponent(name)
+        body = component.addBody('Thread', (1.0, 1.0, 1.0))
+        body.extraVertices = extraVertices
+        design.rootComponent.addOccurrence(component)
+        bodies.append(body)
+
+    assert duplicates.findDuplicates(bodies) == [0, 1, 0]
@@ -0,0 +1,136 @@
+import re
+import itertools
+
+import pytest
+
+
+#
+# getFileName of the STL export before the file names were planned in one
+# pass. Each name is cleaned again and the list of names is searched for
+# every candidate
+#
+def getCleanName(name, removeVersionTagFromNames, removeSpaces):
+    result = name
+
+    if removeVersionTagFromNames:
+        result = re.sub(r' v[0-9]*$', '', result)
+
+    result = re.sub(r':', '__', result)
+
+    if removeSpaces:
+        result = result.strip()
+        result = result.replace(' ', '_')
+
+    result = result.replace('.', '__')
+    result = result.replace('/', '__')
+
+    return result
+
+
+def getCleanNameFromComponentPath(name, removeVersionTagFromNames, removeSpaces):
+    result = name
+
+    if removeVersionTagFromNames:
+        result = re.sub(r':[0-9]*\+', '-', result)
+        result = re.sub(r':[0-9]*$', '', result)
+    else:
+        result = re.sub(r'\+', '__', result)
+        result = re.sub(r':', '__', result)
+
+    return getCleanName(result, removeVersionTagFromNames, removeSpaces)
+
+
+def getFileName(body, rootComponent, addRootComponentNameToFilename, \
+                    addComponentNameToFilename, addLastComponentNameOnly, \
+                    removeVersionTagFromNames, removeSpaces, addRefinmentName, \
+                    refinementName, fileNames):
+    tmpFileName = ''
+
+    if addRefinmentName:
+        tmpFileName += refinementName + '-'
+
+    if addRootComponentNameToFilename and (rootComponent != body[0].parentComponent or not addComponentNameToFilename):
+        tmpFileName += getCleanName(rootComponent.name, removeVersionTagFromNames, removeSpaces) + '-'
+
+    if addComponentNameToFilename:
+        if addLastComponentNameOnly:
+            tmpFileName += getCleanName(body[0].parentComponent.name, removeVersionTagFromNames, removeSpaces) + '-'
+        else:
+            tmpFileName += getCleanNameFromComponentPath(body[1], removeVersionTagFromNames, removeSpaces) + '-'
+
+    tmpFileName += getCleanName(body[0].name, removeVersionTagFromNames, removeSpaces)
+
+    fileName = tmpFileName
+    suffix = 1
+
+    while fileName in fileNames:
+        fileName = tmpFileName + '_(' + str(suffix) + ')'
+        suffix += 1
+
+    return fileName
+
+
+#
+# Robot v3                  bodies 'X', 'X_(1)', ' Frame v1 '
+#   Arm v2:1                bodies 'X', 'X_(1)', 'X', 'Gripper v2', 'Gripper v3'
+#     Arm:1                 bodies 'X', 'X', 'Gripper v2'
+#   Arm v2:2                (same component, its bodies are listed again)
+#   Arm:2                   bodies of Arm again
+#   Arm v3:1                bodies 'X', 'Gripper v2', 'a.b/c'
+#
+@pytest.fixture
+def bodies(simulator):
+    design = simulator.Design('Robot v3')
+    root = design.rootComponent
+
+    components = {}
+    for name, bodyNames in (('Robot v3', ['X', 'X_(1)', ' Frame v1 ']), \
+                            ('Arm v2', ['X', 'X_(1)', 'X', 'Gripper v2', 'Gripper v3']), \
+                            ('Arm', ['X', 'X', 'Gripper v2']), \
+                            ('Arm v3', ['X', 'Gripper v2', 'a.b/c'])):
+        component = root if name == 'Robot v3' else design.addComponent(name)
+        for bodyName in bodyNames:
+            component.addBody(bodyName, (1.0, 1.0, 1.0))
+        components[name] = component
+
+    components['Arm v2'].addOccurrence(components['Arm'])
+    for name in ('Arm v2', 'Arm v2', 'Arm', 'Arm v3'):
+        root.addOccurrence(components[name])
+
+    bodies = [[body, 'Robot v3'] for body in root.bRepBodies]
+    for occurence in root.allOccurrences:
+        bodies.extend([body, occurence.fullPathName] for body in occurence.component.bRepBodies)
+
+    return root, bodies
+
+
+# all combinations of the name options of the dialog
+S_TEST_OPTIONS = list(itertools.product([True, False], repeat=6))
+
+
+@pytest.mark.parametrize('addRoot, addComponent, lastOnly, removeVersion, removeSpaces, addRefinement', S_TEST_OPTIONS)
+def testPlannedNamesMatchThePreviousNames(addIn, bodies, addRoot, addComponent, lastOnly, removeVersion, removeSpaces, addRefinement):
+    fileNames = addIn('FilteredExportFileNames')
+    rootComponent, bodyList = bodies
+
+    expected = []
+    for body in bodyList:
+        expected.append(getFileName(body, rootComponent, addRoot, addComponent, lastOnly, removeVersion, removeSpaces, \
+                                    addRefinement, 'Low', expected))
+
+    planner = fileNames.FileNamePlanner(rootComponent, addRoot, addComponent, lastOnly, removeVersion, removeSpaces, addRefinement, 'Low')
+
+    assert planner.planFileNames(bodyList) == expected
+    assert len(set(expected)) == len(expected)
+
+
+def testLiteralSuffixIsNotReused(addIn, bodies):
+    fileNames = addIn('FilteredExportFileNames')
+    rootComponent, bodyList = bodies
+
+    planner = fileNames.FileNamePlanner(rootComponent, False, False, False, True, True, False, '')
+    names = planner.planFileNames(bodyList)
+
+    # the body 'X_(1)' of the root component takes the name of its own
+    assert names[:3] == ['X', 'X_(1)', 'Frame_v1']
+    assert names[3:6] == ['X_(2)', 'X_(1)_(1)', 'X_(3)']
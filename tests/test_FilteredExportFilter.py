@@ -0,0 +1,131 @@
+import pytest
+
+
+#
+# Root
+#   Frame:1 .. Frame:3      Frame (no body)
+#     Bolt:1                Bolt (tagged FilteredExport/Hardware)
+#   Cover:1                 Cover
+#
+@pytest.fixture
+def design(simulator):
+    design = simulator.Design('Root')
+    root = design.rootComponent
+
+    bolt = design.addComponent('Bolt')
+    bolt.addBody('Shaft', (0.3, 0.3, 2.0))
+    bolt.attributes.add('FilteredExport', 'Hardware', '')
+
+    frame = design.addComponent('Frame')
+    frame.addOccurrence(bolt)
+
+    cover = design.addComponent('Cover')
+    cover.addBody('Plate', (2.0, 2.0, 0.2))
+
+    for index in range(3):
+        root.addOccurrence(frame)
+    root.addOccurrence(cover)
+
+    return design
+
+
+def getOccurrence(design, fullPathName):
+    for occurence in design.rootComponent.allOccurrences:
+        if occurence.fullPathName == fullPathName:
+            return occurence
+
+    raise KeyError(fullPathName)
+
+
+@pytest.mark.parametrize('text', ['', '  ', None])
+def testEmptyExpressionIsNoFilter(addIn, text):
+    assert addIn('FilteredExportFilter').parseComponentFilterExpression(text) is None
+
+
+@pytest.mark.parametrize('text', [
+    'material:Steel',
+    'name:Bolt; volume<100',
+    'owner:Me',
+    'name<3',
+    'volume:100',
+    'tag~Hardware',
+    'name~[',
+    'size>big'
+])
+def testInvalidComponentExpressionIsRejected(addIn, text):
+    with pytest.raises(ValueError):
+        addIn('FilteredExportFilter').parseComponentFilterExpression(text)
+
+
+def testExpressionIsSplitIntoTerms(addIn):
+    filterExpression = addIn('FilteredExportFilter').parseComponentFilterExpression(' name:Bolt ; !path:Frame:2 ; tag:Parts/Hardware ;')
+
+    assert filterExpression.componentKey == ('name:Bolt', '!path:Frame:2', 'tag:Parts/Hardware')
+    assert sorted(filterExpression.componentInclusions) == ['name', 'tag']
+    assert [term.field for term in filterExpression.componentExclusions] == ['path']
+    assert filterExpression.hasPathTerms
+    assert not filterExpression.hasBodyTerms
+
+    tagTerm = filterExpression.componentInclusions['tag'][0]
+    assert (tagTerm.tagGroup, tagTerm.tagName) == ('Parts', 'Hardware')
+
+
+@pytest.mark.parametrize('text, fullPathName, expected', [
+    ('name:Bolt', 'Frame:1', 'descend'),
+    ('name:Bolt', 'Frame:1+Bolt:1', 'include'),
+    ('name~^fr', 'Frame:2', 'include'),
+    ('!name:Frame', 'Frame:1', 'prune'),
+    ('!name:Frame', 'Cover:1', 'include'),
+    ('tag:Hardware', 'Frame:3', 'descend'),
+    ('tag:Hardware', 'Frame:3+Bolt:1', 'include'),
+    ('tag:Other/Hardware', 'Frame:3+Bolt:1', 'descend'),
+    ('path:Frame:2+Bolt', 'Frame:2', 'descend'),
+    ('path:Frame:2+Bolt', 'Frame:2+Bolt:1', 'include'),
+    ('path:Frame:2+Bolt', 'Frame:1', 'prune'),
+    ('path:Frame', 'Frame:1+Bolt:1', 'include'),
+    ('path:Frame; !path:Frame:2', 'Frame:2', 'prune'),
+    ('path:Frame:1; path:Cover', 'Cover:1', 'include'),
+    ('path:Frame+Bolt; name:Bolt', 'Frame:1', 'descend'),
+    ('path:Frame+Bolt; name:Frame', 'Frame:1+Bolt:1', 'descend'),
+    ('path:Cover; name:Bolt', 'Frame:1', 'prune')
+])
+def testOccurrenceDecisions(addIn, design, text, fullPathName, expected):
+    occurence = getOccurrence(design, fullPathName)
+    filterExpression = addIn('FilteredExportFilter').parseComponentFilterExpression(text)
+
+    assert filterExpression.checkOccurrence(occurence.component, occurence.fullPathName) == expected
+
+
+#
+# Frame only leads to Bolt, so it is walked for its first occurence and
+# skipped like an included component for the others
+#
+def testRepeatedSubassemblyIsWalkedOnce(addIn, design, monkeypatch):
+    util = addIn('FilteredExportUtil')
+    filterExpression = addIn('FilteredExportFilter').parseComponentFilterExpression('name:Bolt')
+
+    checkedNames = []
+    checkOccurrence = filterExpression.checkOccurrence
+    monkeypatch.setattr(filterExpression, 'checkOccurrence', lambda component, fullPathName: \
+                        checkedNames.append(component.name) or checkOccurrence(component, fullPathName))
+
+    statistics = util.TraversalStatistics()
+    records = list(util.iterComponents(design.rootComponent.occurrences, True, False, statistics, componentFilter=filterExpression))
+
+    assert [(component.name, fullPathName) for component, fullPathName, depth in records] == [('Bolt', 'Frame:1+Bolt:1')]
+    assert sorted(checkedNames) == ['Bolt', 'Cover', 'Frame']
+    assert statistics.visited == 5
+    assert statistics.skipped == {'duplicate': 2, 'not matching': 2}
+
+
+#
+# the decision of a path term depends on the occurence, so each occurence is
+# checked on its own
+#
+def testPathFilterChecksEachOccurrence(addIn, design):
+    util = addIn('FilteredExportUtil')
+    filterExpression = addIn('FilteredExportFilter').parseComponentFilterExpression('path:Frame:2+Bolt')
+
+    records = list(util.iterComponents(design.rootComponent.occurrences, True, False, componentFilter=filterExpression))
+
+    assert [fullPathName for component, fullPathName, depth in records] == ['Frame:2+Bolt:1']
@@ -0,0 +1,189 @@
+import os
+
+import pytest
+
+
+#
+# design of the simulator opened as saved document. Calls of findEntityByToken
+# are counted
+#
+@pytest.fixture
+def document(simulator):
+    design = simulator.generateAssembly(depth=3, fanOut=4, reuse=0.3, hiddenRatio=0.1, mixedRatio=0.3, seed=5)
+    document = simulator.openDesign(design, dataFileId='urn:test:index', versionNumber=3)
+
+    design.tokenLookups = 0
+    findEntityByToken = design.findEntityByToken
+
+    def countingFindEntityByToken(entityToken):
+        design.tokenLookups += 1
+        return findEntityByToken(entityToken)
+
+    design.findEntityByToken = countingFindEntityByToken
+
+    return document
+
+
+def getIndex(addIn, traversalCache, document):
+    indexStore = addIn('FilteredExportIndexStore')
+    design = document.products.item(0)
+
+    return indexStore.getAssemblyIndex(traversalCache, document, design, None, True, False, True)
+
+
+def renderEntries(assemblyIndex):
+    return [(entry.component.entityToken, entry.name, entry.fullPathName, entry.depth, entry.kind, entry.bodyCount,
+             [body.entityToken for body in entry.visibleBodies], entry.occurrenceCount, entry.isLinked) for entry in assemblyIndex]
+
+
+def getIndexFiles(addIn):
+    indexFolder = addIn('FilteredExportIndexStore').getIndexFolder()
+
+    return sorted(os.listdir(indexFolder)) if os.path.exists(indexFolder) else []
+
+
+def testSavedIndexIsLoadedLazily(addIn, document):
+    commandBase = addIn('Fusion360Utilities.Fusion360CommandBase')
+    indexStore = addIn('FilteredExportIndexStore')
+    design = document.products.item(0)
+
+    builtIndex = getIndex(addIn, commandBase.TraversalCache(), document)
+    expected = renderEntries(builtIndex)
+    assert len(getIndexFiles(addIn)) == 1
+
+    # a new session has an empty traversal cache
+    design.tokenLookups = 0
+    loadedIndex = getIndex(addIn, commandBase.TraversalCache(), document)
+
+    assert isinstance(loadedIndex, indexStore.StoredAssemblyIndex)
+    assert design.tokenLookups == 0
+    assert loadedIndex.entries == []
+
+    # tokens are resolved when the index reaches the entry
+    firstEntry = next(iter(loadedIndex))
+    assert firstEntry.component.entityToken == expected[0][0]
+    assert design.tokenLookups == 1 + len(expected[0][6])
+
+    assert renderEntries(loadedIndex) == expected
+    assert loadedIndex.statistics.render() == builtIndex.statistics.render()
+
+
+def testNewVersionIsTraversedAgain(addIn, document):
+    commandBase = addIn('Fusion360Utilities.Fusion360CommandBase')
+    indexStore = addIn('FilteredExportIndexStore')
+
+    getIndex(addIn, commandBase.TraversalCache(), document).complete()
+    oldFiles = getIndexFiles(addIn)
+
+    document.dataFile.versionNumber += 1
+    assemblyIndex = getIndex(addIn, commandBase.TraversalCache(), document)
+    assert not isinstance(assemblyIndex, indexStore.StoredAssemblyIndex)
+
+    # the index of the new version replaces the index of the old version
+    assemblyIndex.complete()
+    newFiles = getIndexFiles(addIn)
+    assert len(newFiles) == 1 and newFiles != oldFiles
+
+
+def testModifiedDocumentHasNoStoredIndex(addIn, document):
+    commandBase = addIn('Fusion360Utilities.Fusion360CommandBase')
+
+    document.isModified = True
+    getIndex(addIn, commandBase.TraversalCache(), document).complete()
+
+    assert getIndexFiles(addIn) == []
+
+
+def testStaleStampIsNotTakenFromTheTraversalCache(addIn, document):
+    commandBase = addIn('Fusion360Utilities.Fusion360CommandBase')
+    design = document.products.item(0)
+    traversalCache = commandBase.TraversalCache()
+
+    assemblyIndex = getIndex(addIn, traversalCache, document).complete()
+    assert getIndex(addIn, traversalCache, document) is assemblyIndex
+
+    # moving the timeline marker changes the stamp of the design
+    design.timeline.markerPosition += 1
+    assert getIndex(addIn, traversalCache, document) is not assemblyIndex
+    assert traversalCache.misses == 2
+
+
+def testDamagedIndexIsReplaced(addIn, document):
+    commandBase = addIn('Fusion360Utilities.Fusion360CommandBase')
+    indexStore = addIn('FilteredExportIndexStore')
+    design = document.products.item(0)
+
+    expected = renderEntries(getIndex(addIn, commandBase.TraversalCache(), document))
+
+    fileName = os.path.join(indexStore.getIndexFolder(), getIndexFiles(addIn)[0])
+    with open(fileName, 'r', encoding='utf-8') as indexFile:
+        lines = indexFile.readlines()
+    lines[2] = lines[2].replace('"name": "', '"name": "Changed ')
+    with open(fileName, 'w', encoding='utf-8') as indexFile:
+        indexFile.writelines(lines)
+
+    # the damaged file is found without API calls and the design is traversed again
+    design.tokenLookups = 0
+    assemblyIndex = getIndex(addIn, commandBase.TraversalCache(), document)
+    assert not isinstance(assemblyIndex, indexStore.StoredAssemblyIndex)
+    assert design.tokenLookups == 0
+    assert not os.path.exists(fileName)
+
+    assert renderEntries(assemblyIndex) == expected
+    assert os.path.exists(fileName)
+
+
+#
+# remove the entity of a token from the design. The tokens of the stored
+# index can't be resolved afterwards, the component and its bodies stay
+#
+def forgetToken(design, entityToken):
+    del design._entities[entityToken]
+
+
+@pytest.mark.parametrize('tokenKind', ['component', 'body'])
+def testUnresolvedTokenRebuildsTheIndex(addIn, document, tokenKind):
+    commandBase = addIn('Fusion360Utilities.Fusion360CommandBase')
+    indexStore = addIn('FilteredExportIndexStore')
+    design = document.products.item(0)
+
+    expected = renderEntries(getIndex(addIn, commandBase.TraversalCache(), document))
+    fileName = os.path.join(indexStore.getIndexFolder(), getIndexFiles(addIn)[0])
+
+    # the third entry with visible bodies can't be resolved
+    position = [index for index, entry in enumerate(expected) if entry[6]][2]
+    forgetToken(design, expected[position][0] if tokenKind == 'component' else expected[position][6][0])
+
+    assemblyIndex = getIndex(addIn, commandBase.TraversalCache(), document)
+    assert isinstance(assemblyIndex, indexStore.StoredAssemblyIndex)
+
+    # the export gets every component once, the entries before the token
+    # come from the stored index, the others from the traversal
+    entries = renderEntries(assemblyIndex)
+    assert assemblyIndex.isRebuilt and not assemblyIndex.failed
+    assert entries[:position] == expected[:position]
+    assert sorted(entry[0] for entry in entries) == sorted(entry[0] for entry in expected)
+    assert sorted(entry[6] for entry in entries) == sorted(entry[6] for entry in expected)
+
+    # the new traversal is stored
+    assert os.path.exists(fileName)
+
+
+def testBodyTermsKeepTheIndex(addIn, document):
+    commandBase = addIn('Fusion360Utilities.Fusion360CommandBase')
+    indexStore = addIn('FilteredExportIndexStore')
+    filterExpression = addIn('FilteredExportFilter').parseFilterExpression
+    design = document.products.item(0)
+    traversalCache = commandBase.TraversalCache()
+
+    def getFilteredIndex(text):
+        return indexStore.getAssemblyIndex(traversalCache, document, design, None, True, False, True, filterExpression(text))
+
+    assemblyIndex = getFilteredIndex('!name:Part L3*; material:Steel').complete()
+
+    assert getFilteredIndex('!name:Part L3*; volume>100') is assemblyIndex
+    assert getFilteredIndex('!name:Part L3*') is assemblyIndex
+    assert getFilteredIndex('!name:Part L2*; material:Steel') is not assemblyIndex
+
+    unfilteredIndex = getFilteredIndex('').complete()
+    assert getFilteredIndex('material:Steel') is unfilteredIndex
@@ -0,0 +1,133 @@
+import os
+
+import pytest
+
+
+@pytest.fixture
+def design(simulator):
+    design = simulator.generateAssembly(depth=2, fanOut=3, seed=24)
+    simulator.openDesign(design)
+
+    return design
+
+
+#
+# names of a section of the result message, e.g. 'Resumed'
+#
+def getSection(message, title):
+    names = []
+    isInSection = False
+
+    for line in message.split('\n'):
+        if line.startswith('   '):
+            if isInSection:
+                names.append(line.strip())
+        else:
+            isInSection = line == title + ':'
+
+    return names
+
+
+def getExportedFiles(exportPath):
+    files = {}
+    for fileName in os.listdir(str(exportPath)):
+        if not fileName.startswith('.'):
+            with open(os.path.join(str(exportPath), fileName), 'rb') as exportFile:
+                files[fileName] = exportFile.read()
+
+    return files
+
+
+def testEachCommandAndFormatHasItsJournal(addIn):
+    journal = addIn('FilteredExportJournal')
+    stl = addIn('FilteredExportAsStlCommand')
+    stp = addIn('FilteredExportStp')
+
+    fileNames = set(journal.getJournalFileName(journalName) for journalName in \
+                    [stl.S_STL_JOURNAL_NAME + stlFormat for stlFormat in (stl.S_STL_FORMAT_BINARY, stl.S_STL_FORMAT_TEXT, stl.S_STL_FORMAT_3MF)] + \
+                    [stp.S_CPY_JOURNAL_NAME])
+
+    assert len(fileNames) == 4
+
+
+#
+# cancel an STL export, export STEP files into the same folder and resume
+# the STL export. The folder holds the same files as a complete export
+#
+def testCancelledExportIsResumed(addIn, simulator, design, stlValues, runStlExport, stepValues, runStepExport, tmp_path, monkeypatch):
+    userInterface = simulator.Application.get().userInterface
+    exportPath = tmp_path / 'export'
+    exportPath.mkdir()
+
+    monkeypatch.setattr(userInterface, 'progressCancelAfter', 3)
+    message = runStlExport(stlValues, exportPath)
+    cancelledFiles = getSection(message, 'Processed')
+    assert len(cancelledFiles) == 3
+
+    monkeypatch.setattr(userInterface, 'progressCancelAfter', None)
+    assert runStepExport(stepValues, exportPath).startswith('Path:')
+
+    stlValues['stlResumeLastExport'] = True
+    message = runStlExport(stlValues, exportPath)
+    assert message.startswith('Path:')
+    assert getSection(message, 'Resumed') == cancelledFiles
+
+    completePath = tmp_path / 'complete'
+    completePath.mkdir()
+    stlValues['stlResumeLastExport'] = False
+    runStlExport(stlValues, completePath)
+
+    stlFiles = dict((fileName, content) for fileName, content in getExportedFiles(exportPath).items() if fileName.endswith('.stl'))
+    assert stlFiles == getExportedFiles(completePath)
+
+
+def testCompleteExportCantBeResumed(addIn, simulator, design, stlValues, runStlExport, tmp_path):
+    exportPath = tmp_path / 'export'
+    exportPath.mkdir()
+
+    assert runStlExport(stlValues, exportPath).startswith('Path:')
+
+    stlValues['stlResumeLastExport'] = True
+    assert runStlExport(stlValues, exportPath).startswith('No unfinished export to resume')
+
+
+def testResumeNeedsTheSameFormat(addIn, simulator, design, stlValues, runStlExport, tmp_path, monkeypatch):
+    exportPath = tmp_path / 'export'
+    exportPath.mkdir()
+
+    monkeypatch.setattr(simulator.Application.get().userInterface, 'progressCancelAfter', 2)
+    runStlExport(stlValues, exportPath)
+
+    stlValues['stlDropDownStlFormat'] = 'Text'
+    stlValues['stlResumeLastExport'] = True
+    assert runStlExport(stlValues, exportPath).startswith('No unfinished export to resume')
+
+
+def testJournalIsSyncedInBatches(addIn, tmp_path, monkeypatch):
+    journal = addIn('FilteredExportJournal')
+    syncs = []
+    monkeypatch.setattr(journal.os, 'fsync', syncs.append)
+
+    exportJournal = journal.openJournal(str(tmp_path), 'Test', 'Test', 'settings')
+    for index in range(20):
+        exportJournal.add('File' + str(index), 'File' + str(index) + '.stl', None, 'settings')
+
+    # the start line is synced, the files wait for the interval or the end
+    assert len(syncs) == 1
+
+    exportJournal.finish(True)
+    assert len(syncs) == 2
+    assert len(journal.ExportJournal(str(tmp_path), 'Test').load().entries) == 20
+
+
+@pytest.mark.parametrize('skipUnchanged', [False, True])
+def testCompleteExportLeavesNoJournal(addIn, simulator, design, stlValues, runStlExport, stepValues, runStepExport, tmp_path, skipUnchanged):
+    exportPath = tmp_path / 'export'
+    exportPath.mkdir()
+
+    stlValues['stlSkipUnchangedBodies'] = skipUnchanged
+    assert runStlExport(stlValues, exportPath).startswith('Path:')
+    assert runStepExport(stepValues, exportPath).startswith('Path:')
+
+    # the manifest stays for the next export
+    assert sorted(fileName for fileName in os.listdir(str(exportPath)) if fileName.startswith('.')) == ['.filteredExportManifest.json']
@@ -0,0 +1,101 @@
+import os
+
+import pytest
+
+
+@pytest.fixture
+def design(simulator):
+    design = simulator.generateAssembly(depth=2, fanOut=3, seed=13)
+    simulator.openDesign(design)
+
+    return design
+
+
+#
+# run the STL export with 'Skip unchanged bodies' and return the export
+# result instead of its message
+#
+@pytest.fixture
+def runExport(addIn, stlValues, runStlExport, tmp_path, monkeypatch):
+    stl = addIn('FilteredExportAsStlCommand')
+    exportPath = tmp_path / 'export'
+    exportPath.mkdir()
+
+    results = []
+    renderResultMessage = stl.renderResultMessage
+    monkeypatch.setattr(stl, 'renderResultMessage', lambda exportResult: results.append(exportResult) or renderResultMessage(exportResult))
+
+    def run(**values):
+        stlValues['stlSkipUnchangedBodies'] = True
+        stlValues.update(values)
+
+        message = runStlExport(stlValues, exportPath)
+        assert message.startswith('Path:')
+
+        return results[-1], message
+
+    run.exportPath = exportPath
+
+    return run
+
+
+def getStlFileNames(exportPath):
+    return sorted(fileName for fileName in os.listdir(str(exportPath)) if fileName.endswith('.stl'))
+
+
+def testUnchangedBodiesAreSkipped(design, runExport):
+    firstResult, message = runExport()
+    assert firstResult.exportNames
+    assert firstResult.unchangedNames == []
+    assert len(getStlFileNames(runExport.exportPath)) == len(firstResult.exportNames)
+
+    # a skipped file is not written again
+    fileName = getStlFileNames(runExport.exportPath)[0]
+    (runExport.exportPath / fileName).write_bytes(b'kept')
+
+    secondResult, message = runExport()
+    assert secondResult.exportNames == []
+    assert secondResult.unchangedNames == firstResult.exportNames
+    assert 'Unchanged:\n   ' + firstResult.exportNames[0] + '\n' in message
+    assert (runExport.exportPath / fileName).read_bytes() == b'kept'
+
+
+def testChangedBodyIsExportedAgain(design, runExport):
+    firstResult, message = runExport()
+
+    body = next(body for component in design.allComponents for body in component.bRepBodies)
+    body.size = (body.size[0] * 2.0, body.size[1], body.size[2])
+
+    secondResult, message = runExport()
+    assert len(secondResult.exportNames) == 1
+    assert secondResult.exportNames[0].endswith(body.name.replace(' ', '_'))
+    assert sorted(secondResult.unchangedNames + secondResult.exportNames) == sorted(firstResult.exportNames)
+
+
+def testChangedSettingsExportEverythingAgain(design, runExport):
+    firstResult, message = runExport()
+
+    secondResult, message = runExport(stlDropDownStlRefinement='High')
+    assert secondResult.exportNames == firstResult.exportNames
+    assert secondResult.unchangedNames == []
+
+
+def testMissingFileIsExportedAgain(design, runExport):
+    firstResult, message = runExport()
+
+    fileName = getStlFileNames(runExport.exportPath)[0]
+    os.remove(str(runExport.exportPath / fileName))
+
+    secondResult, message = runExport()
+    assert [exportName + '.stl' for exportName in secondResult.exportNames] == [fileName]
+
+
+def testDamagedManifestExportsEverythingAgain(addIn, design, runExport):
+    manifest = addIn('FilteredExportManifest')
+    firstResult, message = runExport()
+
+    (runExport.exportPath / manifest.S_MANIFEST_FILE_NAME).write_text('{"format": 1, "fi')
+
+    secondResult, message = runExport()
+    assert secondResult.exportNames == firstResult.exportNames
+    assert manifest.ExportManifest(str(runExport.exportPath)).load().files
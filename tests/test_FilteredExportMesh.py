@@ -0,0 +1,109 @@
+import struct
+
+import pytest
+
+# tetrahedron in cm with outward winding. Coordinates that aren't exact
+# floats show differences in the arithmetic of both packers
+S_TEST_COORDINATES = [
+    0.0, 0.0, 0.0,
+    1.3, 0.0, 0.0,
+    0.0, 0.7, 0.0,
+    0.0, 0.0, 2.1
+]
+S_TEST_INDICES = [0, 2, 1, 0, 1, 3, 0, 3, 2, 1, 2, 3]
+
+# the last triangle has no area and is written with a zero normal
+S_TEST_DEGENERATE_INDICES = S_TEST_INDICES + [0, 1, 1]
+
+
+@pytest.mark.parametrize('indices', [S_TEST_INDICES, S_TEST_DEGENERATE_INDICES, []])
+@pytest.mark.parametrize('isBinary', [True, False])
+def testNumpyAndStructCreateTheSameFile(addIn, indices, isBinary):
+    mesh = addIn('FilteredExportMesh')
+
+    if isBinary:
+        pack = lambda useNumpy: mesh.packBinaryStl(S_TEST_COORDINATES, indices, useNumpy=useNumpy)
+    else:
+        pack = lambda useNumpy: mesh.packAsciiStl(S_TEST_COORDINATES, indices, 'Body', useNumpy=useNumpy)
+
+    assert pack(True) == pack(False)
+
+
+@pytest.mark.parametrize('useNumpy', [True, False])
+def testBinaryLayout(addIn, useNumpy):
+    mesh = addIn('FilteredExportMesh')
+
+    content = mesh.packBinaryStl(S_TEST_COORDINATES, S_TEST_DEGENERATE_INDICES, useNumpy=useNumpy)
+    triangleCount = len(S_TEST_DEGENERATE_INDICES) // 3
+
+    # 80 byte header, triangle count and 50 bytes per triangle
+    assert len(content) == 84 + 50 * triangleCount
+    assert content[:80] == mesh.S_MESH_STL_HEADER.ljust(80, b' ')
+    assert struct.unpack('<I', content[80:84])[0] == triangleCount
+
+    for triangleIndex in range(triangleCount):
+        record = struct.unpack('<12fH', content[84 + 50 * triangleIndex:84 + 50 * (triangleIndex + 1)])
+
+        # cm are written as mm
+        for cornerIndex in range(3):
+            nodeIndex = S_TEST_DEGENERATE_INDICES[triangleIndex * 3 + cornerIndex]
+            expected = [value * 10.0 for value in S_TEST_COORDINATES[nodeIndex * 3:nodeIndex * 3 + 3]]
+            assert record[3 + cornerIndex * 3:6 + cornerIndex * 3] == pytest.approx(expected, rel=1e-6)
+
+        normalLength = sum(value * value for value in record[:3])
+        assert normalLength == pytest.approx(0.0 if triangleIndex == triangleCount - 1 else 1.0, abs=1e-6)
+        assert record[12] == 0
+
+    # the first triangle faces down
+    assert struct.unpack('<3f', content[84:96]) == pytest.approx((0.0, 0.0, -1.0))
+
+
+@pytest.mark.parametrize('useNumpy', [True, False])
+def testAsciiLayout(addIn, useNumpy):
+    mesh = addIn('FilteredExportMesh')
+
+    lines = mesh.packAsciiStl(S_TEST_COORDINATES, S_TEST_INDICES, 'Body', useNumpy=useNumpy).decode('ascii').split('\n')
+
+    assert lines[0] == 'solid Body'
+    assert lines[-2:] == ['endsolid Body', '']
+
+    facets = [line.split() for line in lines if line.strip().startswith('facet normal')]
+    vertices = [[float(value) for value in line.split()[1:]] for line in lines if line.strip().startswith('vertex')]
+    assert len(facets) == len(S_TEST_INDICES) // 3
+    assert [float(value) for value in facets[0][2:]] == pytest.approx([0.0, 0.0, -1.0])
+
+    expected = [[value * 10.0 for value in S_TEST_COORDINATES[index * 3:index * 3 + 3]] for index in S_TEST_INDICES]
+    assert len(vertices) == len(expected)
+    for vertex, expectedVertex in zip(vertices, expected):
+        assert vertex == pytest.approx(expectedVertex, rel=1e-6)
+
+
+def testScaleIsApplied(addIn):
+    mesh = addIn('FilteredExportMesh')
+
+    content = mesh.packBinaryStl(S_TEST_COORDINATES, S_TEST_INDICES, scale=1.0)
+
+    assert struct.unpack('<3f', content[84 + 50 + 24:84 + 50 + 36]) == pytest.approx((1.3, 0.0, 0.0))
+
+
+#
+# without NumPy the packers and mergeMeshes fall back to struct and array
+#
+@pytest.mark.parametrize('isBinary', [True, False])
+def testFilesWithoutNumpy(addIn, tmp_path, monkeypatch, isBinary):
+    mesh = addIn('FilteredExportMesh')
+    meshes = [(S_TEST_COORDINATES, S_TEST_INDICES), (S_TEST_COORDINATES[3:], [0, 1, 2])]
+
+    contents = []
+    for withNumpy in (True, False):
+        if not withNumpy:
+            monkeypatch.setattr(mesh, 'numpy', None)
+
+        fileName = str(tmp_path / ('numpy.stl' if withNumpy else 'struct.stl'))
+        coordinates, indices = mesh.mergeMeshes(meshes)
+        assert mesh.writeStl(fileName, coordinates, indices, isBinary, 'Merged') == 5
+
+        with open(fileName, 'rb') as stlFile:
+            contents.append(stlFile.read())
+
+    assert contents[0] == contents[1]
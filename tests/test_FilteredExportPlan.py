@@ -0,0 +1,128 @@
+import os
+import json
+
+import pytest
+
+
+S_TEST_DOCUMENT_ID = 'urn:sim:design:plan'
+
+
+@pytest.fixture
+def design(simulator):
+    design = simulator.generateAssembly(depth=2, fanOut=3, seed=31)
+    simulator.openDesign(design, dataFileId=S_TEST_DOCUMENT_ID, versionNumber=2)
+
+    return design
+
+
+def getExportedFiles(exportPath):
+    files = {}
+    for fileName in os.listdir(str(exportPath)):
+        if not fileName.startswith('.'):
+            with open(os.path.join(str(exportPath), fileName), 'rb') as exportFile:
+                files[fileName] = exportFile.read()
+
+    return files
+
+
+#
+# write the plan of an export into a folder and return the plan file
+#
+def writePlan(stlValues, runStlExport, planPath):
+    planPath.mkdir()
+    stlValues['stlDropDownPlan'] = 'Write plan (dry run)'
+
+    message = runStlExport(dict(stlValues), planPath)
+    assert message.startswith('Plan:\n')
+
+    return message.split('\n')[1].strip()
+
+
+def executePlan(simulator, stlValues, runStlExport, planFileName, exportPath):
+    exportPath.mkdir()
+    simulator.Application.get().userInterface.dialogFile = planFileName
+    stlValues['stlDropDownPlan'] = 'Execute plan'
+
+    return runStlExport(dict(stlValues), exportPath)
+
+
+def testSavedPlanExportsTheSameFiles(simulator, design, stlValues, runStlExport, tmp_path):
+    exportPath = tmp_path / 'export'
+    exportPath.mkdir()
+    assert runStlExport(dict(stlValues), exportPath).startswith('Path:')
+
+    planFileName = writePlan(stlValues, runStlExport, tmp_path / 'plan')
+    assert os.listdir(str(tmp_path / 'plan')) == [os.path.basename(planFileName)]
+
+    assert executePlan(simulator, stlValues, runStlExport, planFileName, tmp_path / 'executed').startswith('Path:')
+    assert getExportedFiles(tmp_path / 'executed') == getExportedFiles(exportPath)
+
+
+@pytest.mark.parametrize('dataFileId, versionNumber, message', [
+    ('urn:sim:design:other', 2, 'The export plan was made for another document'),
+    (S_TEST_DOCUMENT_ID, 3, 'The export plan was made for version 2 of the document, the design is version 3.')
+])
+def testPlanOfAnotherDocumentIsRejected(simulator, design, stlValues, runStlExport, tmp_path, dataFileId, versionNumber, message):
+    planFileName = writePlan(stlValues, runStlExport, tmp_path / 'plan')
+
+    simulator.openDesign(design, dataFileId=dataFileId, versionNumber=versionNumber)
+
+    assert executePlan(simulator, stlValues, runStlExport, planFileName, tmp_path / 'executed').startswith(message)
+    assert os.listdir(str(tmp_path / 'executed')) == []
+
+
+#
+# Root
+#   Bracket:1       Bracket with body 'Plate'
+#   Bracket:1       another component named Bracket with body 'Plate'
+#   Cover:1         Cover with body 'Plate'
+#
+@pytest.mark.parametrize('componentName, bodyCount', [('Cover', 1), ('Bracket', 2)])
+def testChangedTokensAreResolvedByUniqueNames(addIn, simulator, tmp_path, componentName, bodyCount):
+    planModule = addIn('FilteredExportPlan')
+    design = simulator.Design('Root')
+    for name in ('Bracket', 'Bracket', 'Cover'):
+        component = design.addComponent(name)
+        component.addBody('Plate', (1.0, 1.0, 0.1))
+        design.rootComponent.addOccurrence(component)
+    simulator.openDesign(design, dataFileId=S_TEST_DOCUMENT_ID, versionNumber=1)
+
+    plan = planModule.ExportPlan('Test', 'Root', {})
+    plan.documentId = S_TEST_DOCUMENT_ID
+    plan.versionNumber = 1
+    plan.addRefinement('Low', '', 0.01, 10.0, 'settings')
+
+    unit = planModule.ExportPlanUnit('Plate', componentName + ':1', componentName)
+    unit.addBody(next(component for component in design.allComponents if component.name == componentName).bRepBodies.item(0))
+    plan.addUnit(unit)
+
+    planFileName = str(tmp_path / 'Root_STL.plan.json')
+    plan.save(planFileName)
+
+    # the tokens of a new session
+    with open(planFileName, 'r', encoding='utf-8') as planFile:
+        record = json.load(planFile)
+    record['units'][0]['bodies'][0]['token'] = 'changed'
+    with open(planFileName, 'w', encoding='utf-8') as planFile:
+        json.dump(record, planFile)
+
+    loadedPlan = planModule.loadExportPlan(planFileName, 'Test')
+    assert loadedPlan.getFingerprint() == plan.getFingerprint()
+
+    if bodyCount == 1:
+        assert loadedPlan.resolve(design).units[0].bodies[0].entityToken == unit.bodyTokens[0]
+    else:
+        with pytest.raises(ValueError, match='found more than once'):
+            loadedPlan.resolve(design)
+
+
+def testPlanOfAnUnsavedDesignNeedsTheSameDesign(addIn, simulator, design):
+    planModule = addIn('FilteredExportPlan')
+
+    plan = planModule.ExportPlan('Test', 'Other', {})
+
+    with pytest.raises(ValueError, match='made for the design \'Other\''):
+        plan.resolve(design)
+
+    plan.designName = design.rootComponent.name
+    assert plan.resolve(design) is plan
@@ -0,0 +1,67 @@
+import pytest
+
+S_TEST_HIGH = ('High', '', 0.001016, 10.0, None)
+S_TEST_LOW = ('Low', '', 0.008069, 30.0, None)
+
+
+#
+# one file per visible body of a simulated design
+#
+@pytest.fixture
+def exportUnits(addIn, simulator):
+    util = addIn('FilteredExportUtil')
+    stl = addIn('FilteredExportAsStlCommand')
+
+    design = simulator.generateAssembly(depth=2, fanOut=3, reuse=0.3, seed=3)
+    bodies = stl.getBodies(util.buildAssemblyIndex(design, None, True, False, True), [])
+
+    return [(body[0].name + str(index), [body]) for index, body in enumerate(bodies)]
+
+
+def getMeshTriangleCounts(addIn, exportUnits, refinement, meshDeviations):
+    mesh = addIn('FilteredExportMesh')
+
+    triangleCounts = []
+    for (unitFileName, unitBodies), unitDeviations in zip(exportUnits, meshDeviations):
+        bodyDeviations = unitDeviations[0] or [refinement[2:4]] * len(unitBodies)
+        triangleCounts.append(sum(len(mesh.calculateMesh(body[0], *bodyDeviation)[1]) // 3 for body, bodyDeviation in zip(unitBodies, bodyDeviations)))
+
+    return triangleCounts
+
+
+@pytest.mark.parametrize('refinement', [S_TEST_HIGH, S_TEST_LOW])
+def testEstimationIsCalibratedToTheWrittenMeshes(addIn, exportUnits, refinement):
+    stl = addIn('FilteredExportAsStlCommand')
+
+    estimation, meshDeviations = stl.estimateStls(exportUnits, [refinement], 'Binary', 0)
+    triangleCount = sum(getMeshTriangleCounts(addIn, exportUnits, refinement, meshDeviations))
+
+    assert 0.75 * triangleCount <= estimation.triangleCount <= 1.25 * triangleCount
+
+
+@pytest.mark.parametrize('triangleBudget', [50, 500, 5000])
+def testReducedMeshesMeetTheBudget(addIn, exportUnits, triangleBudget):
+    stl = addIn('FilteredExportAsStlCommand')
+
+    estimation, meshDeviations = stl.estimateStls(exportUnits, [S_TEST_HIGH], 'Binary', triangleBudget)
+    triangleCounts = getMeshTriangleCounts(addIn, exportUnits, S_TEST_HIGH, meshDeviations)
+
+    assert not set(estimation.reducedNames) & set(estimation.overBudgetNames)
+
+    for (unitFileName, unitBodies), triangleCount in zip(exportUnits, triangleCounts):
+        if unitFileName in estimation.reducedNames:
+            assert triangleCount <= triangleBudget
+
+
+def testMeshIsEitherReducedOrOverBudget(addIn):
+    preflight = addIn('FilteredExportPreflight')
+
+    estimation = preflight.PreflightEstimation('Binary', 100)
+    estimation.add('reduced', 90, True)
+    estimation.add('still over budget', 120, True)
+    estimation.add('over budget', 150, False)
+    estimation.add('unchanged', 80, False)
+
+    assert estimation.reducedNames == ['reduced']
+    assert estimation.overBudgetNames == ['still over budget', 'over budget']
+    assert 'Reduced to budget: 1' in estimation.render()
@@ -0,0 +1,128 @@
+import os
+
+
+#
+# export steps that yield itemCount times and return 'done'. The log records
+# the items and whether the generator was closed
+#
+def iterTestSteps(itemCount, log):
+    try:
+        for itemIndex in range(itemCount):
+            log.append(itemIndex)
+            yield
+
+        return 'done'
+    finally:
+        log.append('closed')
+
+
+def createJob(scheduler, itemCount, log, results):
+    return scheduler.ExportJob('test', iterTestSteps(itemCount, log), results.append, lambda error: results.append(error))
+
+
+def testRunStepsReturnsTheResult(addIn):
+    scheduler = addIn('FilteredExportScheduler')
+    log = []
+
+    assert scheduler.runSteps(iterTestSteps(3, log)) == 'done'
+    assert log == [0, 1, 2, 'closed']
+
+
+def testSliceEndsAfterItsItems(addIn):
+    scheduler = addIn('FilteredExportScheduler')
+    log = []
+    results = []
+    job = createJob(scheduler, 5, log, results)
+
+    assert not job.runSlice(3, 60.0)
+    assert job.itemCount == 3
+    assert job.runSlice(3, 60.0)
+    assert results == ['done']
+    assert job.sliceCount == 2
+
+
+def testFailedJobReportsTheError(addIn):
+    scheduler = addIn('FilteredExportScheduler')
+    results = []
+
+    def iterFailingSteps():
+        yield
+        raise ValueError('No bodies')
+
+    job = scheduler.ExportJob('test', iterFailingSteps(), None, results.append)
+
+    assert job.runSlice(10, 60.0)
+    assert scheduler.renderJobError(results[0]) == 'No bodies'
+
+
+def testJobRunsToCompletionInTheEventLoop(addIn, simulator):
+    scheduler = addIn('FilteredExportScheduler')
+    app = simulator.Application.get()
+    exportScheduler = scheduler.ExportScheduler('testCompletionEvent', sliceItems=3, sliceSeconds=60.0, fireInterval=0.0)
+    log = []
+    results = []
+
+    try:
+        exportScheduler.submit(createJob(scheduler, 10, log, results))
+        app.runEventLoop(lambda: results, 10.0)
+        thread = exportScheduler.thread
+    finally:
+        exportScheduler.stop()
+
+    assert results == ['done']
+    assert log == list(range(10)) + ['closed']
+    assert not exportScheduler.isBusy
+    assert not thread.is_alive()
+    assert not app.unregisterCustomEvent('testCompletionEvent')
+
+
+def testStopCancelsARunningJob(addIn, simulator):
+    scheduler = addIn('FilteredExportScheduler')
+    app = simulator.Application.get()
+    exportScheduler = scheduler.ExportScheduler('testCancelEvent', sliceItems=2, sliceSeconds=60.0, fireInterval=0.0)
+    log = []
+    results = []
+    job = createJob(scheduler, 100, log, results)
+
+    exportScheduler.submit(job)
+    app.runEventLoop(lambda: job.itemCount >= 4, 10.0)
+    thread = exportScheduler.thread
+    exportScheduler.stop()
+
+    # the generator is closed between two items and nothing is reported
+    assert 4 <= job.itemCount < 100
+    assert log[-1] == 'closed'
+    assert results == []
+    assert not exportScheduler.isBusy
+    assert not thread.is_alive()
+    assert exportScheduler.thread is None
+
+    # events that are fired after the stop aren't handled
+    itemCount = job.itemCount
+    app.processEvents(0.05)
+    assert job.itemCount == itemCount
+
+
+def testBackgroundExportWritesAllFiles(addIn, simulator, stlValues, runStlExport, tmp_path):
+    scheduler = addIn('FilteredExportScheduler')
+    app = simulator.Application.get()
+    simulator.openDesign(simulator.generateAssembly(depth=2, fanOut=3, seed=22))
+
+    exportPath = tmp_path / 'export'
+    exportPath.mkdir()
+    stlValues['stlRunInBackground'] = True
+
+    try:
+        assert runStlExport(stlValues, exportPath) is None
+        app.runEventLoop(lambda: any(message.startswith('Path:') for message in app.userInterface.messages), 30.0)
+    finally:
+        scheduler.exportScheduler.stop()
+
+    foregroundPath = tmp_path / 'foreground'
+    foregroundPath.mkdir()
+    stlValues['stlRunInBackground'] = False
+    runStlExport(stlValues, foregroundPath)
+
+    fileNames = sorted(os.listdir(str(exportPath)))
+    assert sum(1 for fileName in fileNames if fileName.endswith('.stl')) > 1
+    assert fileNames == sorted(os.listdir(str(foregroundPath)))
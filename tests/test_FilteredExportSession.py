@@ -0,0 +1,114 @@
+import os
+
+import pytest
+
+
+def getJournal(addIn, exportPath):
+    journal = addIn('FilteredExportJournal')
+
+    return journal.ExportJournal(str(exportPath), 'Test').load()
+
+
+def createSession(addIn, simulator, exportPath, postProcessThreads=0):
+    archive = addIn('FilteredExportArchive')
+    journal = addIn('FilteredExportJournal')
+    session = addIn('FilteredExportSession')
+
+    exportSink = archive.createSink(archive.S_SINK_FOLDER, str(exportPath), 'Test')
+    exportJournal = journal.openJournal(str(exportPath), 'Test', 'Test', 'settings')
+
+    return session.ExportSession(simulator.Application.get().userInterface, 'Test', exportSink, exportJournal, postProcessThreads, 2)
+
+
+#
+# write a file into the sink and leave the rest to the post processing
+#
+def exportFile(addIn, session, fileName):
+    postProcess = addIn('FilteredExportPostProcess')
+
+    session.progress.start(fileName)
+    with open(os.path.join(session.exportSink.outputPath, fileName), 'w') as exportFile:
+        exportFile.write(fileName)
+
+    session.journal.addPending(fileName, fileName, None, 'settings')
+    session.postProcessPool.submit(postProcess.postProcessFile, session.exportSink, session.exportSink.release(fileName), fileName)
+    session.progress.finish()
+
+
+@pytest.mark.parametrize('postProcessThreads', [0, 2])
+def testCompletedSessionRemovesTheJournal(addIn, simulator, tmp_path, postProcessThreads):
+    exportPath = tmp_path / 'export'
+    exportPath.mkdir()
+
+    with createSession(addIn, simulator, exportPath, postProcessThreads) as session:
+        exportFile(addIn, session, 'a.stl')
+        exportFile(addIn, session, 'b.stl')
+
+    exportResult = session.addResults(addIn('FilteredExportUtil').FilteredExportResult(str(exportPath), ['a', 'b'], ''))
+    assert [result.fileName for result in exportResult.postProcessResults] == ['a.stl', 'b.stl']
+    assert not session.progress.dialog.isShowing
+
+    assert sorted(os.listdir(str(exportPath))) == ['a.stl', 'b.stl']
+
+
+def testCancelledSessionCanBeResumed(addIn, simulator, tmp_path, monkeypatch):
+    journal = addIn('FilteredExportJournal')
+    exportPath = tmp_path / 'export'
+    exportPath.mkdir()
+    monkeypatch.setattr(simulator.Application.get().userInterface, 'progressCancelAfter', 1)
+
+    with createSession(addIn, simulator, exportPath) as session:
+        exportFile(addIn, session, 'a.stl')
+        assert session.progress.wasCancelled
+
+    assert getJournal(addIn, exportPath).endStatus == journal.S_JOURNAL_STATUS_CANCELLED
+
+
+def testFailedSessionLeavesTheJournalUnfinished(addIn, simulator, tmp_path):
+    exportPath = tmp_path / 'export'
+    exportPath.mkdir()
+
+    with pytest.raises(RuntimeError):
+        with createSession(addIn, simulator, exportPath, 2) as session:
+            exportFile(addIn, session, 'a.stl')
+            raise RuntimeError('Export failed')
+
+    # the file that was written before the error is in place and recorded
+    loadedJournal = getJournal(addIn, exportPath)
+    assert loadedJournal.endStatus is None
+    assert list(loadedJournal.entries) == ['a.stl']
+    assert os.path.exists(str(exportPath / 'a.stl'))
+    assert session.journal.journalFile is None
+
+
+#
+# Save Copy As saves the copies to the data panel, so its sessions have
+# neither sink nor journal
+#
+@pytest.mark.parametrize('filterType', ['Top level', 'Leaves', 'Mixed leaves'])
+def testSaveCopyAsClosesTheProgressDialog(addIn, simulator, filterType, monkeypatch):
+    cpy = addIn('FilteredExportSaveCopyAs')
+    document = simulator.openDesign(simulator.generateAssembly(depth=2, fanOut=3, seed=9))
+    userInterface = simulator.Application.get().userInterface
+    userInterface.messages.clear()
+
+    input_values = {'cpySelection': None, 'cpyDropDownFilterType': filterType, 'cpyFilterExpression': ''}
+    command = cpy.FilteredExportSaveCopyAs({'cmd_id': 'cmdID_testCopy'}, False)
+    command.on_execute(None, None, None, input_values)
+
+    savedNames = list(document.dataFile.parentFolder.savedNames)
+    assert savedNames
+    assert userInterface.messages[-1].startswith('Path:')
+    assert 'Progress:' in userInterface.messages[-1]
+    assert not userInterface.progressDialogs[-1].isShowing
+
+    # a failing copy ends the export, the dialog is closed anyway
+    def failingSaveCopyAs(component, name, dataFolder, description, tag):
+        raise RuntimeError('Save failed')
+
+    monkeypatch.setattr(simulator.Component, 'saveCopyAs', failingSaveCopyAs)
+    command.on_execute(None, None, None, input_values)
+
+    assert userInterface.messages[-1].startswith('Failed:')
+    assert not userInterface.progressDialogs[-1].isShowing
+    assert document.dataFile.parentFolder.savedNames == savedNames
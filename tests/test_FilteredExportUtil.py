@@ -0,0 +1,205 @@
+import pytest
+
+# synthetic assemblies: name -> generateAssembly arguments
+S_TEST_SHAPES = {
+    'deep': {'depth': 12, 'fanOut': 2, 'reuse': 0.3, 'hiddenRatio': 0.05, 'maxOccurrences': 3000},
+    'wide': {'depth': 2, 'fanOut': 60, 'reuse': 0.3, 'hiddenRatio': 0.05},
+    'linked': {'depth': 4, 'fanOut': 5, 'reuse': 0.4, 'linkedRatio': 0.3, 'hiddenRatio': 0.1, 'mixedRatio': 0.3}
+}
+
+#
+# the recursive traversal of the add-in before the explicit stack was used.
+# Components are compared with every component found so far
+#
+def getComponentsRecursive(occurences, components, includeSubComponents, filterLinkedComponents):
+    for occurence in occurences:
+        if (filterLinkedComponents == True and occurence.isReferencedComponent == False) or filterLinkedComponents == False:
+            if occurence.isLightBulbOn:
+                componentFound = False
+
+                for component in components:
+                    if component[0] == occurence.component:
+                        componentFound = True
+                        break
+
+                if not componentFound and occurence.component:
+                    components.append([occurence.component, occurence.fullPathName])
+
+                if occurence.childOccurrences and not componentFound and includeSubComponents:
+                    components = getComponentsRecursive(occurence.childOccurrences, components, includeSubComponents, filterLinkedComponents)
+
+    return components
+
+
+@pytest.mark.parametrize('shape', sorted(S_TEST_SHAPES))
+@pytest.mark.parametrize('includeSubComponents', [True, False])
+@pytest.mark.parametrize('filterLinkedComponents', [True, False])
+def testGetComponentPathsMatchesRecursiveTraversal(addIn, simulator, shape, includeSubComponents, filterLinkedComponents):
+    util = addIn('FilteredExportUtil')
+    design = simulator.generateAssembly(seed=1, **S_TEST_SHAPES[shape])
+    occurences = design.rootComponent.occurrences
+
+    expected = getComponentsRecursive(occurences, [], includeSubComponents, filterLinkedComponents)
+    componentPaths = util.getComponentPaths(occurences, [], includeSubComponents, filterLinkedComponents)
+
+    assert expected
+    assert [[component.entityToken, fullPathName] for component, fullPathName in componentPaths] == \
+           [[component.entityToken, fullPathName] for component, fullPathName in expected]
+
+
+@pytest.mark.parametrize('shape', sorted(S_TEST_SHAPES))
+@pytest.mark.parametrize('includeSubComponents', [True, False])
+@pytest.mark.parametrize('filterLinkedComponents', [True, False])
+def testGetComponentsMatchesRecursiveTraversal(addIn, simulator, shape, includeSubComponents, filterLinkedComponents):
+    util = addIn('FilteredExportUtil')
+    design = simulator.generateAssembly(seed=2, **S_TEST_SHAPES[shape])
+    rootComponent = design.rootComponent
+
+    expected = getComponentsRecursive(rootComponent.occurrences, [[rootComponent, '']], includeSubComponents, filterLinkedComponents)
+    components = util.getComponents(rootComponent.occurrences, [rootComponent], includeSubComponents, filterLinkedComponents)
+
+    assert [component.entityToken for component in components] == [componentPath[0].entityToken for componentPath in expected]
+
+
+def testGetComponentPathsKeepsKnownComponents(addIn, simulator):
+    util = addIn('FilteredExportUtil')
+    design = simulator.generateAssembly(depth=3, fanOut=4, reuse=0.5, seed=3)
+    occurences = design.rootComponent.occurrences
+
+    first = occurences.item(0)
+    expected = getComponentsRecursive(occurences, [[first.component, first.fullPathName]], True, False)
+    componentPaths = util.getComponentPaths(occurences, [[first.component, first.fullPathName]], True, False)
+
+    assert [[component.entityToken, fullPathName] for component, fullPathName in componentPaths] == \
+           [[component.entityToken, fullPathName] for component, fullPathName in expected]
+
+
+@pytest.mark.parametrize('shape', sorted(S_TEST_SHAPES))
+def testWholeDesignIsWalkedInTreeOrder(addIn, simulator, shape):
+    util = addIn('FilteredExportUtil')
+    design = simulator.generateAssembly(seed=4, **S_TEST_SHAPES[shape])
+
+    expected = getComponentsRecursive(design.rootComponent.occurrences, [], True, False)
+    records = list(util.iterSelectedComponents(design, None, True, False))
+
+    assert [(component.entityToken, fullPathName) for component, fullPathName, depth in records] == \
+           [(component.entityToken, fullPathName) for component, fullPathName in expected]
+
+
+@pytest.mark.parametrize('shape, isPreferred', [
+    ('deep', False),
+    ('wide', True),
+    ('linked', True)
+])
+def testFlatEnumerationIsPreferredForWideDesigns(addIn, simulator, shape, isPreferred):
+    util = addIn('FilteredExportUtil')
+    design = simulator.generateAssembly(seed=4, **S_TEST_SHAPES[shape])
+
+    assert util.isFlatEnumerationPreferred(design) == isPreferred
+
+
+@pytest.mark.parametrize('filterLinkedComponents', [True, False])
+def testUnorderedEnumerationFindsTheSameComponents(addIn, simulator, filterLinkedComponents):
+    util = addIn('FilteredExportUtil')
+    design = simulator.generateAssembly(depth=2, fanOut=60, reuse=0.3, linkedRatio=0.2, hiddenRatio=0.1, seed=5)
+    assert util.isFlatEnumerationPreferred(design)
+
+    expected = getComponentsRecursive(design.rootComponent.occurrences, [], True, filterLinkedComponents)
+    statistics = util.TraversalStatistics()
+    records = list(util.iterSelectedComponents(design, None, True, filterLinkedComponents, statistics, keepTreeOrder=False))
+
+    # the flat enumeration visits the occurences of each unique component
+    assert statistics.visited < sum(1 for occurence in design.rootComponent.allOccurrences)
+    assert sorted(component.entityToken for component, fullPathName, depth in records) == \
+           sorted(component.entityToken for component, fullPathName in expected)
+
+
+def testComponentFilterPrunesWithoutTreeOrder(addIn, simulator):
+    util = addIn('FilteredExportUtil')
+    design = simulator.generateAssembly(seed=4, **S_TEST_SHAPES['wide'])
+    componentFilter = addIn('FilteredExportFilter').parseComponentFilterExpression('!name:Part L2*')
+
+    records = list(util.iterSelectedComponents(design, None, True, False, None, componentFilter, False))
+
+    assert records
+    assert all(depth == 0 for component, fullPathName, depth in records)
+
+
+#
+# Root
+#   Arm:1
+#     Hand:1
+#       Finger:1, Finger:2
+#   Arm:2 .. Arm:10         (same component as Arm:1)
+#   Leg:1
+#     Foot:1
+#
+@pytest.fixture
+def robot(simulator):
+    design = simulator.Design('Robot')
+    components = {}
+    for name in ('Arm', 'Hand', 'Finger', 'Leg', 'Foot'):
+        components[name] = design.addComponent(name)
+        components[name].addBody(name, (1.0, 1.0, 1.0))
+
+    components['Hand'].addOccurrence(components['Finger'])
+    components['Hand'].addOccurrence(components['Finger'])
+    components['Arm'].addOccurrence(components['Hand'])
+    components['Leg'].addOccurrence(components['Foot'])
+    for index in range(10):
+        design.rootComponent.addOccurrence(components['Arm'])
+    design.rootComponent.addOccurrence(components['Leg'])
+
+    return design
+
+
+# a fresh occurence for each path, like the selection of the command
+def getSelection(design, fullPathNames):
+    occurences = dict((occurence.fullPathName, occurence) for occurence in design.rootComponent.allOccurrences)
+
+    return [occurences[fullPathName] for fullPathName in fullPathNames]
+
+
+@pytest.mark.parametrize('fullPathNames, includeSubComponents, expected', [
+    # a parent and its child, in both orders
+    (['Arm:1+Hand:1', 'Arm:1'], True, ['Arm:1']),
+    (['Arm:1', 'Arm:1+Hand:1+Finger:2'], True, ['Arm:1']),
+    (['Arm:1+Hand:1', 'Arm:1'], False, ['Arm:1+Hand:1', 'Arm:1']),
+    # the same occurence twice
+    (['Leg:1', 'Arm:1+Hand:1', 'Leg:1'], True, ['Leg:1', 'Arm:1+Hand:1']),
+    (['Leg:1', 'Leg:1'], False, ['Leg:1']),
+    # sibling subtrees keep the order of the selection
+    (['Leg:1', 'Arm:2', 'Arm:1+Hand:1+Finger:1', 'Arm:1+Hand:1+Finger:2'], True, \
+        ['Leg:1', 'Arm:2', 'Arm:1+Hand:1+Finger:1', 'Arm:1+Hand:1+Finger:2']),
+    # Arm:1 isn't a parent of Arm:10
+    (['Arm:10', 'Arm:1'], True, ['Arm:10', 'Arm:1']),
+    (['Arm:1', 'Arm:10+Hand:1'], True, ['Arm:1', 'Arm:10+Hand:1'])
+])
+def testNormaliseSelection(addIn, robot, fullPathNames, includeSubComponents, expected):
+    util = addIn('FilteredExportUtil')
+
+    selection = util.normaliseSelection(getSelection(robot, fullPathNames), robot.rootComponent, includeSubComponents)
+
+    assert [occurence.fullPathName for occurence in selection] == expected
+
+
+@pytest.mark.parametrize('selection', [None, [], ['Arm:1', 'root']])
+def testSelectionWithRootIsTheWholeDesign(addIn, robot, selection):
+    util = addIn('FilteredExportUtil')
+
+    if selection:
+        selection = getSelection(robot, selection[:-1]) + [robot.rootComponent]
+
+    assert util.normaliseSelection(selection, robot.rootComponent, True) is None
+
+
+def testNestedSelectionIsWalkedOnce(addIn, robot):
+    util = addIn('FilteredExportUtil')
+    selection = util.normaliseSelection(getSelection(robot, ['Arm:1+Hand:1', 'Leg:1+Foot:1', 'Arm:1', 'Leg:1']), robot.rootComponent, True)
+
+    statistics = util.TraversalStatistics()
+    records = list(util.iterSelectedComponents(robot, selection, True, False, statistics))
+
+    assert [(component.name, fullPathName) for component, fullPathName, depth in records] == \
+           [('Arm', 'Arm:1'), ('Hand', 'Arm:1+Hand:1'), ('Finger', 'Arm:1+Hand:1+Finger:1'), ('Leg', 'Leg:1'), ('Foot', 'Leg:1+Foot:1')]
+    assert statistics.skipped == {'duplicate': 1}
@@ -0,0 +1,147 @@
+import pytest
+
+numpy = pytest.importorskip('numpy')
+
+# closed tetrahedron with outward winding (see test_FilteredExportMesh)
+S_TEST_COORDINATES = [
+    0.0, 0.0, 0.0,
+    1.3, 0.0, 0.0,
+    0.0, 0.7, 0.0,
+    0.0, 0.0, 2.1
+]
+S_TEST_INDICES = [0, 2, 1, 0, 1, 3, 0, 3, 2, 1, 2, 3]
+
+
+#
+# corners and normals of a mesh like they are read from an STL file
+#
+def getTriangles(addIn, indices):
+    mesh = addIn('FilteredExportMesh')
+
+    corners, normals = mesh.getTrianglesAsArrays(S_TEST_COORDINATES, indices, 1.0)
+
+    return corners.astype(numpy.float32), normals.astype(numpy.float32)
+
+
+def validate(addIn, corners, normals):
+    return addIn('FilteredExportValidation').MeshValidation('test.stl').validate(corners, normals)
+
+
+def testClosedMeshIsValid(addIn):
+    result = validate(addIn, *getTriangles(addIn, S_TEST_INDICES))
+
+    assert result.isValid
+    assert result.isWatertight
+    assert result.triangleCount == 4
+    assert result.maxPoint == pytest.approx((1.3, 0.7, 2.1))
+    assert (result.openEdgeCount, result.nonManifoldEdgeCount, result.inconsistentEdgeCount, result.badFacetCount) == (0, 0, 0, 0)
+
+
+def testOpenMeshIsNotWatertight(addIn):
+    result = validate(addIn, *getTriangles(addIn, S_TEST_INDICES[:-3]))
+
+    assert not result.isValid
+    assert not result.isWatertight
+    assert result.openEdgeCount == 3
+    assert result.badFacetCount == 0
+    assert 'not watertight' in result.render()
+
+
+def testFlippedNormalIsABadFacet(addIn):
+    corners, normals = getTriangles(addIn, S_TEST_INDICES)
+    normals[1] = -normals[1]
+
+    result = validate(addIn, corners, normals)
+
+    assert not result.isValid
+    assert result.isWatertight
+    assert result.flippedNormalCount == 1
+    assert result.inconsistentEdgeCount == 0
+
+
+#
+# a triangle with reversed winding uses its three edges in the same direction
+# as its neighbours. Its normal follows the winding, so it isn't flipped
+#
+def testReversedWindingIsInconsistent(addIn):
+    indices = list(S_TEST_INDICES)
+    indices[3:6] = reversed(indices[3:6])
+
+    result = validate(addIn, *getTriangles(addIn, indices))
+
+    assert not result.isValid
+    assert result.isWatertight
+    assert result.inconsistentEdgeCount == 3
+    assert result.flippedNormalCount == 0
+
+
+#
+# a triangle with two equal corners and a triangle without area. The stored
+# zero normals aren't counted as flipped
+#
+@pytest.mark.parametrize('degenerateIndices', [[0, 1, 1], [0, 1, 0]])
+def testDegenerateTriangleIsABadFacet(addIn, degenerateIndices):
+    result = validate(addIn, *getTriangles(addIn, S_TEST_INDICES + degenerateIndices))
+
+    assert not result.isValid
+    assert result.degenerateCount == 1
+    assert result.flippedNormalCount == 0
+    assert result.isWatertight
+
+
+def testCollinearTriangleIsDegenerate(addIn):
+    corners, normals = getTriangles(addIn, S_TEST_INDICES)
+    collinear = numpy.array([[[0.0, 0.0, 0.0], [0.5, 0.0, 0.0], [1.3, 0.0, 0.0]]], dtype=numpy.float32)
+
+    result = validate(addIn, numpy.concatenate((corners, collinear)), numpy.concatenate((normals, numpy.zeros((1, 3), dtype=numpy.float32))))
+
+    assert result.degenerateCount == 1
+
+
+#
+# binary files may start with 'solid', too. They are recognised by their
+# size and read like other binary files
+#
+@pytest.mark.parametrize('isBinary, header', [
+    (True, None),
+    (True, b'solid Body'),
+    (False, None)
+])
+def testFilesAreReadByTheirFormat(addIn, tmp_path, isBinary, header):
+    mesh = addIn('FilteredExportMesh')
+    validation = addIn('FilteredExportValidation')
+    fileName = str(tmp_path / 'Body.stl')
+
+    if isBinary:
+        content = mesh.packBinaryStl(S_TEST_COORDINATES, S_TEST_INDICES, scale=1.0)
+        if header is not None:
+            content = header.ljust(80, b' ') + content[80:]
+    else:
+        content = mesh.packAsciiStl(S_TEST_COORDINATES, S_TEST_INDICES, 'Body', scale=1.0)
+
+    with open(fileName, 'wb') as stlFile:
+        stlFile.write(content)
+
+    corners, normals = validation.readStl(fileName)
+    expectedCorners, expectedNormals = getTriangles(addIn, S_TEST_INDICES)
+    assert numpy.array_equal(corners, expectedCorners)
+    assert numpy.array_equal(normals, expectedNormals)
+    del corners, normals
+
+    result = validation.validateStl(fileName)
+    assert result.error is None
+    assert result.isValid
+
+
+def testTruncatedBinaryFileIsAnError(addIn, tmp_path):
+    mesh = addIn('FilteredExportMesh')
+    validation = addIn('FilteredExportValidation')
+    fileName = str(tmp_path / 'Body.stl')
+
+    with open(fileName, 'wb') as stlFile:
+        stlFile.write(mesh.packBinaryStl(S_TEST_COORDINATES, S_TEST_INDICES)[:-10])
+
+    result = validation.validateStl(fileName)
+
+    assert result.error is not None
+    assert not result.isValid